@@ -0,0 +1,605 @@
+import argparse
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import fxaot
+import fxcache
+import interpreter
+import run
+from fxparser import *
+
+#######################################
+# SOURCES
+#######################################
+
+
+def expression_source(lines: int) -> str:
+    # Expression heavy program: every statement mixes all precedence levels.
+    statements = []
+    for i in range(lines):
+        statements.append(
+            f"let x{i % 50} = -a + {i} * (b - 2) / c ^ 2 ^ d % 7 >= {i} - 1 and !e == f or g < h * {i}.5"
+        )
+    return "\n".join(statements) + "\n"
+
+
+def expression_tokens(lines: int) -> list[Token]:
+    # The tokens of expression_source, which has to parse as one statement
+    # a line before anything is timed with it.
+    tokens, error = Lexer("<bench>", expression_source(lines)).make_tokens()
+    if error:
+        raise Exception(error.as_string())
+    result = Parser(tokens).parse()  # type: ignore
+    if result.error:
+        raise Exception(result.error.as_string())
+    if len(result.node.element_nodes) != lines:
+        raise Exception(f"expression_source({lines}) parses as {len(result.node.element_nodes)} statements")
+    return tokens  # type: ignore
+
+
+def loop_source(iterations: int) -> str:
+    # Arithmetic in counted and conditional loops.
+    return (
+        f"let total = 0\n"
+        f"for i = 0 to {iterations}:\n"
+        f"    let total = total + i * 2 - i / 4\n"
+        f"end\n"
+        f"let j = 0\n"
+        f"while j < {iterations}:\n"
+        f"    let j = j + 1\n"
+        f"end\n"
+    )
+
+
+def containers_source(size: int) -> str:
+    # The List `items` and the Dictionary `table`, of `size` elements each.
+    keys = ", ".join(f'"k{i}": {i}' for i in range(size))
+    return (
+        f"let items = [0] * {size}\n"
+        f"let table = {{{keys}}}\n"
+    )
+
+
+def container_source(reads: int) -> str:
+    # Reads `items` by index and `table` by key inside a loop.
+    return (
+        f"let total = 0\n"
+        f"for i = 0 to {reads - 1}:\n"
+        f"    let total = total + items / 7 + table / \"k7\"\n"
+        f"end\n"
+    )
+
+
+def counter_source(updates: int) -> str:
+    # Reads a key of `table` and writes it back, as a counter.
+    return (
+        f"for i = 0 to {updates - 1}:\n"
+        f"    let table/\"k7\" = table / \"k7\" + 1\n"
+        f"end\n"
+    )
+
+
+def building_source(size: int, in_place: bool) -> str:
+    # Builds a List one element at a time.
+    add = "append(items, i)" if in_place else "let items = items + [i]"
+    return (
+        f"let items = []\n"
+        f"for i = 0 to {size - 1}:\n"
+        f"    {add}\n"
+        f"end\n"
+    )
+
+
+def recursion_source(n: int) -> str:
+    return (
+        f"fex fib(n):\n"
+        f"    if n < 2:\n"
+        f"        return n\n"
+        f"    end\n"
+        f"    return fib(n - 1) + fib(n - 2)\n"
+        f"end\n"
+        f"fib({n})\n"
+    )
+
+
+def tail_source(n: int) -> str:
+    # A loop written as tail recursion, deeper than Python's stack would go.
+    return (
+        f"fex count(n, total):\n"
+        f"    if n == 0:\n"
+        f"        return total\n"
+        f"    end\n"
+        f"    return count(n - 1, total + n)\n"
+        f"end\n"
+        f"count({n}, 0)\n"
+    )
+
+
+def deep_source(n: int) -> str:
+    # Recursion that isn't a tail call, each call waits for the next.
+    return (
+        f"fex sum(n):\n"
+        f"    if n == 0:\n"
+        f"        return 0\n"
+        f"    end\n"
+        f"    return n + sum(n - 1)\n"
+        f"end\n"
+        f"sum({n})\n"
+    )
+
+
+def numeric_source(iterations: int) -> str:
+    # root and factorial as modules/math.fx has them, called in a loop.
+    return (
+        f"fex root(x, n=2) -> return x ^ (1 / n)\n"
+        f"fex factorial(x):\n"
+        f"    if x == 0:\n"
+        f"        return 1\n"
+        f"    end\n"
+        f"    else:\n"
+        f"        return x * factorial(x - 1)\n"
+        f"    end\n"
+        f"end\n"
+        f"let total = 0\n"
+        f"for i = 1 to {iterations}:\n"
+        f"    let total = total + root(i) + root(i, 3) + factorial(15)\n"
+        f"end\n"
+        f"total\n"
+    )
+
+
+#######################################
+# BENCHMARKS
+#######################################
+
+
+def bench_parse(repeat: int) -> str:
+    tokens = expression_tokens(2000)
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = Parser(tokens).parse()  # type: ignore
+        best = min(best, time.perf_counter() - start)
+        if result.error:
+            raise Exception(result.error.as_string())
+
+    return f"{len(tokens):,} tokens in {best:.3f}s, {len(tokens) / best:,.0f} tokens/s"  # type: ignore
+
+
+def bench_cache(repeat: int) -> str:
+    expression_tokens(2000)
+    text = expression_source(2000)
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "bench.fx")
+        with open(file_name, "w") as file:
+            file.write(text)
+
+        def best_of(enabled: bool) -> float:
+            fxcache.enabled = enabled
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _, error = fxcache.parse(file_name, text)
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            return best
+
+        try:
+            cold = best_of(False)
+            fxcache.enabled = True
+            fxcache.parse(file_name, text)  # writes the cache entry
+            warm = best_of(True)
+        finally:
+            fxcache.enabled = True
+
+    return f"lex and parse {cold:.3f}s, load from cache {warm:.3f}s, {cold / warm:.1f}x"
+
+
+def bench_engines(repeat: int) -> str:
+    text = loop_source(20000) + recursion_source(18)
+    times: dict[str, float] = {}
+    for engine in run.ENGINES:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, error = run.run("<bench>", text, whole_program=True, engine=engine)
+            best = min(best, time.perf_counter() - start)
+            if error:
+                raise Exception(error.as_string())
+        times[engine] = best
+
+    tree = times["tree"]
+    return ", ".join(f"{engine} {best:.3f}s ({tree / best:.1f}x)" for engine, best in times.items())
+
+
+def bench_containers(repeat: int) -> str:
+    # The containers are built once by a program of their own, which leaves
+    # them in the globals. Only the loops using them are timed, for large
+    # containers and for small ones. A read costs the same for both.
+    sizes, reads = (100000, 10), 20000
+    results = []
+    for size in sizes:
+        program, error = run.ENGINES["tree"].load("<bench>", containers_source(size))
+        if error:
+            raise Exception(error.as_string())
+        _, error = run.start(program)
+        if error:
+            raise Exception(error.as_string())
+
+        times = []
+        for text in (container_source(reads), counter_source(reads)):
+            program, error = run.ENGINES["tree"].load("<bench>", text)
+            if error:
+                raise Exception(error.as_string())
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _, error = run.start(program)
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            times.append(best)
+        # A pass of the first loop reads the List and the Dictionary.
+        results.append((times[0] / (2 * reads), times[1] / reads))
+
+    return ", ".join(
+        f"{size:,} elements: {read * 1e6:.1f}us per read, {update * 1e6:.1f}us per read and write"
+        for size, (read, update) in zip(sizes, results)
+    )
+
+
+def bench_loops(repeat: int) -> str:
+    # A tight counted loop with an int step, run on a range, against the
+    # same loop with a float step, which compares the variable each time.
+    iterations = 100000
+    results = []
+    run.fxjit.enabled = False
+    try:
+        for engine in run.ENGINES:
+            times = []
+            for step in ("1.0", "1"):
+                text = f"let x = 0\nfor i = 1 to {iterations} step {step}:\n    let x = i\nend\n"
+                program, error = run.ENGINES[engine].load("<bench>", text)
+                if error:
+                    raise Exception(error.as_string())
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    _, error = run.start(program, engine)
+                    best = min(best, time.perf_counter() - start)
+                    if error:
+                        raise Exception(error.as_string())
+                times.append(best)
+            results.append(f"{engine} {times[0] * 1000:.0f}ms -> {times[1] * 1000:.0f}ms ({times[0] / times[1]:.1f}x)")
+    finally:
+        run.fxjit.enabled = True
+
+    return f"{iterations:,} iterations, compared -> counted: " + ", ".join(results)
+
+
+def bench_calls(repeat: int) -> str:
+    # Function call overhead, fib makes 2 * fib(n + 1) - 1 calls. Without
+    # the JIT, which would take fib over after a few calls.
+    n = 20
+    calls = 2 * fib(n + 1) - 1
+    results = []
+    run.fxjit.enabled = False
+    try:
+        for engine in run.ENGINES:
+            program, error = run.ENGINES[engine].load("<bench>", recursion_source(n))
+            if error:
+                raise Exception(error.as_string())
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _, error = run.start(program, engine)
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            results.append(f"{engine} {calls / best:,.0f}")
+    finally:
+        run.fxjit.enabled = True
+
+    return f"fib({n}) calls/s: " + ", ".join(results)
+
+
+def bench_tail_calls(repeat: int) -> str:
+    # Tail calls made by the trampoline, or in place of the frame by the VM.
+    # Without the JIT, whose translation would recurse in Python.
+    n = 50000
+    results = []
+    run.fxjit.enabled = False
+    try:
+        for engine in run.ENGINES:
+            program, error = run.ENGINES[engine].load("<bench>", tail_source(n))
+            if error:
+                raise Exception(error.as_string())
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                _, error = run.start(program, engine)
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            results.append(f"{engine} {n / best:,.0f}")
+    finally:
+        run.fxjit.enabled = True
+
+    return f"count({n:,}) tail calls/s: " + ", ".join(results)
+
+
+def bench_deep_recursion(repeat: int) -> str:
+    # Calls nested deeper than Python's stack goes, which only the VM can
+    # make, keeping the frames in a list.
+    n = 100000
+    program, error = run.ENGINES["vm"].load("<bench>", deep_source(n))
+    if error:
+        raise Exception(error.as_string())
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, error = run.start(program, "vm")
+        best = min(best, time.perf_counter() - start)
+        if error:
+            raise Exception(error.as_string())
+
+    return f"sum({n:,}) on the vm in {best:.3f}s, {n / best:,.0f} calls/s"
+
+
+def bench_jit(repeat: int) -> str:
+    # The tree walker with and without hot functions translated to Python,
+    # which also have to give the same results.
+    results = []
+    for name, source in (("numeric", numeric_source(5000)), ("fib", recursion_source(22))):
+        program, error = run.ENGINES["tree"].load("<bench>", source)
+        if error:
+            raise Exception(error.as_string())
+
+        times = []
+        values = []
+        for enabled in (False, True):
+            run.fxjit.enabled = enabled
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                value, error = run.start(program)
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            times.append(best)
+            values.append(str(value))
+        if values[0] != values[1]:
+            raise Exception(f"{name}: {values[1]} with the JIT, {values[0]} without")
+        results.append(f"{name} {times[0] * 1000:.1f}ms -> {times[1] * 1000:.1f}ms ({times[0] / times[1]:.1f}x)")
+
+    return "tree walker without -> with JIT: " + ", ".join(results)
+
+
+def bench_aot(repeat: int) -> str:
+    # Startup and run time of a program compiled by `fxc build` against
+    # loading and walking its tree, both without the JIT.
+    text = loop_source(20000) + recursion_source(18)
+    code, error = fxaot.build("<bench>", text)
+    if error:
+        raise Exception(error.as_string())
+    bytecode = compile(code, "<bench>.py", "exec")  # type: ignore
+
+    load = compiled = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        program = run.ENGINES["tree"].prepare(Parser(Lexer("<bench>", text).generate_tokens()).parse().node)
+        load = min(load, time.perf_counter() - start)
+        start = time.perf_counter()
+        namespace: dict = {"__name__": "bench_aot"}
+        exec(bytecode, namespace)
+        compiled = min(compiled, time.perf_counter() - start)
+
+    times = []
+    values = []
+    run.fxjit.enabled = False
+    try:
+        for execute in (lambda: run.start(program), namespace["run"]):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                value, error = execute()
+                best = min(best, time.perf_counter() - start)
+                if error:
+                    raise Exception(error.as_string())
+            times.append(best)
+            values.append(repr(value))
+    finally:
+        run.fxjit.enabled = True
+    if values[0] != values[1]:
+        raise Exception(f"compiled program gave {values[1]}, the tree walker {values[0]}")
+
+    # In a fresh interpreter as well, where the startup of each includes
+    # importing what it needs.
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "bench_aot.py"), "w") as file:
+            file.write(code)  # type: ignore
+        with open(os.path.join(directory, "bench.fx"), "w") as file:
+            file.write(text)
+        cold_load = cold_startup(
+            "import run\nrun.fxcache.enabled = False\nrun.ENGINES['tree'].load('bench.fx', open('bench.fx').read())", directory, repeat
+        )
+        cold_compiled = cold_startup("import bench_aot", directory, repeat)
+
+    return (
+        f"startup {load * 1000:.2f}ms parsing -> {compiled * 1000:.2f}ms compiled, "
+        f"{cold_load * 1000:.1f}ms -> {cold_compiled * 1000:.1f}ms in a new process, "
+        f"run {times[0]:.3f}s tree -> {times[1]:.3f}s compiled ({times[0] / times[1]:.1f}x)"
+    )
+
+
+def cold_startup(statements: str, directory: str, repeat: int) -> float:
+    # Best time of running `statements` in a new Python started in
+    # `directory`, not counting the start of Python itself.
+    script = f"import sys, time\nstart = time.perf_counter()\n{statements}\nprint(time.perf_counter() - start)"
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    best = float("inf")
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], cwd=directory, env=env, capture_output=True, text=True, check=True).stdout
+        best = min(best, float(output))
+    return best
+
+
+def bench_quicken(repeat: int) -> str:
+    # Binary operations with and without the specialised handlers, on the
+    # engines that have them and without the JIT.
+    text = loop_source(50000)
+    handlers = dict(interpreter.HANDLERS)
+    results = []
+    run.fxjit.enabled = False
+    try:
+        for engine in ("tree", "closure"):
+            times = []
+            for quicken in (False, True):
+                if not quicken:
+                    interpreter.HANDLERS.clear()
+                best = float("inf")
+                for _ in range(repeat):
+                    program, error = run.ENGINES[engine].load("<bench>", text)
+                    if error:
+                        raise Exception(error.as_string())
+                    start = time.perf_counter()
+                    _, error = run.start(program, engine)
+                    best = min(best, time.perf_counter() - start)
+                    if error:
+                        raise Exception(error.as_string())
+                interpreter.HANDLERS.update(handlers)
+                times.append(best)
+            sites = [feedback for _, feedback in interpreter.bin_op_feedback(program)]
+            hits = sum(feedback.hits for feedback in sites)
+            misses = sum(feedback.misses for feedback in sites)
+            results.append(
+                f"{engine} {times[0]:.3f}s -> {times[1]:.3f}s ({times[0] / times[1]:.1f}x, {hits:,} hits, {misses:,} misses)"
+            )
+    finally:
+        interpreter.HANDLERS.update(handlers)
+        run.fxjit.enabled = True
+
+    return "generic -> quickened: " + ", ".join(results)
+
+
+def bench_builtins(repeat: int) -> str:
+    # Builtin call overhead, two calls per iteration.
+    iterations = 20000
+    source = (
+        f"let items = [1, 2, 3]\n"
+        f"for i = 1 to {iterations}:\n"
+        f"    len(items)\n"
+        f"    type(i)\n"
+        f"end\n"
+    )
+    results = []
+    for engine in run.ENGINES:
+        program, error = run.ENGINES[engine].load("<bench>", source)
+        if error:
+            raise Exception(error.as_string())
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, error = run.start(program, engine)
+            best = min(best, time.perf_counter() - start)
+            if error:
+                raise Exception(error.as_string())
+        results.append(f"{engine} {2 * iterations / best:,.0f}")
+
+    return "len and type calls/s: " + ", ".join(results)
+
+
+def bench_native(repeat: int) -> str:
+    # Calls of a Python function exposed to FxPy, with its arguments
+    # converted, bound by a declared signature, or passed as raw values.
+    iterations = 20000
+    run.expose("hypot", math.hypot)
+    run.expose("hypot_declared", math.hypot, ["x", "y"])
+    run.expose("hypot_raw", lambda x, y: run.Number(math.hypot(x.value, y.value)), raw=True)
+    results = []
+    for name in ("hypot", "hypot_declared", "hypot_raw"):
+        source = (
+            f"for i = 1 to {iterations}:\n"
+            f"    {name}(i, 2)\n"
+            f"end\n"
+        )
+        program, error = run.ENGINES["tree"].load("<bench>", source)
+        if error:
+            raise Exception(error.as_string())
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, error = run.start(program)
+            best = min(best, time.perf_counter() - start)
+            if error:
+                raise Exception(error.as_string())
+        results.append(f"{name} {iterations / best:,.0f}")
+
+    return "native calls/s: " + ", ".join(results)
+
+
+def fib(n: int) -> int:
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def bench_building(repeat: int) -> str:
+    size = 20000
+    times = []
+    for in_place in (False, True):
+        program, error = run.ENGINES["tree"].load("<bench>", building_source(size, in_place))
+        if error:
+            raise Exception(error.as_string())
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _, error = run.start(program)
+            best = min(best, time.perf_counter() - start)
+            if error:
+                raise Exception(error.as_string())
+        times.append(best)
+
+    copied, in_place = times
+    return f"{size:,} element List by concatenation {copied:.3f}s, by append {in_place:.3f}s, {copied / in_place:.1f}x"
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "cache": bench_cache,
+    "engines": bench_engines,
+    "containers": bench_containers,
+    "building": bench_building,
+    "loops": bench_loops,
+    "calls": bench_calls,
+    "tail_calls": bench_tail_calls,
+    "deep_recursion": bench_deep_recursion,
+    "builtins": bench_builtins,
+    "native": bench_native,
+    "quicken": bench_quicken,
+    "jit": bench_jit,
+    "aot": bench_aot,
+}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(prog="bench")
+    arg_parser.add_argument("names", nargs="*", help="benchmarks to run, all of them if omitted")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the best one is reported")
+    args = arg_parser.parse_args()
+
+    for name in args.names or BENCHMARKS:
+        print(f"{name}: {BENCHMARKS[name](args.repeat)}")
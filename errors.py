@@ -73,16 +73,43 @@ class RTError(Error):
     def generate_traceback(self) -> str:
         if not self.pos_start:
             return ""
-        result: str = ""
+        lines: list[str] = []
         pos: Optional[Position] = self.pos_start.copy()
         ctx = self.context #type: ignore
 
         while ctx and pos:
-            result = (
-                f"  File {pos.fn}, line {str(pos.ln + 1)}, in {ctx.display_name}\n" #type: ignore
-                + result
-            )
+            lines.append(f"  File {pos.fn}, line {str(pos.ln + 1)}, in {ctx.display_name}\n") #type: ignore
             pos = ctx.parent_entry_pos #type: ignore
             ctx = ctx.parent #type: ignore
 
-        return "Traceback (most recent call last):\n" + result
+        # Lines repeated more than REPEATED_LINES times in a row, as a
+        # recursion makes, are shown that often and then counted. So are
+        # cycles of up to REPEATED_CYCLE lines, as a mutual recursion makes.
+        result: list[str] = []
+        lines.reverse()
+        count = len(lines)
+        index = 0
+        while index < count:
+            hidden, cycle, repeats = 0, 1, 1
+            for length in range(1, REPEATED_CYCLE + 1):
+                block = lines[index:index + length]
+                times = 1
+                while lines[index + times * length:index + (times + 1) * length] == block:
+                    times += 1
+                if (times - REPEATED_LINES) * length > hidden:
+                    hidden, cycle, repeats = (times - REPEATED_LINES) * length, length, times
+            if not hidden:
+                result.append(lines[index])
+                index += 1
+                continue
+            result += lines[index:index + cycle] * REPEATED_LINES
+            more = repeats - REPEATED_LINES
+            previous = "line" if cycle == 1 else f"{cycle} lines"
+            result.append(f"  [Previous {previous} repeated {more} more time{'s' if more > 1 else ''}]\n")
+            index += repeats * cycle
+
+        return "Traceback (most recent call last):\n" + "".join(result)
+
+
+REPEATED_LINES = 3
+REPEATED_CYCLE = 8
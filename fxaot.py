@@ -0,0 +1,474 @@
+from interpreter import *
+# Only to register module_loaders["py"], see dependency.
+import fxffi
+
+#######################################
+# AHEAD OF TIME COMPILER
+#######################################
+
+# Writes a script and every .fx module it imports as one Python module.
+# The tree is the one the engines run, optimized and resolved, and every
+# node becomes the Python statements that do what the Interpreter does when
+# it visits it, with fxruntime for the steps that need a helper. Values are
+# kept in the locals `v<n>` of the function being written, in the order the
+# Interpreter works them out. Every module and function body is a Python
+# function taking its context, spans of positions, constants and layouts
+# are made once when the compiled module is imported.
+
+
+class BuildError(Exception):
+    def __init__(self, error: Error):
+        super().__init__(error.as_string())
+        self.error = error
+
+
+class Unit:
+    # One Python function being written.
+    def __init__(self, name: str):
+        self.name = name
+        self.lines = [f"def {name}(context):"]
+        self.indent = 1
+        self.temps = 0
+        # Loops of this function the current line is in, break and continue
+        # leave them directly instead of raising.
+        self.loops = 0
+        # Where every open block starts, the def line opens the first.
+        self.blocks: list[int] = [len(self.lines)]
+
+    def line(self, text: str):
+        self.lines.append("    " * self.indent + text)
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"v{self.temps}"
+
+    def open(self, header: str):
+        self.line(header)
+        self.indent += 1
+        self.blocks.append(len(self.lines))
+
+    def close(self):
+        if self.blocks.pop() == len(self.lines):
+            self.line("pass")
+        self.indent -= 1
+
+
+class Transpiler:
+    def __init__(self):
+        self.definitions: list[str] = []
+        self.functions: list[list[str]] = []
+        self.names = 0
+        self.sources: dict[int, str] = {}
+        self.spans: dict[tuple[int, int, int, bool], str] = {}
+        # The function compiled for every .fx module imported, None where
+        # the file couldn't be read.
+        self.modules: dict[str, Optional[str]] = {}
+        # Whether any of them is native, the compiled module then imports
+        # fxffi for its loader.
+        self.native = False
+
+    def build(self, file_name: str, text: str) -> tuple[Optional[str], Optional[Error]]:
+        tree, error = Interpreter.load(file_name, text)
+        if error:
+            return None, error
+        try:
+            program = self.module(tree)
+        except BuildError as e:
+            return None, e.error
+
+        lines = [
+            f"# Compiled by fxc from {file_name}. Needs fxruntime and the FxPy",
+            "# modules it imports, but nothing is lexed or parsed.",
+            "from fxruntime import *",
+            *(["import fxffi"] if self.native else []),
+            "",
+            *self.definitions,
+            "",
+        ]
+        for function in self.functions:
+            lines += function + ["", ""]
+        lines += [
+            f"program = {program}",
+            "",
+            "",
+            "def run() -> tuple[Any, Any]:",
+            "    return execute(program)",
+            "",
+            "",
+            'if __name__ == "__main__":',
+            "    main(program)",
+            "",
+        ]
+        return "\n".join(lines), None
+
+    def name(self, prefix: str) -> str:
+        self.names += 1
+        return f"{prefix}{self.names}"
+
+    def define(self, prefix: str, code: str) -> str:
+        name = self.name(prefix)
+        self.definitions.append(f"{name} = {code}")
+        return name
+
+    def source(self, source: Source) -> str:
+        name = self.sources.get(id(source))
+        if name is None:
+            name = self.sources[id(source)] = self.define("SOURCE", f"Source({source.fn!r}, {source.text!r})")
+        return name
+
+    def span(self, node: Node) -> str:
+        key = (id(node.source), node.start, node.end, node.end_after)
+        name = self.spans.get(key)
+        if name is None:
+            source = self.source(node.source)
+            name = self.spans[key] = self.define("S", f"span({source}, {node.start}, {node.end}, {node.end_after})")
+        return name
+
+    def token(self, token: Optional[Token]) -> str:
+        if token is None:
+            return "None"
+        return self.define("T", f"Token({token.type!r}, {token.value!r}, {token.start}, {token.end}, {self.source(token.source)})")
+
+    def constant(self, value: Value, node: Node) -> str:
+        # Source making a copy of the constant `value`.
+        kind = type(value)
+        if kind is Number or kind is String or kind is Boolean:
+            return f"{kind.__name__}({value.value!r})"  # type: ignore
+        elif kind is List:
+            return f"List([{', '.join(self.constant(element, node) for element in value.elements)}])"  # type: ignore
+        elif kind is Dictionary:
+            items = ", ".join(f"{key!r}: {self.constant(element, node)}" for key, element in value.elements.items())  # type: ignore
+            return f"Dictionary({{{items}}})"
+        raise BuildError(Error(node.pos_start, node.pos_end, "Build Error", f"Can't compile a {kind.__name__} constant"))
+
+    ###################################
+
+    def module(self, tree: Node) -> str:
+        name = self.name("module")
+        unit = Unit(name)
+        unit.line(f"return {self.emit(tree, unit, True)}")
+        self.functions.append(unit.lines)
+        return name
+
+    def dependency(self, module: str) -> tuple[str, Optional[str]]:
+        # The file of an imported module and the function compiled for it.
+        # Native modules, such as py.math, are loaded when the script runs.
+        file = module.replace('.', '/') + ".fx"
+        if module.partition(".")[0] in module_loaders:
+            self.native = True
+            return file, None
+        if file in self.modules:
+            return file, self.modules[file]
+        try:
+            with open(file, "r") as f:
+                script = f.read()
+        except OSError:
+            self.modules[file] = None
+            return file, None
+        tree, error = Interpreter.load(file, script, False)
+        if error:
+            raise BuildError(error)
+
+        name = self.modules[file] = self.name("module")
+        unit = Unit(name)
+        unit.line(f"return {self.emit(tree, unit, True)}")
+        self.functions.append(unit.lines)
+        return file, name
+
+    # Writes the statements working out the value of `node` and returns
+    # the local, or the name, holding it. Where `used` is False the value is
+    # thrown away and may not be made at all.
+    def emit(self, node: Node, unit: Unit, used: bool) -> str:
+        return self.emitters[node.kind](self, node, unit, used)
+
+    def emit_NumberNode(self, node: NumberNode, unit: Unit, used: bool) -> str:
+        if not used:
+            return "Null"
+        value = unit.temp()
+        unit.line(f"{value} = Number({node.tok.value!r}).set_context(context).set_pos(*{self.span(node)})")
+        return value
+
+    def emit_StringNode(self, node: StringNode, unit: Unit, used: bool) -> str:
+        if not used:
+            return "Null"
+        value = unit.temp()
+        unit.line(f"{value} = String({node.tok.value!r}).set_context(context).set_pos(*{self.span(node)})")
+        return value
+
+    def emit_ConstNode(self, node: ConstNode, unit: Unit, used: bool) -> str:
+        if not used:
+            return "Null"
+        constant = self.define("K", self.constant(node.value, node))
+        value = unit.temp()
+        unit.line(f"{value} = {constant}.copy().set_context(context).set_pos(*{self.span(node)})")
+        return value
+
+    def emit_BinOpNode(self, node: BinOpNode, unit: Unit, used: bool) -> str:
+        left = self.emit(node.left_node, unit, True)
+        right = self.emit(node.right_node, unit, True)
+        op_tok = node.op_tok
+        operation = BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)  # type: ignore
+        if not operation:
+            unit.line(f"raise fail({self.span(node)}, 'Invalid operation', context)")
+            return "Null"
+        value = unit.temp()
+        unit.line(f"{value}, error = {left}.{operation}({right})")
+        unit.open("if error:")
+        unit.line("raise ErrorSignal(error)")
+        unit.close()
+        unit.line(f"{value} = {value} and {value}.set_pos(*{self.span(node)})")
+        return value
+
+    def emit_UnaryOpNode(self, node: UnaryOpNode, unit: Unit, used: bool) -> str:
+        operand = self.emit(node.node, unit, True)
+        value = unit.temp()
+        if node.op_tok.type == TT_MINUS or node.op_tok.type == TT_NOT:
+            call = "multed_by(Number(-1))" if node.op_tok.type == TT_MINUS else "notted()"
+            unit.line(f"{value}, error = {operand}.{call}")
+            unit.open("if error:")
+            unit.line("raise ErrorSignal(error)")
+            unit.close()
+            unit.line(f"{value} = {value}.set_pos(*{self.span(node)})")
+        else:
+            unit.line(f"{value} = {operand}.set_pos(*{self.span(node)})")
+        return value
+
+    def emit_VarAccessNode(self, node: VarAccessNode, unit: Unit, used: bool) -> str:
+        name = node.var_name_tok.value
+        span = self.span(node)
+        value = unit.temp()
+        if node.depth == 0:
+            unit.line(f"{value} = load_fast(context, {node.slot}, {name!r}, {span})")
+        elif node.depth == DEPTH_GLOBAL:
+            unit.line(f"{value} = load_global(context, {name!r}, {span})")
+        else:
+            unit.line(f"{value} = load_name(context, {name!r}, {span})")
+        return value
+
+    def emit_VarAssignNode(self, node: VarAssignNode, unit: Unit, used: bool) -> str:
+        name = node.var_name_tok.value
+        if name in global_reserved_symbols:
+            unit.line(f"raise fail({self.span(node)}, {repr(f'{name!r} is a reserved symbol')}, context)")
+            return "Null"
+        value = self.emit(node.value_node, unit, True)
+        if node.depth == 0:
+            unit.line(f"context.symbol_table.slots[{node.slot}] = {value}")
+        else:
+            unit.line(f"context.symbol_table.set({name!r}, {value})")
+        return value
+
+    def emit_SetIndexNode(self, node: SetIndexNode, unit: Unit, used: bool) -> str:
+        value = self.emit(node.value_node, unit, True)
+        base_node = node.base_node
+        if base_node.kind == NODE_VAR_ACCESS:
+            target = unit.temp()
+            name = base_node.var_name_tok.value  # type: ignore
+            unit.line(f"{target} = lookup(context, {base_node.depth}, {base_node.slot}, {name!r}, {self.span(base_node)})")  # type: ignore
+        else:
+            target = self.emit(base_node, unit, True)
+        index = self.emit(node.index_node, unit, True)
+        result = unit.temp()
+        unit.line(f"{result} = set_index({target}, {index}, {value}, context, {self.span(node)})")
+        return result
+
+    def emit_IfNode(self, node: IfNode, unit: Unit, used: bool) -> str:
+        result = unit.temp() if used else None
+        self.emit_cases(node.cases, node.else_case, unit, result)
+        return result or "Null"
+
+    def emit_cases(self, cases: list[tuple[Node, Node]], else_case: Optional[Node], unit: Unit, result: Optional[str]):
+        condition, expr = cases[0]
+        unit.open(f"if {self.emit(condition, unit, True)}.is_true():")
+        value = self.emit(expr, unit, result is not None)
+        if result:
+            unit.line(f"{result} = {value}")
+        unit.close()
+
+        unit.open("else:")
+        if len(cases) > 1:
+            self.emit_cases(cases[1:], else_case, unit, result)
+        elif else_case:
+            value = self.emit(else_case, unit, result is not None)
+            if result:
+                unit.line(f"{result} = {value}")
+        elif result:
+            unit.line(f"{result} = Null")
+        unit.close()
+
+    def emit_ListNode(self, node: ListNode, unit: Unit, used: bool) -> str:
+        elements = [self.emit(element_node, unit, used) for element_node in node.element_nodes]
+        if not used:
+            return "Null"
+        value = unit.temp()
+        unit.line(f"{value} = List([{', '.join(elements)}]).set_context(context).set_pos(*{self.span(node)})")
+        return value
+
+    def emit_ForNode(self, node: ForNode, unit: Unit, used: bool) -> str:
+        start = self.emit(node.start_value_node, unit, True)
+        end = self.emit(node.end_value_node, unit, True)
+        step = self.emit(node.step_value_node, unit, True)
+        i, increment, ascending = unit.temp(), unit.temp(), unit.temp()
+        unit.line(f"{i} = {start}.value")
+        unit.line(f"{increment} = {step}.value")
+        unit.open(f"if {increment} == 0:")
+        unit.line(f"raise fail({self.span(node.step_value_node)}, 'Step value cannot be zero', context)")
+        unit.close()
+        unit.line(f"{ascending} = {increment} > 0")
+        unit.open(f"while {i} <= {end}.value if {ascending} else {i} >= {end}.value:")
+        unit.line(f"context.symbol_table.set({node.var_name_tok.value!r}, Number({i}))")
+        unit.line(f"{i} += {increment}")
+        unit.loops += 1
+        self.emit(node.body_node, unit, False)
+        unit.loops -= 1
+        unit.close()
+        return "Null"
+
+    def emit_WhileNode(self, node: WhileNode, unit: Unit, used: bool) -> str:
+        unit.open("while True:")
+        unit.open(f"if not {self.emit(node.condition_node, unit, True)}.is_true():")
+        unit.line("break")
+        unit.close()
+        unit.loops += 1
+        self.emit(node.body_node, unit, False)
+        unit.loops -= 1
+        unit.close()
+        return "Null"
+
+    def emit_BreakNode(self, node: BreakNode, unit: Unit, used: bool) -> str:
+        unit.line("break" if unit.loops else "raise BreakSignal()")
+        return "Null"
+
+    def emit_ContinueNode(self, node: ContinueNode, unit: Unit, used: bool) -> str:
+        unit.line("continue" if unit.loops else "raise ContinueSignal()")
+        return "Null"
+
+    def emit_ReturnNode(self, node: ReturnNode, unit: Unit, used: bool) -> str:
+        if node.tail:
+            call: FuncCallNode = node.node_to_return  # type: ignore
+            span = self.span(call)
+            callee, args, kwargs = self.emit_call_parts(call, unit)
+            unit.open(f"if {callee}.__class__ is Function:")
+            unit.line(f"raise TailCall({callee}, {args}, {kwargs}, *{span}, {node.tail == TAIL_CALL_REPLACE})")
+            unit.close()
+            unit.line(f"raise ReturnSignal({callee}.call({args}, {kwargs}, context).copy().set_pos(*{span}).set_context(context))")
+        elif node.node_to_return:
+            unit.line(f"raise ReturnSignal({self.emit(node.node_to_return, unit, True)})")
+        else:
+            unit.line("raise ReturnSignal(Number(0))")
+        return "Null"
+
+    def emit_FuncDefNode(self, node: FuncDefNode, unit: Unit, used: bool) -> str:
+        func_name: str = node.var_name_tok.value  # type: ignore
+        span = self.span(node)
+        if func_name in global_reserved_symbols:
+            unit.line(f"raise fail({span}, {repr(f'{func_name!r} is a reserved symbol')}, context)")
+            return "Null"
+
+        args = []
+        for name, optional, default in node.arg_name_toks:
+            if optional:
+                # Defaults are worked out where the function is defined.
+                default_unit = Unit(self.name("default"))
+                default_unit.line(f"return {self.emit(default, default_unit, True)}")
+                self.functions.append(default_unit.lines)
+                args.append(f"({name.value!r}, True, default_value({default_unit.name}, context))")
+            else:
+                args.append(f"({name.value!r}, False, None)")
+
+        body_unit = Unit(self.name("function"))
+        self.emit(node.body_node, body_unit, False)
+        # A body may leave nothing to run, such as `fex f() -> 1`.
+        body_unit.close()
+        self.functions.append(body_unit.lines)
+
+        layout = self.define("L", repr(node.layout))
+        value = unit.temp()
+        unit.line(
+            f"{value} = Function({func_name!r}, None, [{', '.join(args)}], {self.token(node.mulargs)}, {self.token(node.mulkwargs)}, "
+            f"layout={layout}, code={body_unit.name}).set_context(context).set_pos(*{span})"
+        )
+        unit.line(f"context.symbol_table.set({func_name!r}, {value})")
+        return value
+
+    def emit_FuncCallNode(self, node: FuncCallNode, unit: Unit, used: bool) -> str:
+        callee, args, kwargs = self.emit_call_parts(node, unit)
+        value = unit.temp()
+        unit.line(f"{value} = {callee}.call({args}, {kwargs}, context).copy().set_pos(*{self.span(node)}).set_context(context)")
+        return value
+
+    # The locals holding the value a call is made on and the source of its
+    # arguments.
+    def emit_call_parts(self, node: FuncCallNode, unit: Unit) -> tuple[str, str, str]:
+        span = self.span(node)
+        callee = unit.temp()
+        unit.open("try:")
+        unit.line(f"{callee} = {self.emit(node.node_to_call, unit, True)}")
+        unit.close()
+        unit.open("except FlowSignal:")
+        unit.line(f"{callee} = None")
+        unit.close()
+        unit.open(f"if not {callee}:")
+        unit.line(f"raise fail({span}, 'Function not defined', context)")
+        unit.close()
+
+        args = [self.emit(arg_node, unit, True) for arg_node in node.arg_nodes]
+        kwargs = [f"{name.value!r}: {self.emit(value_node, unit, True)}" for name, value_node in node.kwargs_nodes]
+        return callee, f"[{', '.join(args)}]", f"{{{', '.join(kwargs)}}}"
+
+    def emit_ImportNode(self, node: ImportNode, unit: Unit, used: bool) -> str:
+        module: str = node.module_name.value  # type: ignore
+        alias = node.alias.value or module
+        file, body = self.dependency(module)
+        value = unit.temp()
+        unit.line(f"{value} = import_module(context, {module!r}, {alias!r}, {file!r}, {body}, {self.span(node)})")
+        return value
+
+    def emit_FromImportNode(self, node: FromImportNode, unit: Unit, used: bool) -> str:
+        module: str = node.module_name.value  # type: ignore
+        names = [(name.value, alias.value if alias else None) for name, alias in node.functions]
+        file, body = self.dependency(module)
+        value = unit.temp()
+        unit.line(f"{value} = from_import(context, {module!r}, {names!r}, {file!r}, {body}, {self.span(node)})")
+        return value
+
+    def emit_DictNode(self, node: DictNode, unit: Unit, used: bool) -> str:
+        span = self.span(node)
+        elements = unit.temp()
+        unit.line(f"{elements} = {{}}")
+        for key_node, value_node in node.key_value_pairs.items():
+            key = self.emit(key_node, unit, True)
+            unit.open(f"if not isinstance({key}, String):")
+            unit.line(f"raise fail({span}, 'Dictionary keys must be strings', context)")
+            unit.close()
+            unit.line(f"{elements}[{key}.value] = {self.emit(value_node, unit, True)}")
+        value = unit.temp()
+        unit.line(f"{value} = Dictionary({elements}).set_context(context).set_pos(*{span})")
+        return value
+
+    # Emit methods indexed by node kind, see the NODE_* constants.
+    emitters = [
+        emit_NumberNode,
+        emit_BinOpNode,
+        emit_UnaryOpNode,
+        emit_VarAccessNode,
+        emit_VarAssignNode,
+        emit_StringNode,
+        emit_ReturnNode,
+        emit_ContinueNode,
+        emit_BreakNode,
+        emit_IfNode,
+        emit_ListNode,
+        emit_ForNode,
+        emit_WhileNode,
+        emit_FuncDefNode,
+        emit_FuncCallNode,
+        emit_ImportNode,
+        emit_FromImportNode,
+        emit_DictNode,
+        emit_ConstNode,
+        emit_SetIndexNode,
+    ]
+
+
+def build(file_name: str, text: str) -> tuple[Optional[str], Optional[Error]]:
+    return Transpiler().build(file_name, text)
@@ -0,0 +1,853 @@
+from interpreter import *
+import fxcache
+
+#######################################
+# BYTECODE
+#######################################
+
+# Every instruction is two ints in Code.ops, the opcode and its argument.
+# Arguments index the constant and name pools of the Code, or are slots,
+# counts and jump targets (offsets into ops).
+OP_NUMBER = 0
+OP_STRING = 1
+OP_CONST = 2
+OP_LOAD_FAST = 3
+OP_LOAD_GLOBAL = 4
+OP_LOAD_NAME = 5
+OP_STORE_FAST = 6
+OP_STORE_NAME = 7
+OP_BINARY = 8
+OP_NEGATE = 9
+OP_NOT = 10
+OP_SET_POS = 11
+OP_BUILD_LIST = 12
+OP_CHECK_KEY = 13
+OP_BUILD_DICT = 14
+OP_POP = 15
+OP_PUSH_NULL = 16
+OP_TRUNCATE = 17
+OP_JUMP = 18
+OP_POP_JUMP_IF_FALSE = 19
+OP_FOR_PREP = 20
+OP_FOR_ITER = 21
+OP_LOAD_CALLEE = 22
+OP_SETUP_CATCH = 23
+OP_POP_CATCH = 24
+OP_CHECK_CALLABLE = 25
+OP_CALL = 26
+OP_CALL_KW = 27
+OP_MAKE_FUNCTION = 28
+OP_IMPORT = 29
+OP_FAIL = 30
+OP_RETURN = 31
+OP_EXIT_LOOP = 32
+OP_END = 33
+OP_LOAD_TARGET = 34
+OP_SET_INDEX = 35
+OP_BORROW_FAST = 36
+OP_BORROW_GLOBAL = 37
+OP_BORROW_CONST = 38
+OP_POP_FAST = 39
+OP_POP_NAME = 40
+OP_POP_JUMP_IF_TRUE = 41
+
+# Bumped whenever the instruction set, or the code compiled for a tree,
+# changes.
+BYTECODE_MAGIC = b"FXB7"
+
+
+class Code:
+    __slots__ = ("name", "ops", "consts", "names", "varnames", "positions")
+
+    def __init__(
+        self,
+        name: str,
+        ops: list[int],
+        consts: list[Any],
+        names: list[str],
+        varnames: list[str],
+        positions: list[Optional[tuple[Position, Position]]],
+    ):
+        self.name = name
+        self.ops = ops
+        self.consts = consts
+        self.names = names
+        # Names of the frame slots, by slot
+        self.varnames = varnames
+        # Start and end of the node each instruction came from, by
+        # instruction number
+        self.positions = positions
+
+    def __call__(self, context: Context) -> Value:
+        # Function.call runs the body this way when it isn't called from a VM.
+        return VM(context).run(self, context)
+
+    def __repr__(self):
+        return f"<code {self.name}>"
+
+
+#######################################
+# BYTECODE COMPILER
+#######################################
+
+
+class BinaryFeedback(BinOpFeedback):
+    # The feedback of an OP_BINARY. An operand pushed with OP_BORROW_* is
+    # the stored value itself, the specialised handlers only read it. For
+    # the generic path, which may keep the operand or report where it is,
+    # its (pos_start, pos_end, constant) is kept here to copy it with.
+    __slots__ = ("left_operand", "right_operand")
+
+    def __init__(self, operation: str, node: Node):
+        super().__init__(operation, node)
+        self.left_operand: Optional[tuple[Position, Position, bool]] = None
+        self.right_operand: Optional[tuple[Position, Position, bool]] = None
+
+
+# The copy of a borrowed operand that OP_LOAD_* or OP_NUMBER would have
+# pushed.
+def own_operand(value: Value, operand: tuple[Position, Position, bool], context: Context) -> Value:
+    pos_start, pos_end, constant = operand
+    value = value.copy().set_pos(pos_start, pos_end)
+    return value.set_context(context) if constant else value
+
+
+# What value.copy().set_pos(*span) gives, made directly for a Number, which
+# most reads are of.
+def copy_at(value: Value, span: tuple[Position, Position]) -> Value:
+    if value.__class__ is Number:
+        copy = new_value(Number)
+        copy.value = value.value  # type: ignore
+        copy.context = value.context
+        copy.pos_start, copy.pos_end = span
+        return copy
+    return value.copy().set_pos(*span)
+
+
+class BytecodeCompiler:
+    # Compiles one body. Every node leaves exactly one value on the stack, so
+    # the depth is known at each instruction and break/continue can drop
+    # whatever the loop body had pushed before jumping.
+    def __init__(self, name: str = "<program>", varnames: Optional[list[str]] = None):
+        self.name = name
+        self.varnames = varnames or []
+        self.ops: list[int] = []
+        self.positions: list[Optional[tuple[Position, Position]]] = []
+        self.consts: list[Any] = []
+        self.names: list[str] = []
+        self.name_indexes: dict[str, int] = {}
+        self.depth = 0
+        # [depth after break, break jumps, depth after continue, continue
+        # jumps] for each loop whose body is being compiled
+        self.loops: list[list[Any]] = []
+
+    def compile(self, node: Node) -> Code:
+        self.visit(node)
+        self.emit(OP_END, 0, None, -1)
+        return Code(self.name, self.ops, self.consts, self.names, self.varnames, self.positions)
+
+    def emit(self, op: int, arg: int = 0, node: Optional[Node] = None, effect: int = 0) -> int:
+        self.ops += (op, arg)
+        self.positions.append((node.pos_start, node.pos_end) if node else None)
+        self.depth += effect
+        return len(self.ops) - 2
+
+    def patch(self, index: int):
+        self.ops[index + 1] = len(self.ops)
+
+    def add_const(self, value: Any) -> int:
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name: str) -> int:
+        index = self.name_indexes.get(name)
+        if index is None:
+            index = self.name_indexes[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def visit(self, node: Node):
+        self.visitors[node.kind](self, node)
+
+    ###################################
+
+    def visit_NumberNode(self, node: NumberNode):
+        self.emit(OP_NUMBER, self.add_const(node.tok.value), node, 1)
+
+    def visit_StringNode(self, node: StringNode):
+        self.emit(OP_STRING, self.add_const(node.tok.value), node, 1)
+
+    def visit_ConstNode(self, node: ConstNode):
+        self.emit(OP_CONST, self.add_const(node.value), node, 1)
+
+    def visit_BinOpNode(self, node: BinOpNode):
+        op_tok = node.op_tok
+        operation = BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)  # type: ignore
+        if not operation:
+            self.visit(node.left_node)
+            self.visit(node.right_node)
+            self.emit(OP_FAIL, self.add_const("Invalid operation"), node, -1)
+            return
+        # The argument is the BinaryFeedback of the instruction, which
+        # quickens it the way it does the node. Operands are borrowed where
+        # nothing runs between pushing them and the instruction, so no other
+        # code sees them: the right one, and the left one if the right one
+        # is only read.
+        feedback = BinaryFeedback(operation, node)
+        right_borrowed = self.borrowable(node.right_node, True)
+        if right_borrowed and self.borrowable(node.left_node, False):
+            feedback.left_operand = self.borrow(node.left_node)
+        else:
+            self.visit(node.left_node)
+        if right_borrowed:
+            feedback.right_operand = self.borrow(node.right_node)
+        else:
+            self.visit(node.right_node)
+        self.emit(OP_BINARY, self.add_const(feedback), node, -1)
+
+    # Whether OP_BORROW_* can push `node`. Constants only on the right: on
+    # the left one would give the result no context, the handlers take it
+    # from the left operand.
+    @staticmethod
+    def borrowable(node: Node, constant: bool) -> bool:
+        if node.kind == NODE_VAR_ACCESS:
+            return node.depth == 0 or node.depth == DEPTH_GLOBAL  # type: ignore
+        if node.kind == NODE_NUMBER:
+            return constant
+        return constant and node.kind == NODE_CONST and node.value.__class__ is Number  # type: ignore
+
+    def borrow(self, node: Node) -> tuple[Position, Position, bool]:
+        if node.kind != NODE_VAR_ACCESS:
+            value = node.tok.value if node.kind == NODE_NUMBER else node.value.value  # type: ignore
+            self.emit(OP_BORROW_CONST, self.add_const(Number(value).set_pos(node.pos_start, node.pos_end)), node, 1)
+            return node.pos_start, node.pos_end, True
+        if node.depth == 0:  # type: ignore
+            self.emit(OP_BORROW_FAST, node.slot, node, 1)  # type: ignore
+        else:
+            self.emit(OP_BORROW_GLOBAL, self.add_name(node.var_name_tok.value), node, 1)  # type: ignore
+        return node.pos_start, node.pos_end, False
+
+    def visit_UnaryOpNode(self, node: UnaryOpNode):
+        self.visit(node.node)
+        if node.op_tok.type == TT_MINUS:
+            self.emit(OP_NEGATE, 0, node)
+        elif node.op_tok.type == TT_NOT:
+            self.emit(OP_NOT, 0, node)
+        else:
+            self.emit(OP_SET_POS, 0, node)
+
+    def visit_VarAccessNode(self, node: VarAccessNode):
+        if node.depth == 0:
+            self.emit(OP_LOAD_FAST, node.slot, node, 1)
+        elif node.depth == DEPTH_GLOBAL:
+            self.emit(OP_LOAD_GLOBAL, self.add_name(node.var_name_tok.value), node, 1)  # type: ignore
+        else:
+            self.emit(OP_LOAD_NAME, self.add_name(node.var_name_tok.value), node, 1)  # type: ignore
+
+    def visit_VarAssignNode(self, node: VarAssignNode):
+        var_name = node.var_name_tok.value
+        if var_name in global_reserved_symbols:
+            self.emit(OP_FAIL, self.add_const(f"'{var_name}' is a reserved symbol"), node, 1)
+            return
+        self.visit(node.value_node)
+        if node.depth == 0:
+            self.emit(OP_STORE_FAST, node.slot)
+        else:
+            self.emit(OP_STORE_NAME, self.add_name(var_name))  # type: ignore
+
+    def visit_SetIndexNode(self, node: SetIndexNode):
+        self.visit(node.value_node)
+        base_node = node.base_node
+        if base_node.kind == NODE_VAR_ACCESS:
+            # The variable itself, not a copy
+            target_info = (base_node.depth, base_node.slot, base_node.var_name_tok.value)  # type: ignore
+            self.emit(OP_LOAD_TARGET, self.add_const(target_info), base_node, 1)
+        else:
+            self.visit(base_node)
+        self.visit(node.index_node)
+        self.emit(OP_SET_INDEX, 0, node, -2)
+
+    def visit_IfNode(self, node: IfNode):
+        ends: list[int] = []
+        for condition, expr in node.cases:
+            self.visit(condition)
+            skip = self.emit(OP_POP_JUMP_IF_FALSE, 0, None, -1)
+            self.visit(expr)
+            ends.append(self.emit(OP_JUMP))
+            # The next case starts without the value of this one
+            self.depth -= 1
+            self.patch(skip)
+        if node.else_case:
+            self.visit(node.else_case)
+        else:
+            self.emit(OP_PUSH_NULL, 0, None, 1)
+        for end in ends:
+            self.patch(end)
+
+    def visit_ListNode(self, node: ListNode):
+        for element_node in node.element_nodes:
+            self.visit(element_node)
+        count = len(node.element_nodes)
+        self.emit(OP_BUILD_LIST, count, node, 1 - count)
+
+    def visit_DictNode(self, node: DictNode):
+        for key, value in node.key_value_pairs.items():
+            self.visit(key)
+            self.emit(OP_CHECK_KEY, 0, node)
+            self.visit(value)
+        count = len(node.key_value_pairs)
+        self.emit(OP_BUILD_DICT, count, node, 1 - 2 * count)
+
+    # Loops test at the bottom, so a pass ends in the instruction that goes
+    # back to the top. They are entered with a jump to the test.
+    def visit_ForNode(self, node: ForNode):
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+        self.visit(node.step_value_node)
+        # The three values are replaced by the loop state. A zero step is
+        # reported at the step.
+        self.emit(OP_FOR_PREP, self.add_name(node.var_name_tok.value), node.step_value_node, -2)  # type: ignore
+        depth = self.depth - 1
+        loop = [depth, [], depth + 1, []]
+        entry = self.emit(OP_JUMP)
+        top = len(self.ops)
+        self.loop_body(node.body_node, loop)
+        self.patch(entry)
+        self.emit(OP_FOR_ITER, top)
+        self.end_loop(loop)
+        self.depth = depth
+        self.emit(OP_PUSH_NULL, 0, None, 1)
+
+    def visit_WhileNode(self, node: WhileNode):
+        depth = self.depth
+        loop = [depth, [], depth, []]
+        entry = self.emit(OP_JUMP)
+        top = len(self.ops)
+        self.loop_body(node.body_node, loop)
+        self.patch(entry)
+        self.visit(node.condition_node)
+        self.emit(OP_POP_JUMP_IF_TRUE, top, None, -1)
+        self.end_loop(loop)
+        self.emit(OP_PUSH_NULL, 0, None, 1)
+
+    def loop_body(self, body_node: Node, loop: list[Any]):
+        # Continue jumps go to the test that follows the body.
+        self.loops.append(loop)
+        for statement in loop_statements(body_node):
+            self.visit_statement(statement)
+        self.loops.pop()
+        for jump in loop[3]:
+            self.patch(jump)
+
+    def end_loop(self, loop: list[Any]):
+        for jump in loop[1]:
+            self.patch(jump)
+
+    def visit_statement(self, node: Node):
+        # A statement whose value is dropped. An assignment stores the value
+        # and drops it in one instruction.
+        if node.kind == NODE_VAR_ASSIGN and node.var_name_tok.value not in global_reserved_symbols:  # type: ignore
+            self.visit(node.value_node)  # type: ignore
+            if node.depth == 0:  # type: ignore
+                self.emit(OP_POP_FAST, node.slot, None, -1)  # type: ignore
+            else:
+                self.emit(OP_POP_NAME, self.add_name(node.var_name_tok.value), None, -1)  # type: ignore
+        else:
+            self.visit(node)
+            self.emit(OP_POP, 0, None, -1)
+
+    def visit_BreakNode(self, node: BreakNode):
+        depth = self.depth
+        if not self.loops:
+            self.emit(OP_EXIT_LOOP, 0, None, 1)
+            return
+        loop = self.loops[-1]
+        if depth > loop[0]:
+            self.emit(OP_TRUNCATE, loop[0])
+        loop[1].append(self.emit(OP_JUMP))
+        self.depth = depth + 1
+
+    def visit_ContinueNode(self, node: ContinueNode):
+        depth = self.depth
+        if not self.loops:
+            self.emit(OP_EXIT_LOOP, 1, None, 1)
+            return
+        loop = self.loops[-1]
+        if depth > loop[2]:
+            self.emit(OP_TRUNCATE, loop[2])
+        loop[3].append(self.emit(OP_JUMP))
+        self.depth = depth + 1
+
+    def visit_ReturnNode(self, node: ReturnNode):
+        # 0 returns the value on the stack, 1 returns 0, and 2 or 3 the result
+        # of the call just before, which may instead be made as a tail call,
+        # as TAIL_CALL or TAIL_CALL_REPLACE.
+        depth = self.depth
+        if node.node_to_return:
+            self.visit(node.node_to_return)
+            self.emit(OP_RETURN, 1 + node.tail if node.tail else 0)
+        else:
+            self.emit(OP_RETURN, 1)
+        self.depth = depth + 1
+
+    def visit_FuncDefNode(self, node: FuncDefNode):
+        # Defaults run in the defining frame, the body gets its own Code.
+        params = [
+            (arg_name[0], arg_name[1], BytecodeCompiler("<default>", self.varnames).compile(arg_name[2]) if arg_name[1] else None)
+            for arg_name in node.arg_name_toks
+        ]
+        layout = node.layout or {}
+        name = node.var_name_tok.value if node.var_name_tok else "<anonymous>"
+        body = BytecodeCompiler(name, sorted(layout, key=layout.__getitem__)).compile(node.body_node)  # type: ignore
+        # The body node too, which the JIT translates.
+        function = (node.var_name_tok, params, node.mulargs, node.mulkwargs, node.layout, node.body_node, body)
+        self.emit(OP_MAKE_FUNCTION, self.add_const(function), node, 1)
+
+    def visit_FuncCallNode(self, node: FuncCallNode):
+        callee = node.node_to_call
+        # A callee that fails to evaluate is reported as "Function not
+        # defined", like the Interpreter does.
+        if callee.kind == NODE_VAR_ACCESS:
+            callee_info = (callee.depth, callee.slot, callee.var_name_tok.value, node.pos_start, node.pos_end)
+            self.emit(OP_LOAD_CALLEE, self.add_const(callee_info), callee, 1)
+        else:
+            catch = self.emit(OP_SETUP_CATCH)
+            self.visit(callee)
+            self.emit(OP_POP_CATCH)
+            self.patch(catch)
+            self.emit(OP_CHECK_CALLABLE, 0, node)
+
+        for arg_node in node.arg_nodes:
+            self.visit(arg_node)
+        count = len(node.arg_nodes)
+        if node.kwargs_nodes:
+            for kwarg in node.kwargs_nodes:
+                self.visit(kwarg[1])
+            names = tuple(kwarg[0].value for kwarg in node.kwargs_nodes)
+            self.emit(OP_CALL_KW, self.add_const((count, names)), node, -count - len(names))
+        else:
+            self.emit(OP_CALL, count, node, -count)
+
+    def visit_ImportNode(self, node: ImportNode):
+        self.emit(OP_IMPORT, self.add_const(node), node, 1)
+
+    def visit_FromImportNode(self, node: FromImportNode):
+        self.emit(OP_IMPORT, self.add_const(node), node, 1)
+
+    # Visit methods indexed by node kind, see the NODE_* constants.
+    visitors = [
+        visit_NumberNode,
+        visit_BinOpNode,
+        visit_UnaryOpNode,
+        visit_VarAccessNode,
+        visit_VarAssignNode,
+        visit_StringNode,
+        visit_ReturnNode,
+        visit_ContinueNode,
+        visit_BreakNode,
+        visit_IfNode,
+        visit_ListNode,
+        visit_ForNode,
+        visit_WhileNode,
+        visit_FuncDefNode,
+        visit_FuncCallNode,
+        visit_ImportNode,
+        visit_FromImportNode,
+        visit_DictNode,
+        visit_ConstNode,
+        visit_SetIndexNode,
+    ]
+
+
+#######################################
+# VM
+#######################################
+
+
+# What a cached Code holds besides the trees of function bodies, see
+# fxcache.TREE_CLASSES: the values of folded constants and the feedback of
+# its binary operations.
+CODE_CLASSES = (Code, BinaryFeedback, Number, String, Boolean)
+
+
+class VM(Interpreter):
+    # Runs Code on a value stack. Calls between fex functions push a frame
+    # inside the loop instead of recursing, and every instruction does what
+    # the Interpreter does for the node it came from.
+    def visit(self, node: Any, context: Optional[Context] = None):
+        if not isinstance(node, Code):
+            node = BytecodeCompiler().compile(node)
+        return self.run(node, context or self.context)
+
+    @classmethod
+    def prepare(cls, tree: Node, whole_program: bool = True) -> Code:
+        return BytecodeCompiler().compile(super().prepare(tree, whole_program))
+
+    @classmethod
+    def load(cls, file_name: str, text: str, whole_program: bool = True) -> tuple[Any, Optional[Error]]:
+        # Compiled programs are kept next to the parsed trees, resolved
+        # modules apart from whole programs.
+        suffix = "b" if whole_program else "m"
+        key = fxcache.cache_key(file_name, text, BYTECODE_MAGIC) if fxcache.enabled else None
+        if key:
+            code = fxcache.load(file_name, text, key, suffix, CODE_CLASSES)
+            if isinstance(code, Code):
+                return code, None
+
+        code, error = super().load(file_name, text, whole_program)
+        if error:
+            return None, error
+        if key:
+            fxcache.store(file_name, code, key, suffix)
+        return code, None
+
+    def run(self, code: Code, context: Context) -> Any:
+        # Caller frames are saved as tuples in `frames` while a callee runs.
+        frames: list[tuple[Any, ...]] = []
+        function: Optional[Function] = None
+        call_pos: Any = None
+        ops, consts, names, positions = code.ops, code.consts, code.names, code.positions
+        stack: list[Any] = []
+        # (target, stack depth) of each catch the frame is inside of
+        catches: list[tuple[int, int]] = []
+        pc = 0
+
+        while True:
+            try:
+                while True:
+                    op = ops[pc]
+                    arg = ops[pc + 1]
+                    pc += 2
+
+                    if op == OP_LOAD_FAST or op == OP_BORROW_FAST:
+                        symbol_table = context.symbol_table
+                        value = symbol_table.slots[arg]  # type: ignore
+                        if value is None:
+                            value = symbol_table.get(code.varnames[arg])  # type: ignore
+                            if value is None:
+                                pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                                raise ErrorSignal(RTError(pos_start, pos_end, f"'{code.varnames[arg]}' is not defined", context))
+                        stack.append(copy_at(value, positions[(pc >> 1) - 1]) if op == OP_LOAD_FAST else value)  # type: ignore
+
+                    elif op == OP_BINARY:
+                        right = stack.pop()
+                        left = stack[-1]
+                        feedback = consts[arg]
+                        handler = feedback.handler
+                        if handler is not None:
+                            result = handler(left, right, feedback.pos_start, feedback.pos_end)
+                            if result is not None:
+                                feedback.hits += 1
+                                stack[-1] = result
+                                continue
+                            feedback.miss()
+                        elif feedback.runs < QUICKEN_AFTER:
+                            feedback.record(left, right)
+                        if feedback.left_operand is not None:
+                            left = own_operand(left, feedback.left_operand, context)
+                        if feedback.right_operand is not None:
+                            right = own_operand(right, feedback.right_operand, context)
+                        result, error = getattr(left, feedback.operation)(right)
+                        if error:
+                            raise ErrorSignal(error)
+                        stack[-1] = result and result.set_pos(feedback.pos_start, feedback.pos_end)
+
+                    elif op == OP_BORROW_CONST:
+                        stack.append(consts[arg])
+
+                    elif op == OP_FOR_ITER:
+                        # Back to the top of the body at `arg` while there
+                        # are values left.
+                        state = stack[-1]
+                        if state.__class__ is tuple:
+                            i = next(state[0], None)
+                            if i is not None:
+                                state[1][state[2]] = new_number(i)
+                                pc = arg
+                            else:
+                                stack.pop()
+                        else:
+                            i = state[0]
+                            if i <= state[1].value if state[3] else i >= state[1].value:
+                                context.symbol_table.set(state[4], new_number(i))  # type: ignore
+                                state[0] = i + state[2]
+                                pc = arg
+                            else:
+                                stack.pop()
+
+                    elif op == OP_POP_FAST:
+                        context.symbol_table.slots[arg] = stack.pop()  # type: ignore
+
+                    elif op == OP_POP_JUMP_IF_TRUE:
+                        if stack.pop().is_true():
+                            pc = arg
+
+                    elif op == OP_POP_JUMP_IF_FALSE:
+                        if not stack.pop().is_true():
+                            pc = arg
+
+                    elif op == OP_NUMBER:
+                        value = new_number(consts[arg])
+                        value.context = context
+                        value.pos_start, value.pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                        stack.append(value)
+
+                    elif op == OP_LOAD_GLOBAL or op == OP_BORROW_GLOBAL:
+                        value = context.symbol_table.root.symbols.get(names[arg])  # type: ignore
+                        if value is None:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, f"'{names[arg]}' is not defined", context))
+                        stack.append(copy_at(value, positions[(pc >> 1) - 1]) if op == OP_LOAD_GLOBAL else value)  # type: ignore
+
+                    elif op == OP_POP_NAME:
+                        context.symbol_table.set(names[arg], stack.pop())  # type: ignore
+
+                    elif op == OP_LOAD_NAME:
+                        value = context.symbol_table.get(names[arg])  # type: ignore
+                        if value is None:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, f"'{names[arg]}' is not defined", context))
+                        stack.append(copy_at(value, positions[(pc >> 1) - 1]))  # type: ignore
+
+                    elif op == OP_JUMP:
+                        pc = arg
+
+                    elif op == OP_POP:
+                        stack.pop()
+
+                    elif op == OP_STORE_FAST:
+                        context.symbol_table.slots[arg] = stack[-1]  # type: ignore
+
+                    elif op == OP_STORE_NAME:
+                        context.symbol_table.set(names[arg], stack[-1])  # type: ignore
+
+                    elif op == OP_LOAD_CALLEE:
+                        depth, slot, var_name, pos_start, pos_end = consts[arg]
+                        symbol_table = context.symbol_table
+                        if depth == 0:
+                            value = symbol_table.slots[slot]  # type: ignore
+                            if value is None:
+                                value = symbol_table.get(var_name)  # type: ignore
+                        elif depth == DEPTH_GLOBAL:
+                            value = symbol_table.root.symbols.get(var_name)  # type: ignore
+                        else:
+                            value = symbol_table.get(var_name)  # type: ignore
+                        if value is None:
+                            raise ErrorSignal(RTError(pos_start, pos_end, "Function not defined", context))
+                        stack.append(value.copy().set_pos(*positions[(pc >> 1) - 1]))  # type: ignore
+
+                    elif op == OP_CALL or op == OP_CALL_KW:
+                        if op == OP_CALL:
+                            count = arg
+                            kwargs = {}
+                        else:
+                            count, kwarg_names = consts[arg]
+                            kwargs = dict(zip(kwarg_names, stack[len(stack) - len(kwarg_names):]))
+                            del stack[len(stack) - len(kwarg_names):]
+                        args = stack[len(stack) - count:]
+                        del stack[len(stack) - count:]
+                        value_to_call = stack.pop()
+
+                        if type(value_to_call) is Function and type(value_to_call.code) is Code:
+                            # The JIT tier first, as in Function.call.
+                            return_value = value_to_call.native_call(args, kwargs, context)
+                            if return_value is not None:
+                                stack.append(return_value.copy().set_pos(*positions[(pc >> 1) - 1]).set_context(context))  # type: ignore
+                            elif frames and not catches and ops[pc] == OP_RETURN and ops[pc + 1] >= 2:
+                                # A tail call takes over the frame of the
+                                # function making it, the way
+                                # Function.trampoline makes it.
+                                if value_to_call.plan is function.plan and not context.kept:  # type: ignore
+                                    exec_ctx = context
+                                elif ops[pc + 1] == 3:
+                                    exec_ctx = value_to_call.generate_new_context(context.parent)  # type: ignore
+                                    exec_ctx.parent_entry_pos = context.parent_entry_pos
+                                else:
+                                    exec_ctx = value_to_call.generate_new_context(context)
+                                error = value_to_call.plan.bind(value_to_call, args, kwargs, exec_ctx)
+                                if error:
+                                    raise ErrorSignal(error)
+                                if exec_ctx is not context and exec_ctx.parent is not context:
+                                    # Replaced, not kept for the callee.
+                                    function.release_context(context)  # type: ignore
+                                function = value_to_call
+                                code = value_to_call.code
+                                ops, consts, names, positions = code.ops, code.consts, code.names, code.positions
+                                stack = []
+                                context = exec_ctx
+                                pc = 0
+                            else:
+                                # Same steps as Function.call, with the body
+                                # run in a new frame of this loop.
+                                exec_ctx = value_to_call.generate_new_context(context)
+                                error = value_to_call.plan.bind(value_to_call, args, kwargs, exec_ctx)
+                                if error:
+                                    raise ErrorSignal(error)
+                                frames.append((code, pc, stack, context, catches, function, call_pos))
+                                function = value_to_call
+                                call_pos = positions[(pc >> 1) - 1]
+                                code = value_to_call.code
+                                ops, consts, names, positions = code.ops, code.consts, code.names, code.positions
+                                stack = []
+                                catches = []
+                                context = exec_ctx
+                                pc = 0
+                        else:
+                            return_value = value_to_call.call(args, kwargs, context)
+                            stack.append(return_value.copy().set_pos(*positions[(pc >> 1) - 1]).set_context(context))  # type: ignore
+
+                    elif op == OP_STRING:
+                        stack.append(String(consts[arg]).set_context(context).set_pos(*positions[(pc >> 1) - 1]))  # type: ignore
+
+                    elif op == OP_CONST:
+                        stack.append(consts[arg].copy().set_context(context).set_pos(*positions[(pc >> 1) - 1]))
+
+                    elif op == OP_PUSH_NULL:
+                        stack.append(Null)
+
+                    elif op == OP_BUILD_LIST:
+                        elements = stack[len(stack) - arg:]
+                        del stack[len(stack) - arg:]
+                        stack.append(List(elements).set_context(context).set_pos(*positions[(pc >> 1) - 1]))  # type: ignore
+
+                    elif op == OP_FOR_PREP:
+                        step_value = stack.pop()
+                        end_value = stack.pop()
+                        i = stack.pop().value
+                        if step_value.value == 0:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, "Step value cannot be zero", context))
+                        values = counted_range(i, end_value.value, step_value.value)
+                        if values is not None:
+                            # (iterator, store, key), see variable_store
+                            stack.append((iter(values), *variable_store(context.symbol_table, names[arg])))  # type: ignore
+                        else:
+                            # [i, end value, step, counting up, variable name]
+                            stack.append([i, end_value, step_value.value, step_value.value > 0, names[arg]])
+
+                    elif op == OP_TRUNCATE:
+                        del stack[arg:]
+
+                    elif op == OP_NEGATE or op == OP_NOT:
+                        if op == OP_NEGATE:
+                            number, error = stack[-1].multed_by(Number(-1))
+                        else:
+                            number, error = stack[-1].notted()
+                        if error:
+                            raise ErrorSignal(error)
+                        stack[-1] = number.set_pos(*positions[(pc >> 1) - 1])  # type: ignore
+
+                    elif op == OP_SET_POS:
+                        stack[-1] = stack[-1].set_pos(*positions[(pc >> 1) - 1])  # type: ignore
+
+                    elif op == OP_CHECK_KEY:
+                        if not isinstance(stack[-1], String):
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, "Dictionary keys must be strings", context))
+
+                    elif op == OP_BUILD_DICT:
+                        items = stack[len(stack) - 2 * arg:]
+                        del stack[len(stack) - 2 * arg:]
+                        elements: dict[str | int, Value] = {}
+                        for index in range(0, 2 * arg, 2):
+                            elements[items[index].value] = items[index + 1]
+                        stack.append(Dictionary(elements).set_context(context).set_pos(*positions[(pc >> 1) - 1]))  # type: ignore
+
+                    elif op == OP_SETUP_CATCH:
+                        catches.append((arg, len(stack)))
+
+                    elif op == OP_POP_CATCH:
+                        catches.pop()
+
+                    elif op == OP_CHECK_CALLABLE:
+                        if stack[-1] is None:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, "Function not defined", context))
+
+                    elif op == OP_MAKE_FUNCTION:
+                        var_name_tok, params, mul_args, mul_kwargs, layout, body_node, body = consts[arg]
+                        pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                        func_name = var_name_tok.value
+                        if func_name in global_reserved_symbols:
+                            raise ErrorSignal(RTError(pos_start, pos_end, f"'{func_name}' is a reserved symbol", context))
+                        # Failing defaults leave the argument without one, as
+                        # in the Interpreter.
+                        func_args = [(name, has_default, self.default_value(default, context) if default else None) for name, has_default, default in params]
+                        func_value = Function(func_name, body_node, func_args, mul_args, mul_kwargs, layout=layout, code=body).set_context(context).set_pos(pos_start, pos_end)
+                        context.symbol_table.set(func_name, func_value)  # type: ignore
+                        stack.append(func_value)
+
+                    elif op == OP_LOAD_TARGET:
+                        depth, slot, var_name = consts[arg]
+                        symbol_table = context.symbol_table
+                        if depth == 0:
+                            value = symbol_table.slots[slot]  # type: ignore
+                            if value is None:
+                                value = symbol_table.get(var_name)  # type: ignore
+                        elif depth == DEPTH_GLOBAL:
+                            value = symbol_table.root.symbols.get(var_name)  # type: ignore
+                        else:
+                            value = symbol_table.get(var_name)  # type: ignore
+                        if value is None:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(RTError(pos_start, pos_end, f"'{var_name}' is not defined", context))
+                        stack.append(value)
+
+                    elif op == OP_SET_INDEX:
+                        index = stack.pop()
+                        target = stack.pop()
+                        result, error = target.set_index(index, stack[-1])
+                        if not result:
+                            pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                            raise ErrorSignal(error or RTError(pos_start, pos_end, "Illegal operation", context))
+                        stack[-1] = result
+
+                    elif op == OP_IMPORT:
+                        node = consts[arg]
+                        stack.append(self.visitors[node.kind](VM(context), node, context))
+
+                    elif op == OP_FAIL:
+                        pos_start, pos_end = positions[(pc >> 1) - 1]  # type: ignore
+                        raise ErrorSignal(RTError(pos_start, pos_end, consts[arg], context))
+
+                    else:
+                        # OP_END, OP_RETURN and OP_EXIT_LOOP leave the frame.
+                        if not frames:
+                            if op == OP_END:
+                                return stack.pop()
+                            if op == OP_RETURN:
+                                raise ReturnSignal(Number(0) if arg == 1 else stack.pop())
+                            raise ContinueSignal() if arg else BreakSignal()
+
+                        if op == OP_END:
+                            value = stack.pop() if function.auto_return else None  # type: ignore
+                        elif op == OP_RETURN:
+                            value = Number(0) if arg == 1 else stack.pop()
+                        else:
+                            value = None
+                        value = value or Number(0)
+
+                        pos_start, pos_end = call_pos
+                        function.release_context(context)  # type: ignore
+                        code, pc, stack, context, catches, function, call_pos = frames.pop()
+                        ops, consts, names, positions = code.ops, code.consts, code.names, code.positions
+                        stack.append(value.copy().set_pos(pos_start, pos_end).set_context(context))
+
+            except (ErrorSignal, RecursionError) as signal:
+                if signal.__class__ is RecursionError:
+                    # Python's stack ran out in a call made from here, to a
+                    # builtin or native function.
+                    pos_start, pos_end = positions[(pc >> 1) - 1] or (None, None)
+                    signal = ErrorSignal(RTError(pos_start, pos_end, "Maximum recursion depth exceeded", context))
+                # Unwind to the innermost catch, which continues with None.
+                while not catches:
+                    if not frames:
+                        raise signal
+                    code, pc, stack, context, catches, function, call_pos = frames.pop()
+                ops, consts, names, positions = code.ops, code.consts, code.names, code.positions
+                pc, depth = catches.pop()
+                del stack[depth:]
+                stack.append(None)
+
+
+ENGINES["vm"] = VM
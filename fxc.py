@@ -0,0 +1,32 @@
+import argparse
+import fxaot
+import os
+import sys
+
+arg_parser = argparse.ArgumentParser(prog="fxc")
+commands = arg_parser.add_subparsers(dest="command", required=True)
+
+build_parser = commands.add_parser(
+    "build",
+    help="compile a script and the .fx modules it imports to one Python module",
+)
+build_parser.add_argument("file", help="script to compile")
+build_parser.add_argument(
+    "-o",
+    "--output",
+    help="Python file to write, the script's name with .py by default",
+)
+args = arg_parser.parse_args()
+
+if args.command == "build":
+    with open(args.file, "r") as file:
+        text = file.read()
+    code, error = fxaot.build(args.file, text)
+
+    if error:
+        print(error.as_string())
+        sys.exit(1)
+
+    output = args.output or os.path.splitext(args.file)[0] + ".py"
+    with open(output, "w") as file:
+        file.write(code)  # type: ignore
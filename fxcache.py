@@ -0,0 +1,140 @@
+from fxparser import *
+import copyreg
+import gc
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import tempfile
+
+#######################################
+# AST CACHE
+#######################################
+
+# Bumped whenever the parser or the node classes change shape, so trees
+# pickled by another FxPy are never loaded.
+FXPY_VERSION = "0.5.1"
+
+CACHE_DIR = "__fxcache__"
+CACHE_MAGIC = b"FXC"
+
+# The classes a parsed tree is made of: its nodes and the tokens and
+# positions they keep. Unpickling any other class could run whatever code
+# a planted entry names, so an entry naming one is not loaded.
+TREE_CLASSES: tuple[type, ...] = (*Node.__subclasses__(), Token, Position)
+
+# Set to False by `shell.py --no-cache`.
+enabled = True
+
+
+def parse(file_name: str, text: str) -> tuple[Any, Optional[Error]]:
+    # Returns the tree of `text`, read from the cache next to `file_name` when
+    # it was stored for the same source, mtime and FxPy version.
+    key = cache_key(file_name, text) if enabled else None
+    if key:
+        node = load(file_name, text, key)
+        if node is not None:
+            return node, None
+
+    tokens, error = Lexer(file_name, text).make_tokens()
+    if error:
+        return None, error
+    ast = Parser(tokens).parse()  # type: ignore
+    if ast.error:
+        return None, ast.error
+
+    if key:
+        store(file_name, ast.node, key)
+    return ast.node, None
+
+
+# Trees are stored as `<name>c`, other kinds of entry pass their own suffix
+# and magic.
+def cache_path(file_name: str, suffix: str = "c") -> str:
+    directory, name = os.path.split(file_name)
+    return os.path.join(directory, CACHE_DIR, name + suffix)
+
+
+def cache_key(file_name: str, text: str, magic: bytes = CACHE_MAGIC) -> Optional[bytes]:
+    try:
+        mtime = os.stat(file_name).st_mtime_ns
+    except (OSError, ValueError):
+        # Not a file, e.g. <stdin>
+        return None
+    digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    return b"%s %s %d %s\n" % (magic, FXPY_VERSION.encode(), mtime, digest.encode())
+
+
+class TreeUnpickler(pickle.Unpickler):
+    # The source text isn't stored with the tree, every reference to the
+    # Source is resolved to one made from the text that was just read.
+    # Only `classes` are found, see TREE_CLASSES.
+    def __init__(self, file: IO[bytes], source: Source, classes: Iterable[type]):
+        super().__init__(file)
+        self.source = source
+        self.classes = {(cls.__module__, cls.__qualname__): cls for cls in classes}
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == Source.__module__ and name == Source.__name__:
+            return lambda *args: self.source
+        cls = self.classes.get((module, name))
+        if cls is None:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a cache entry")
+        return cls
+
+
+# Entries other than trees pass the classes they hold besides TREE_CLASSES.
+def load(file_name: str, text: str, key: bytes, suffix: str = "c", classes: Iterable[type] = ()) -> Any:
+    try:
+        with open(cache_path(file_name, suffix), "rb") as file:
+            if file.readline() != key:
+                return None
+            # Collections would only walk the tree being built over and over.
+            gc.disable()
+            try:
+                return TreeUnpickler(file, Source(file_name, text), (*TREE_CLASSES, *classes)).load()
+            finally:
+                gc.enable()
+    except Exception:
+        # Missing, truncated or written by something else, parse again.
+        return None
+
+
+def store(file_name: str, node: Any, key: bytes, suffix: str = "c"):
+    path = cache_path(file_name, suffix)
+    buffer = io.BytesIO()
+    buffer.write(key)
+    pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[Source] = lambda source: (Source, (source.fn, ""))
+    try:
+        pickler.dump(node)
+    except (pickle.PicklingError, RecursionError):
+        return
+
+    # Written to a temporary file first and moved into place, so a reader
+    # never sees half of an entry.
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(buffer.getvalue())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        # A read only directory only means there is no cache.
+        pass
+
+
+def clear(root: str = ".") -> int:
+    removed = 0
+    for directory, dirs, _ in os.walk(root):
+        if CACHE_DIR in dirs:
+            shutil.rmtree(os.path.join(directory, CACHE_DIR), ignore_errors=True)
+            dirs.remove(CACHE_DIR)
+            removed += 1
+    return removed
@@ -0,0 +1,312 @@
+from interpreter import *
+from collections.abc import MutableMapping, MutableSequence
+import importlib
+import types
+
+#######################################
+# PYTHON VALUES
+#######################################
+
+# FxPy values are handed to Python as the Python values they wrap. Lists and
+# Dictionaries are passed as views on their elements, converted as they are
+# read and written, so neither is ever copied and changes made by Python
+# are seen by the program. Views and callbacks keep the context they were
+# made in (Context.keep), Python may use them after the call has returned.
+
+
+class ListView(MutableSequence):
+    __slots__ = ("list", "context")
+
+    def __init__(self, list_: List, context: Context):
+        self.list = list_
+        self.context = context
+        context.keep()
+
+    def __len__(self):
+        return len(self.list.elements)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [to_python(element, self.context) for element in self.list.elements[index]]  # type: ignore
+        return to_python(self.list.elements[index], self.context)  # type: ignore
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.list.elements[index] = [to_value(element) for element in value]
+        else:
+            self.list.elements[index] = to_value(value)
+
+    def __delitem__(self, index):
+        del self.list.elements[index]
+
+    def __iter__(self):
+        context = self.context
+        return (to_python(element, context) for element in self.list.elements)  # type: ignore
+
+    def insert(self, index, value):
+        self.list.elements.insert(index, to_value(value))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class DictionaryView(MutableMapping):
+    __slots__ = ("dictionary", "context")
+
+    def __init__(self, dictionary: Dictionary, context: Context):
+        self.dictionary = dictionary
+        self.context = context
+        context.keep()
+
+    def __len__(self):
+        return len(self.dictionary.elements)
+
+    def __getitem__(self, key):
+        return to_python(self.dictionary.elements[key], self.context)
+
+    # Changes reach every copy, like index assignment in the program, an
+    # argument is always a copy of the variable passed.
+    def __setitem__(self, key, value):
+        self.dictionary.elements[key] = to_value(value)
+
+    def __delitem__(self, key):
+        del self.dictionary.elements[key]
+
+    def __iter__(self):
+        return iter(self.dictionary.elements)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Callback:
+    # A FxPy function passed to Python, called back with converted arguments.
+    __slots__ = ("function", "context")
+
+    def __init__(self, function: BaseFunction, context: Context):
+        self.function = function
+        self.context = context
+        context.keep()
+
+    def __call__(self, *args, **kwargs):
+        value = self.function.call(
+            [to_value(arg) for arg in args],
+            {key: to_value(value) for key, value in kwargs.items()},
+            self.context,
+        )
+        return to_python(value, self.context)
+
+
+class PyObject(Value):
+    # Any other Python object, opaque to the program and handed back to
+    # Python as it is.
+    def __init__(self, object_: Any):
+        super().__init__()
+        self.object = object_
+
+    def is_true(self):
+        return bool(self.object)
+
+    def copy(self):
+        copy = PyObject(self.object)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
+
+    def __str__(self):
+        return str(self.object)
+
+    def __repr__(self):
+        return repr(self.object)
+
+
+def to_python(value: Value, context: Context) -> Any:
+    kind = type(value)
+    if kind is Number or kind is String:
+        return value.value  # type: ignore
+    elif kind is Boolean:
+        return bool(value.value)  # type: ignore
+    elif kind is List:
+        return ListView(value, context)  # type: ignore
+    elif kind is Dictionary:
+        return DictionaryView(value, context)  # type: ignore
+    elif kind is PyObject:
+        return value.object  # type: ignore
+    elif kind is NativeFunction:
+        return value.function  # type: ignore
+    elif isinstance(value, BaseFunction):
+        return Callback(value, context)
+    return value
+
+
+def to_value(object_: Any) -> Value:
+    if isinstance(object_, Value):
+        return object_
+    elif isinstance(object_, bool):
+        return Boolean(object_)
+    elif isinstance(object_, (int, float)):
+        return Number(object_)
+    elif isinstance(object_, str):
+        return String(object_)
+    elif object_ is None:
+        return Number(0)
+    elif isinstance(object_, ListView):
+        return object_.list
+    elif isinstance(object_, DictionaryView):
+        return object_.dictionary
+    elif isinstance(object_, Callback):
+        return object_.function
+    elif isinstance(object_, (list, tuple)):
+        return List([to_value(element) for element in object_])
+    elif isinstance(object_, dict):
+        return Dictionary({
+            key if isinstance(key, (str, int)) else str(key): to_value(value)
+            for key, value in object_.items()
+        })
+    elif callable(object_):
+        return NativeFunction(getattr(object_, "__name__", type(object_).__name__), object_)
+    return PyObject(object_)
+
+
+#######################################
+# NATIVE FUNCTIONS
+#######################################
+
+
+class NativeFunction(BaseFunction):
+    # A Python callable exposed to FxPy. Arguments are passed through
+    # to_python and the result comes back through to_value. With `raw` the
+    # callable gets the Values themselves and returns one, which skips both.
+    #
+    # `signature` declares the parameters, ["x", ("base", 10)] for a
+    # required x and an optional base, and calls are bound and checked like
+    # those of a builtin. Without one the arguments are passed on as given
+    # and Python checks them.
+    def __init__(self, name: str, function: Callable[..., Any], signature: Optional[list[str | tuple[str, Any]]] = None, raw: bool = False):
+        super().__init__(name)
+        self.function = function
+        self.raw = raw
+        self.plan = BindingPlan(signature_arg_names(signature), None, None, None) if signature is not None else None  # type: ignore
+
+    def execute(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context):
+        try:
+            return RTResult().success(self.call(args, kwargs, context))
+        except ErrorSignal as signal:
+            return RTResult().failure(signal.error)
+
+    def call(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context) -> Value:
+        plan = self.plan
+        if plan is not None and (kwargs or len(args) != len(plan.names)):
+            args, error = plan.collect(self, args, kwargs, self.frame(context))  # type: ignore
+            if error:
+                raise ErrorSignal(error)
+            kwargs = {}
+        try:
+            if self.raw:
+                result = self.function(*args, **kwargs)
+            else:
+                result = self.function(
+                    *[to_python(arg, context) for arg in args],
+                    **{str(key): to_python(value, context) for key, value in kwargs.items()},
+                )
+        except FlowSignal:
+            raise
+        except Exception as e:
+            raise self.fail(context, f"{type(e).__name__}: {e}")
+        return to_value(result)
+
+    def copy(self):
+        copy = NativeFunction.__new__(NativeFunction)
+        copy.__dict__.update(self.__dict__)
+        return copy
+
+
+def signature_arg_names(signature: list[str | tuple[str, Any]]) -> list[tuple[str, bool, Any]]:
+    return [
+        (param, False, Null) if isinstance(param, str) else (param[0], True, to_value(param[1]))
+        for param in signature
+    ]
+
+
+#######################################
+# MODULES
+#######################################
+
+# Namespaces given to register_module, found before Python's own modules.
+modules: dict[str, Any] = {}
+# Python modules a program may import besides those, see allow_module. A
+# module hands the program whatever it can do, so there are none until the
+# embedder names them.
+allowed_modules: set[str] = set()
+# Set to True to let programs import any Python module, which gives them
+# the whole process.
+import_any = False
+# The symbols of every module imported so far, by name. A module is only
+# imported and wrapped once a program imports it.
+loaded: dict[str, dict[str, Value]] = {}
+
+
+def load_module(name: str) -> Optional[dict[str, Value]]:
+    if name not in modules and name not in allowed_modules and not import_any:
+        return None
+    symbols = loaded.get(name)
+    if symbols is None:
+        namespace = modules.get(name)
+        if namespace is None:
+            try:
+                namespace = importlib.import_module(name)
+            except ImportError:
+                return None
+        symbols = loaded[name] = module_symbols(namespace)
+    return symbols
+
+
+def module_symbols(namespace: Any) -> dict[str, Value]:
+    if isinstance(namespace, dict):
+        items = list(namespace.items())
+    else:
+        names = getattr(namespace, "__all__", None) or [name for name in dir(namespace) if not name.startswith("_")]
+        items = [(name, getattr(namespace, name)) for name in names if hasattr(namespace, name)]
+
+    symbols: dict[str, Value] = {}
+    for name, object_ in items:
+        if isinstance(object_, types.ModuleType):
+            continue
+        if callable(object_) and not isinstance(object_, Value):
+            symbols[name] = NativeFunction(name, object_)
+        else:
+            symbols[name] = to_value(object_)
+    return symbols
+
+
+# `import py.<name>` and `from py.<name> import ...`
+module_loaders["py"] = load_module
+
+
+#######################################
+# EMBEDDING
+#######################################
+
+
+# Makes a Python callable or value the global `name` of the programs run
+# with `symbol_table`. See NativeFunction for `signature` and `raw`.
+def expose(name: str, object_: Any, signature: Optional[list[str | tuple[str, Any]]] = None, raw: bool = False, symbol_table: SymbolTable = global_symbol_table) -> Value:
+    if callable(object_) and not isinstance(object_, Value):
+        value = NativeFunction(name, object_, signature, raw)
+    else:
+        value = to_value(object_)
+    symbol_table.set(name, value)
+    return value
+
+
+# Makes `import py.<name>` import `namespace`, a module, class or dict of
+# names, instead of the Python module of that name. Values in it are
+# exposed as they are, so a NativeFunction can declare its signature.
+def register_module(name: str, namespace: Any):
+    modules[name] = namespace
+    loaded.pop(name, None)
+
+
+# Lets `import py.<name>` import the Python module `name` itself.
+def allow_module(name: str):
+    allowed_modules.add(name)
@@ -0,0 +1,392 @@
+from interpreter import *
+import ast
+
+#######################################
+# JIT
+#######################################
+
+# A function that gets hot, see Tier, is translated to a Python function
+# over plain ints and floats when all its body does is compute with numbers:
+# arithmetic, comparisons, locals, if, for and while loops and calls to
+# itself. Strings, lists, calls to anything else and so on leave it to its
+# own code.
+#
+# The translation only runs while its guards hold. Every argument has to be
+# a Number, every name read from outside the function a Number and every
+# name called the function itself, looked up in the calling context as the
+# body would. The body has no side effects, so when anything goes wrong in
+# it, an error that has to be reported where it happened or a local read
+# before it was set, the call is simply made again by the function's own
+# code.
+
+# Set to False by `shell.py --no-jit`, to compare the results with and
+# without it.
+enabled = True
+
+# Deoptimised calls after which a function stops using its translation.
+MAX_DEOPTS = 16
+
+# Kinds of translated expressions: a number, or a bool that only conditions
+# and `and`/`or` may use.
+KIND_NUMBER = 0
+KIND_BOOL = 1
+
+ARITHMETIC_OPERATORS = {
+    TT_PLUS: ast.Add,
+    TT_MINUS: ast.Sub,
+    TT_MUL: ast.Mult,
+    TT_DIV: ast.Div,
+    TT_POW: ast.Pow,
+}
+
+COMPARISON_OPERATORS = {
+    TT_EE: ast.Eq,
+    TT_NE: ast.NotEq,
+    TT_LT: ast.Lt,
+    TT_GT: ast.Gt,
+    TT_LTE: ast.LtE,
+    TT_GTE: ast.GtE,
+}
+
+LOGICAL_OPERATORS = {
+    # Both sides are always evaluated, like Boolean.anded_by and ored_by.
+    "and": ast.BitAnd,
+    "or": ast.BitOr,
+}
+
+
+class Unsupported(Exception):
+    # The body does something the translation doesn't cover.
+    pass
+
+
+class Deopt(Exception):
+    pass
+
+
+# What a local that isn't a parameter holds before it is first set. The
+# body would look the name up in the callers then.
+UNBOUND = object()
+
+
+def deopt():
+    raise Deopt()
+
+
+class Native:
+    # Entry to the translation of a function: checks the guards, unwraps the
+    # arguments and wraps the result. Returns None where the function's own
+    # code has to run the call.
+    __slots__ = ("tier", "code", "required", "defaults", "free", "targets", "deopts")
+
+    def __init__(self, tier: Tier, code: Callable[..., Any], required: int, defaults: list[Any], free: list[tuple[str, bool]], targets: list[tuple[str, bool]]):
+        self.tier = tier
+        self.code = code
+        self.required = required
+        # The value of every optional parameter left out, by position.
+        self.defaults = defaults
+        # Numbers and functions read from outside, as (name, global).
+        self.free = free
+        self.targets = targets
+        self.deopts = 0
+
+    def __call__(self, args: list[Value], context: Context) -> Optional[Value]:
+        values = []
+        for arg in args:
+            if arg.__class__ is not Number:
+                return None
+            values.append(arg.value)  # type: ignore
+        count = len(values)
+        if count != len(self.defaults):
+            if count < self.required or count > len(self.defaults):
+                return None
+            values.extend(self.defaults[count:])
+
+        symbol_table: SymbolTable = context.symbol_table  # type: ignore
+        for name, global_ in self.free:
+            value = symbol_table.root.symbols.get(name) if global_ else symbol_table.get(name)
+            if value.__class__ is not Number:
+                return None
+            values.append(value.value)  # type: ignore
+        for name, global_ in self.targets:
+            value = symbol_table.root.symbols.get(name) if global_ else symbol_table.get(name)
+            if value.__class__ is not Function or value.tier is not self.tier:  # type: ignore
+                return None
+
+        try:
+            result = self.code(*values)
+        except Exception:
+            self.deopts += 1
+            if self.deopts >= MAX_DEOPTS:
+                self.tier.native = None
+            return None
+        return Number(result)
+
+
+class Translator:
+    # Turns the body of a function into a Python function taking the values
+    # of its parameters, then of the names it reads from outside. Locals are
+    # the Python locals `l<slot>`.
+    def __init__(self, function: Function):
+        self.function = function
+        self.layout: dict[str, int] = function.layout  # type: ignore
+        self.free: dict[str, tuple[int, bool]] = {}
+        self.targets: dict[str, bool] = {}
+        # Calls of the function itself, given the values read from outside
+        # once the whole body is translated.
+        self.calls: list[ast.Call] = []
+        self.loops = 0
+        self.temps = 0
+
+        self.required = 0
+        self.defaults: list[Any] = []
+        for _, optional, default in function.arg_names:
+            if not optional:
+                self.required += 1
+                self.defaults.append(None)
+            elif default is None:
+                self.defaults.append(0)
+            elif default.__class__ is Number:
+                self.defaults.append(default.value)
+            else:
+                raise Unsupported()
+
+    def translate(self) -> Native:
+        function = self.function
+        if function.body_node is None or function.layout is None or function.mul_args or function.mul_kwargs:
+            raise Unsupported()
+        if function.auto_return or not function.plan.leading:
+            raise Unsupported()
+
+        count = len(self.defaults)
+        body = self.statements(function.body_node)
+        body.append(ast.Return(ast.Constant(0)))
+        unset = [
+            ast.Assign([store(f"l{slot}")], load("UNBOUND"))
+            for slot in range(count, len(self.layout))
+        ]
+
+        free = [f"g{index}" for index, _ in self.free.values()]
+        for call in self.calls:
+            call.args.extend(load(name) for name in free)
+        params = [ast.arg(f"l{slot}") for slot in range(count)] + [ast.arg(name) for name in free]
+        definition = ast.FunctionDef(
+            name="f",
+            args=ast.arguments(posonlyargs=[], args=params, vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]),
+            body=unset + body,
+            decorator_list=[],
+            returns=None,
+        )
+        definition.type_params = []  # type: ignore
+        module = ast.fix_missing_locations(ast.Module(body=[definition], type_ignores=[]))
+
+        namespace = {"UNBOUND": UNBOUND, "deopt": deopt}
+        exec(compile(module, f"<jit {function.name}>", "exec"), namespace)
+        return Native(
+            function.tier,
+            namespace["f"],
+            self.required,
+            self.defaults,
+            [(name, global_) for name, (_, global_) in self.free.items()],
+            list(self.targets.items()),
+        )
+
+    ###################################
+
+    def statements(self, node: Node) -> list[ast.stmt]:
+        kind = node.kind
+        if kind == NODE_LIST:
+            return [statement for element in node.element_nodes for statement in self.statements(element)]  # type: ignore
+
+        elif kind == NODE_VAR_ASSIGN:
+            if node.depth != 0 or node.var_name_tok.value in global_reserved_symbols:  # type: ignore
+                raise Unsupported()
+            return [ast.Assign([store(f"l{node.slot}")], self.number(node.value_node))]  # type: ignore
+
+        elif kind == NODE_RETURN:
+            if node.node_to_return is None:  # type: ignore
+                return [ast.Return(ast.Constant(0))]
+            return [ast.Return(self.number(node.node_to_return))]  # type: ignore
+
+        elif kind == NODE_IF:
+            orelse = self.block(node.else_case) if node.else_case else []  # type: ignore
+            for condition, body in reversed(node.cases):  # type: ignore
+                orelse = [ast.If(self.expression(condition)[0], self.block(body), orelse)]
+            return orelse
+
+        elif kind == NODE_WHILE:
+            condition = self.expression(node.condition_node)[0]  # type: ignore
+            return [ast.While(condition, self.loop_body(node.body_node), [])]  # type: ignore
+
+        elif kind == NODE_FOR:
+            return self.for_loop(node)  # type: ignore
+
+        elif kind == NODE_BREAK or kind == NODE_CONTINUE:
+            if not self.loops:
+                raise Unsupported()
+            return [ast.Break() if kind == NODE_BREAK else ast.Continue()]
+
+        return [ast.Expr(self.expression(node)[0])]
+
+    def block(self, node: Node) -> list[ast.stmt]:
+        return self.statements(node) or [ast.Pass()]
+
+    def loop_body(self, node: Node) -> list[ast.stmt]:
+        self.loops += 1
+        body = self.block(node)
+        self.loops -= 1
+        return body
+
+    def for_loop(self, node: ForNode) -> list[ast.stmt]:
+        # Same steps as Interpreter.visit_ForNode: the bounds are evaluated
+        # once and the variable is set before the counter moves on.
+        slot = self.layout.get(node.var_name_tok.value)  # type: ignore
+        if slot is None:
+            raise Unsupported()
+        i, end, step = self.temp(), self.temp(), self.temp()
+        statements: list[ast.stmt] = [
+            ast.Assign([store(i)], self.number(node.start_value_node)),
+            ast.Assign([store(end)], self.number(node.end_value_node)),
+            ast.Assign([store(step)], self.number(node.step_value_node)),
+        ]
+
+        step_node = node.step_value_node
+        if step_node.kind == NODE_NUMBER:
+            step_constant = step_node.tok.value  # type: ignore
+        elif step_node.kind == NODE_CONST and step_node.value.__class__ is Number:  # type: ignore
+            step_constant = step_node.value.value  # type: ignore
+        else:
+            step_constant = None
+        if step_constant is not None:
+            if step_constant == 0:
+                raise Unsupported()
+            up: ast.expr = ast.Constant(step_constant > 0)
+        else:
+            # A zero step is an error, the function's own code reports it.
+            statements.append(ast.If(ast.Compare(load(step), [ast.Eq()], [ast.Constant(0)]), [ast.Expr(ast.Call(load("deopt"), [], []))], []))
+            up_name = self.temp()
+            statements.append(ast.Assign([store(up_name)], ast.Compare(load(step), [ast.Gt()], [ast.Constant(0)])))
+            up = load(up_name)
+
+        if isinstance(up, ast.Constant):
+            condition: ast.expr = ast.Compare(load(i), [ast.LtE() if up.value else ast.GtE()], [load(end)])
+        else:
+            condition = ast.IfExp(
+                up,
+                ast.Compare(load(i), [ast.LtE()], [load(end)]),
+                ast.Compare(load(i), [ast.GtE()], [load(end)]),
+            )
+        body: list[ast.stmt] = [
+            ast.Assign([store(f"l{slot}")], load(i)),
+            ast.AugAssign(store(i), ast.Add(), load(step)),
+        ]
+        statements.append(ast.While(condition, body + self.loop_body(node.body_node), []))
+        return statements
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"t{self.temps}"
+
+    ###################################
+
+    def number(self, node: Node) -> ast.expr:
+        expression, kind = self.expression(node)
+        if kind != KIND_NUMBER:
+            raise Unsupported()
+        return expression
+
+    def expression(self, node: Node) -> tuple[ast.expr, int]:
+        kind = node.kind
+        if kind == NODE_NUMBER:
+            return ast.Constant(node.tok.value), KIND_NUMBER  # type: ignore
+
+        elif kind == NODE_CONST:
+            value = node.value  # type: ignore
+            if value.__class__ is Number:
+                return ast.Constant(value.value), KIND_NUMBER
+            elif value.__class__ is Boolean:
+                return ast.Constant(bool(value.value)), KIND_BOOL
+            raise Unsupported()
+
+        elif kind == NODE_VAR_ACCESS:
+            name: str = node.var_name_tok.value  # type: ignore
+            if node.depth != 0:  # type: ignore
+                index, _ = self.free.setdefault(name, (len(self.free), node.depth == DEPTH_GLOBAL))  # type: ignore
+                return load(f"g{index}"), KIND_NUMBER
+            local = f"l{node.slot}"  # type: ignore
+            if node.slot < len(self.defaults):  # type: ignore
+                return load(local), KIND_NUMBER
+            # Read before it is set, the body would look in the callers.
+            return ast.IfExp(
+                ast.Compare(load(local), [ast.IsNot()], [load("UNBOUND")]),
+                load(local),
+                ast.Call(load("deopt"), [], []),
+            ), KIND_NUMBER
+
+        elif kind == NODE_BIN_OP:
+            op_tok = node.op_tok  # type: ignore
+            key = op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type
+            left, left_kind = self.expression(node.left_node)  # type: ignore
+            right, right_kind = self.expression(node.right_node)  # type: ignore
+            if key in LOGICAL_OPERATORS and left_kind == KIND_BOOL:
+                if right_kind == KIND_NUMBER:
+                    right = ast.Compare(right, [ast.NotEq()], [ast.Constant(0)])
+                return ast.BinOp(left, LOGICAL_OPERATORS[key](), right), KIND_BOOL
+            if left_kind != KIND_NUMBER or right_kind != KIND_NUMBER:
+                raise Unsupported()
+            if key in ARITHMETIC_OPERATORS:
+                return ast.BinOp(left, ARITHMETIC_OPERATORS[key](), right), KIND_NUMBER
+            elif key in COMPARISON_OPERATORS:
+                return ast.Compare(left, [COMPARISON_OPERATORS[key]()], [right]), KIND_BOOL
+            raise Unsupported()
+
+        elif kind == NODE_UNARY_OP:
+            value, value_kind = self.expression(node.node)  # type: ignore
+            op_type = node.op_tok.type  # type: ignore
+            if op_type == TT_MINUS and value_kind == KIND_NUMBER:
+                return ast.BinOp(value, ast.Mult(), ast.Constant(-1)), KIND_NUMBER
+            elif op_type == TT_NOT and value_kind == KIND_BOOL:
+                return ast.UnaryOp(ast.Not(), value), KIND_BOOL
+            elif op_type != TT_MINUS and op_type != TT_NOT:
+                return value, value_kind
+            raise Unsupported()
+
+        elif kind == NODE_FUNC_CALL:
+            return self.call(node), KIND_NUMBER  # type: ignore
+
+        raise Unsupported()
+
+    def call(self, node: FuncCallNode) -> ast.expr:
+        # Only calls of the function itself, checked by its Native.
+        target = node.node_to_call
+        if target.kind != NODE_VAR_ACCESS or target.depth == 0 or node.kwargs_nodes:  # type: ignore
+            raise Unsupported()
+        if not self.required <= len(node.arg_nodes) <= len(self.defaults):
+            raise Unsupported()
+        self.targets.setdefault(target.var_name_tok.value, target.depth == DEPTH_GLOBAL)  # type: ignore
+
+        args = [self.number(arg) for arg in node.arg_nodes]
+        args += [ast.Constant(default) for default in self.defaults[len(args):]]
+        call = ast.Call(load("f"), args, [])
+        self.calls.append(call)
+        return call
+
+
+def load(name: str) -> ast.Name:
+    return ast.Name(name, ast.Load())
+
+
+def store(name: str) -> ast.Name:
+    return ast.Name(name, ast.Store())
+
+
+def compile_function(function: Function) -> Optional[Native]:
+    if not enabled:
+        return None
+    try:
+        return Translator(function).translate()
+    except (Unsupported, SyntaxError, RecursionError):
+        return None
+
+
+Tier.compiler = compile_function
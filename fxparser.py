@@ -1,4 +1,4 @@
-from typing import Any, Callable, Self
+from typing import Any, Iterable, Iterator, Self
 from lexer import *
 
 #######################################
@@ -6,127 +6,249 @@ from lexer import *
 #######################################
 
 
-class NumberNode:
+# Node kinds, used by the interpreter to dispatch without looking at the
+# class name. The numbers are stable and must not be reused.
+NODE_NUMBER = 0
+NODE_BIN_OP = 1
+NODE_UNARY_OP = 2
+NODE_VAR_ACCESS = 3
+NODE_VAR_ASSIGN = 4
+NODE_STRING = 5
+NODE_RETURN = 6
+NODE_CONTINUE = 7
+NODE_BREAK = 8
+NODE_IF = 9
+NODE_LIST = 10
+NODE_FOR = 11
+NODE_WHILE = 12
+NODE_FUNC_DEF = 13
+NODE_FUNC_CALL = 14
+NODE_IMPORT = 15
+NODE_FROM_IMPORT = 16
+NODE_DICT = 17
+NODE_CONST = 18
+NODE_SET_INDEX = 19
+
+# Where a variable lives, filled in by the resolver. Depth 0 is a slot in the
+# running function's frame, DEPTH_GLOBAL the program's own symbol table and
+# DEPTH_DYNAMIC means looking the name up through the calling frames.
+DEPTH_DYNAMIC = -2
+DEPTH_GLOBAL = -1
+
+# How a `return f(...)` is made as a tail call, filled in by the resolver.
+# TAIL_CALL keeps the frame of the function making it for the callee to
+# look names up in. With TAIL_CALL_REPLACE no other frame reads the names
+# it binds, so the callee's frame takes its place.
+TAIL_CALL = 1
+TAIL_CALL_REPLACE = 2
+
+
+class Node:
+    # Positions are kept as offsets into the source. `end_after` is set when
+    # the end offset points just past the node, as token ends do. Position
+    # objects are only made when the interpreter asks for them, and are then
+    # kept since the same node is usually visited many times.
+    __slots__ = ("start", "end", "end_after", "source", "_pos_start", "_pos_end")
+    kind = -1
+
+    def set_span(self, first: "Node | Token", last: "Node | Token"):
+        self.start = first.start
+        self.source = first.source
+        self.end = last.end
+        self.end_after = last.end_after
+        self._pos_start = self._pos_end = None
+
+    def set_positions(self, pos_start: Position, pos_end: Position):
+        self.start = pos_start.idx
+        self.source = pos_start.source
+        self.end = pos_end.idx
+        self.end_after = pos_end.after
+        self._pos_start = self._pos_end = None
+
+    def children(self) -> Iterator["Node"]:
+        # The nodes directly below this one, in field order.
+        for field in type(self).__slots__:
+            yield from child_nodes(getattr(self, field))
+
+    @property
+    def pos_start(self) -> Position:
+        pos = self._pos_start
+        if pos is None:
+            pos = self._pos_start = Position(self.start, self.source)
+        return pos
+
+    @property
+    def pos_end(self) -> Position:
+        pos = self._pos_end
+        if pos is None:
+            pos = self._pos_end = Position(self.end, self.source, self.end_after)
+        return pos
+
+
+def child_nodes(value: Any) -> Iterator[Node]:
+    if isinstance(value, Node):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from child_nodes(item)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from child_nodes(key)
+            yield from child_nodes(item)
+
+
+class NumberNode(Node):
+    __slots__ = ("tok",)
+    kind = NODE_NUMBER
+
     def __init__(self, tok: Token):
         self.tok = tok
 
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+        self.set_span(tok, tok)
 
 
+class BinOpNode(Node):
+    # `feedback` is kept by the interpreters, see BinOpFeedback.
+    __slots__ = ("left_node", "op_tok", "right_node", "feedback")
+    kind = NODE_BIN_OP
 
-class BinOpNode:
-    def __init__(self, left_node: Any, op_tok: Token, right_node: Any): # Any
+    def __init__(self, left_node: Node, op_tok: Token, right_node: Node):
         self.left_node = left_node
         self.op_tok = op_tok
         self.right_node = right_node
+        self.feedback = None
 
-        self.pos_start = self.left_node.pos_start
-        self.pos_end = self.right_node.pos_end
+        self.set_span(left_node, right_node)
 
 
+class UnaryOpNode(Node):
+    __slots__ = ("op_tok", "node")
+    kind = NODE_UNARY_OP
 
-class UnaryOpNode:
-    def __init__(self, op_tok: Token, node: Any): # Any
+    def __init__(self, op_tok: Token, node: Node):
         self.op_tok = op_tok
         self.node = node
 
-        self.pos_start = self.op_tok.pos_start
-        self.pos_end = node.pos_end
+        self.set_span(op_tok, node)
 
 
+class VarAccessNode(Node):
+    __slots__ = ("var_name_tok", "depth", "slot")
+    kind = NODE_VAR_ACCESS
 
-class VarAccessNode:
-    def __init__(self, var_name_tok: Token): 
+    def __init__(self, var_name_tok: Token):
         self.var_name_tok = var_name_tok
+        self.depth = DEPTH_DYNAMIC
+        self.slot = -1
 
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.var_name_tok.pos_end
+        self.set_span(var_name_tok, var_name_tok)
 
     def __repr__(self):
         return f"{self.var_name_tok}"
 
 
-class VarAssignNode:
-    def __init__(self, var_name_tok: Token, value_node: Any): # Any
+class VarAssignNode(Node):
+    __slots__ = ("var_name_tok", "value_node", "depth", "slot")
+    kind = NODE_VAR_ASSIGN
+
+    def __init__(self, var_name_tok: Token, value_node: Node):
         self.var_name_tok = var_name_tok
         self.value_node = value_node
+        self.depth = DEPTH_DYNAMIC
+        self.slot = -1
+
+        self.set_span(var_name_tok, value_node)
+
+
+class SetIndexNode(Node):
+    # `let a/i = v`. `base_node` is the VarAccessNode of `a`, or for
+    # `let a/i/j = v` the BinOpNode reading `a/i`.
+    __slots__ = ("base_node", "index_node", "value_node")
+    kind = NODE_SET_INDEX
+
+    def __init__(self, base_node: Node, index_node: Node, value_node: Node):
+        self.base_node = base_node
+        self.index_node = index_node
+        self.value_node = value_node
 
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.value_node.pos_end
+        self.set_span(base_node, value_node)
 
 
+class StringNode(Node):
+    __slots__ = ("tok",)
+    kind = NODE_STRING
 
-class StringNode:
     def __init__(self, tok: Token):
         self.tok = tok
 
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
-
+        self.set_span(tok, tok)
 
 
+class ReturnNode(Node):
+    # `tail` is set by the resolver on a `return f(...)` that can be made as
+    # a tail call, to TAIL_CALL or TAIL_CALL_REPLACE.
+    __slots__ = ("node_to_return", "tail")
+    kind = NODE_RETURN
 
-class ReturnNode:
-    def __init__(
-        self, node_to_return: Any, pos_start: Position, pos_end: Position 
-    ):
+    def __init__(self, node_to_return: Optional[Node], pos_start: Position, pos_end: Position):
         self.node_to_return = node_to_return
-        self.pos_start = pos_start
-        self.pos_end = pos_end
+        self.tail = 0
 
+        self.set_positions(pos_start, pos_end)
 
 
-class ContinueNode:
-    def __init__(self, pos_start: Position, pos_end: Position):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
+class ContinueNode(Node):
+    __slots__ = ()
+    kind = NODE_CONTINUE
 
+    def __init__(self, pos_start: Position, pos_end: Position):
+        self.set_positions(pos_start, pos_end)
 
 
+class BreakNode(Node):
+    __slots__ = ()
+    kind = NODE_BREAK
 
-class BreakNode:
     def __init__(self, pos_start: Position, pos_end: Position):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
+        self.set_positions(pos_start, pos_end)
 
-        return f"break"
 
+class IfNode(Node):
+    __slots__ = ("cases", "else_case")
+    kind = NODE_IF
 
-class IfNode:
-    ## cases: list of tuple of condition and statements || Can be Any
-    def __init__(
-        self, cases: list[tuple[BinOpNode, BinOpNode]], else_case: Optional[BinOpNode]
-    ):
+    ## cases: list of tuple of condition and statements
+    def __init__(self, cases: list[tuple[Node, Node]], else_case: Optional[Node]):
         self.cases = cases
         self.else_case = else_case
 
-        self.pos_start:Position = self.cases[0][0].pos_start
-        self.pos_end:Position = (self.else_case or self.cases[-1][0]).pos_end  # type: ignore
+        self.set_span(cases[0][0], else_case or cases[-1][0])
 
 
+class ListNode(Node):
+    __slots__ = ("element_nodes",)
+    kind = NODE_LIST
 
-class ListNode:
-    def __init__(
-        self, element_nodes: Any, pos_start: Position, pos_end: Position
-    ):
+    def __init__(self, element_nodes: list[Node], pos_start: Position, pos_end: Position):
         self.element_nodes = element_nodes
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        
+
+        self.set_positions(pos_start, pos_end)
+
     def __repr__(self):
         return f"({self.element_nodes})"
 
 
+class ForNode(Node):
+    __slots__ = ("var_name_tok", "start_value_node", "end_value_node", "step_value_node", "body_node")
+    kind = NODE_FOR
 
-class ForNode:
     def __init__(
         self,
         var_name_tok: Token,
-        start_value_node: Any,
-        end_value_node: Any,
-        step_value_node: Any,
-        body_node: BinOpNode,
+        start_value_node: Node,
+        end_value_node: Node,
+        step_value_node: Node,
+        body_node: Node,
     ):
         self.var_name_tok = var_name_tok
         self.start_value_node = start_value_node
@@ -134,94 +256,117 @@ class ForNode:
         self.step_value_node = step_value_node
         self.body_node = body_node
 
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end: Position = self.body_node.pos_end
+        self.set_span(var_name_tok, body_node)
+
 
+class WhileNode(Node):
+    __slots__ = ("condition_node", "body_node")
+    kind = NODE_WHILE
 
-class WhileNode:
-    def __init__(self, condition_node: Any, body_node: Any):
+    def __init__(self, condition_node: Node, body_node: Node):
         self.condition_node = condition_node
         self.body_node = body_node
 
-        self.pos_start = self.condition_node.pos_start
-        self.pos_end = self.body_node.pos_end
+        self.set_span(condition_node, body_node)
 
 
+class FuncDefNode(Node):
+    __slots__ = ("var_name_tok", "arg_name_toks", "mulargs", "mulkwargs", "body_node", "layout")
+    kind = NODE_FUNC_DEF
 
-
-class FuncDefNode:
     def __init__(
         self,
         var_name_tok: Optional[Token],
-        arg_name_toks: list[tuple[Token|str, bool, Any]],
-        mulargs: Token|None,
-        mulkwargs: Token|None,
-        body_node: Any,
+        arg_name_toks: list[tuple[Token, bool, Any]],
+        mulargs: Token | None,
+        mulkwargs: Token | None,
+        body_node: Node,
     ):
         self.var_name_tok = var_name_tok
         self.arg_name_toks = arg_name_toks
         self.body_node = body_node
         self.mulargs = mulargs
         self.mulkwargs = mulkwargs
+        # Frame slot of every name the body binds, set by the resolver.
+        self.layout: Optional[dict[str, int]] = None
 
-        if self.var_name_tok:
-            self.pos_start = self.var_name_tok.pos_start
-        elif len(self.arg_name_toks) > 0:
-            self.pos_start = self.arg_name_toks[0][0].pos_start if isinstance(self.arg_name_toks[0][0], Token) else None
+        if var_name_tok:
+            self.set_span(var_name_tok, body_node)
+        elif arg_name_toks:
+            self.set_span(arg_name_toks[0][0], body_node)
         else:
-            self.pos_start = self.body_node.pos_start
-
-        self.pos_end = self.body_node.pos_end
+            self.set_span(body_node, body_node)
 
     def __repr__(self):
         return f"func {self.var_name_tok}({self.arg_name_toks})\n {self.body_node}"
 
 
-class FuncCallNode:
-    def __init__(self, node_to_call: Any, arg_nodes: list[Any], kwargs_nodes: list[tuple[Token, Any]] = []):
+class FuncCallNode(Node):
+    __slots__ = ("node_to_call", "arg_nodes", "kwargs_nodes")
+    kind = NODE_FUNC_CALL
+
+    def __init__(self, node_to_call: Node, arg_nodes: list[Node], kwargs_nodes: list[tuple[Token, Node]] = []):
         self.node_to_call = node_to_call
         self.arg_nodes = arg_nodes
         self.kwargs_nodes = kwargs_nodes
 
-        self.pos_start = self.node_to_call.pos_start
-
-        if self.arg_nodes:
-            try:
-                self.pos_end = self.arg_nodes[len(arg_nodes) - 1].pos_end
-            except AttributeError:
-                self.pos_end = self.node_to_call.pos_end
-        elif self.kwargs_nodes:
-            self.pos_end = self.kwargs_nodes[-1][1].pos_end
+        if arg_nodes:
+            self.set_span(node_to_call, arg_nodes[-1])
+        elif kwargs_nodes:
+            self.set_span(node_to_call, kwargs_nodes[-1][1])
         else:
-            self.pos_end = self.node_to_call.pos_end
+            self.set_span(node_to_call, node_to_call)
 
     def __repr__(self):
         return f"{self.node_to_call}({self.arg_nodes})"
 
-class ImportNode:
-    def __init__(self, module_name: Token, alias: Token|None = None, pos_start: Position|None = None, pos_end: Position|None = None):
+
+class ImportNode(Node):
+    __slots__ = ("module_name", "alias")
+    kind = NODE_IMPORT
+
+    def __init__(self, module_name: Token, alias: Token | None, pos_start: Position, pos_end: Position):
         self.module_name = module_name
         self.alias = alias or module_name
 
-        self.pos_start = pos_start or self.module_name.pos_start
-        self.pos_end = pos_end or self.alias.pos_ends # type: ignore
+        self.set_positions(pos_start, pos_end)
 
-    
-class FromImportNode:
-    def __init__(self, module_name: Token, functions: list[tuple[Token, Token|None]], pos_start: Position, pos_end: Position):
+
+class FromImportNode(Node):
+    __slots__ = ("module_name", "functions")
+    kind = NODE_FROM_IMPORT
+
+    def __init__(self, module_name: Token, functions: list[tuple[Token, Token | None]], pos_start: Position, pos_end: Position):
         self.module_name = module_name
         self.functions = functions
 
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        
+        self.set_positions(pos_start, pos_end)
+
+
+class DictNode(Node):
+    __slots__ = ("key_value_pairs",)
+    kind = NODE_DICT
+
+    def __init__(self, key_value_pairs: dict[Any, Any], pos_start: Position, pos_end: Position):
+        self.key_value_pairs = key_value_pairs
+
+        self.set_positions(pos_start, pos_end)
+
+
+class ConstNode(Node):
+    # Made by the optimizer for a subtree that always evaluates to `value`,
+    # it keeps the span of the node it replaces.
+    __slots__ = ("value",)
+    kind = NODE_CONST
+
+    def __init__(self, value: Any, node: Node):
+        self.value = value
+
+        self.set_span(node, node)
+
+    def __repr__(self):
+        return f"{self.value!r}"
 
-class DictNode:
-        def __init__(self, key_value_pairs: dict[Any, Any], pos_start: Position, pos_end: Position):
-            self.key_value_pairs = key_value_pairs
-            self.pos_start = pos_start
-            self.pos_end = pos_end
-           
 
 #######################################
 # PARSE RESULT
@@ -233,7 +378,6 @@ class ParseResult:
         self.error: Optional[Error] = None
         self.node: Optional[Any] = None
         self.last_registered_advance_count = 0
-        self.to_reverse_count = 0
         self.advance_count = 0
 
     def register_advancement(self):
@@ -247,12 +391,6 @@ class ParseResult:
             self.error = res.error
         return res.node
 
-    def try_register(self, res: Self):
-        if res.error:
-            self.to_reverse_count = res.advance_count
-            return None
-        return self.register(res)
-
     def success(self, node: Any):
         self.node = node
         return self
@@ -263,23 +401,103 @@ class ParseResult:
         return self
 
 
+#######################################
+# OPERATOR PRECEDENCE
+#######################################
+
+# Keyword operators are keyed by their value, all others by token type.
+BINARY_PRECEDENCE: dict[str, int] = {
+    "and": 1,
+    "or": 1,
+    TT_EE: 2,
+    TT_NE: 2,
+    TT_LT: 2,
+    TT_GT: 2,
+    TT_LTE: 2,
+    TT_GTE: 2,
+    TT_PLUS: 3,
+    TT_MINUS: 3,
+    TT_MOD: 4,
+    TT_MUL: 5,
+    TT_DIV: 5,
+    TT_POW: 6,
+}
+
+LOWEST_PRECEDENCE = 1
+COMPARISON_PRECEDENCE = 2
+POWER_PRECEDENCE = 6
+
+
 #######################################
 # PARSER
 #######################################
 
 
+TOKEN_WINDOW = 512
+
+# Tokens an expression can start with, `return` only parses a value when
+# one of these follows it.
+EXPR_START_TYPES = frozenset(
+    (
+        TT_INT,
+        TT_FLOAT,
+        TT_STRING,
+        TT_IDENTIFIER,
+        TT_LPAREN,
+        TT_LSQB,
+        TT_LBRACE,
+        TT_PLUS,
+        TT_MINUS,
+        TT_NOT,
+    )
+)
+EXPR_START_KEYWORDS = frozenset(("let", "if", "for", "while", "fex", "import", "from"))
+
+
 class Parser:
-    def __init__(self, tokens: list[Token]):
-        self.tokens = tokens
+    # Tokens are read through a ring buffer of the last `window` tokens, so a
+    # streamed token iterator is never held in memory as a whole. A list of
+    # tokens is used directly as a ring that covers everything.
+    def __init__(self, tokens: Iterable[Token], window: int = TOKEN_WINDOW):
+        if isinstance(tokens, list):
+            self.tokens: Iterator[Token] = iter(())
+            self.ring: list[Token | None] = tokens
+            self.window = max(len(tokens), 1)
+            self.read_count = len(tokens)
+        else:
+            self.tokens = iter(tokens)
+            self.ring = [None] * window
+            self.window = window
+            self.read_count = 0
         self.tok_idx = -1
         self.advance()
 
     def advance(self) -> Token:
         self.tok_idx += 1
-        if self.tok_idx < len(self.tokens):
-            self.current_tok = self.tokens[self.tok_idx]
+        self.update_current_tok()
         return self.current_tok
 
+    def peek(self) -> Token:
+        # Returns the token after the current one without moving, the EOF
+        # token is returned again once the end is reached.
+        self.read_to(self.tok_idx + 1)
+        if self.tok_idx + 1 < self.read_count:
+            return self.ring[(self.tok_idx + 1) % self.window]  # type: ignore
+        return self.current_tok
+
+    def read_to(self, idx: int):
+        while idx >= self.read_count:
+            tok = next(self.tokens, None)
+            if tok is None:
+                break
+            self.ring[self.read_count % self.window] = tok
+            self.read_count += 1
+
+    def update_current_tok(self):
+        self.read_to(self.tok_idx)
+        if self.tok_idx < self.read_count:
+            self.current_tok: Token = self.ring[self.tok_idx % self.window]  # type: ignore
+
     def parse(self):
         res = self.statements()
         if not res.error and self.current_tok.type != TT_EOF:
@@ -339,11 +557,10 @@ class Parser:
 
         return res.success(ListNode(statements, pos_start, statements[-1].pos_end))
 
-    def reverse(self, amount: int = 1) -> Token:
-        self.tok_idx -= amount
-        if self.tok_idx >= 0 and self.tok_idx < len(self.tokens):
-            self.current_tok = self.tokens[self.tok_idx]
-        return self.current_tok
+    def starts_expr(self, tok: Token) -> bool:
+        if tok.type == TT_KEYWORD:
+            return tok.value in EXPR_START_KEYWORDS
+        return tok.type in EXPR_START_TYPES
 
     def statement(self):
         res = ParseResult()
@@ -353,9 +570,11 @@ class Parser:
             res.register_advancement()
             self.advance()
 
-            expr = res.try_register(self.expr())
-            if not expr:
-                self.reverse(res.to_reverse_count)
+            expr = None
+            if self.starts_expr(self.current_tok):
+                expr = res.register(self.expr())
+                if res.error:
+                    return res
             return res.success(
                 ReturnNode(expr, pos_start, self.current_tok.pos_start.copy())
             )
@@ -402,6 +621,19 @@ class Parser:
                 res.register_advancement()
                 self.current_tok = self.advance()
 
+                # `let a/i/j = v` sets index j of a/i
+                target: Node = VarAccessNode(varname)
+                index = None
+                while self.current_tok.type == TT_DIV:
+                    if index is not None:
+                        target = BinOpNode(target, div_tok, index)
+                    div_tok = self.current_tok
+                    res.register_advancement()
+                    self.advance()
+                    index = res.register(self.binary_expr(POWER_PRECEDENCE))
+                    if res.error:
+                        return res
+
                 if self.current_tok.type == TT_EQ:
                     self.advance()
                     expr = res.register(self.expr())
@@ -413,6 +645,8 @@ class Parser:
                                 "Expected expression",
                             )
                         )
+                    if index is not None:
+                        return res.success(SetIndexNode(target, index, expr))
                     return res.success(VarAssignNode(varname, expr))
                 else:
                     return res.failure(
@@ -432,9 +666,7 @@ class Parser:
                     )
                 )
 
-        node = res.register(
-            self.bin_op(self.comp_expr, ((TT_KEYWORD, "and"), (TT_KEYWORD, "or")))
-        )
+        node = res.register(self.binary_expr(LOWEST_PRECEDENCE))
 
         if res.error:
             return res.failure(
@@ -447,57 +679,62 @@ class Parser:
 
         return res.success(node)
 
-    def comp_expr(self) -> ParseResult:  # ParseResult is used to return error or node
+    def binary_expr(self, min_precedence: int) -> ParseResult:  # ParseResult is used to return error or node
+        # Precedence climbing over BINARY_PRECEDENCE. Operands of 'and'/'or'
+        # may start with 'not', operands of the arithmetic operators may only
+        # start with a sign. '^' is right associative, the rest bind left.
         res = ParseResult()
+        tok = self.current_tok
 
-        if self.current_tok.type == TT_NOT:
-            op_tok = self.current_tok
+        if tok.type == TT_NOT and min_precedence <= COMPARISON_PRECEDENCE:
             res.register_advancement()
             self.advance()
 
-            node = res.register(self.comp_expr())
+            node = res.register(self.binary_expr(COMPARISON_PRECEDENCE))
             if res.error:
                 return res
-            return res.success(UnaryOpNode(op_tok, node))
+            left = UnaryOpNode(tok, node)
+        elif tok.type in (TT_PLUS, TT_MINUS):
+            res.register_advancement()
+            self.advance()
 
-        node = res.register(
-            self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE))
-        )
+            node = res.register(self.binary_expr(POWER_PRECEDENCE))
+            if res.error:
+                return res
+            left = UnaryOpNode(tok, node)
+        else:
+            left = res.register(self.call())
+            if res.error:
+                if min_precedence <= COMPARISON_PRECEDENCE:
+                    return res.failure(
+                        InvalidSyntaxError(
+                            self.current_tok.pos_start,
+                            self.current_tok.pos_end,
+                            "Expected expression",
+                        )
+                    )
+                return res
 
-        if res.error:
-            return res.failure(
-                InvalidSyntaxError(
-                    self.current_tok.pos_start,
-                    self.current_tok.pos_end,
-                    "Expected expression",
-                )
+        while True:
+            op_tok = self.current_tok
+            precedence = BINARY_PRECEDENCE.get(
+                op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type  # type: ignore
             )
+            if precedence is None or precedence < min_precedence:
+                break
 
-        return res.success(node)
-
-    def arith_expr(self) -> ParseResult:  # ParseResult is used to return error or node
-        return self.bin_op(self.mod, ((TT_PLUS, TT_MINUS)))
-
-    def mod(self) -> ParseResult:  # ParseResult is used to return error or node
-        return self.bin_op(self.term, ((TT_MOD,)))
-
-    def term(self) -> ParseResult:  # ParseResult is used to return error or node
-        return self.bin_op(self.factor, ((TT_MUL, TT_DIV)))
-
-    def factor(self) -> ParseResult:  # ParseResult is used to return error or node
-        res = ParseResult()
-        tok = self.current_tok
-        if tok.type in (TT_PLUS, TT_MINUS):
             res.register_advancement()
             self.advance()
-            factor = res.register(self.factor())
+
+            if precedence == POWER_PRECEDENCE:
+                right = res.register(self.binary_expr(POWER_PRECEDENCE))
+            else:
+                right = res.register(self.binary_expr(precedence + 1))
             if res.error:
                 return res
-            return res.success(UnaryOpNode(tok, factor))
-        return self.power()
+            left = BinOpNode(left, op_tok, right)
 
-    def power(self) -> ParseResult:  # ParseResult is used to return error or node
-        return self.bin_op(self.call, (TT_POW,), self.factor)
+        return res.success(left)
 
     def if_expr(self) -> ParseResult:  # ParseResult is used to return error or node
         res = ParseResult()
@@ -649,7 +886,7 @@ class Parser:
             return res
 
         step_value = NumberNode(
-            Token(TT_INT, 1, self.current_tok.pos_start, self.current_tok.pos_start)
+            Token(TT_INT, 1, self.current_tok.start, self.current_tok.start, self.current_tok.source)
         )
         if self.current_tok.matches(TT_KEYWORD, "step"):
             res.register_advancement()
@@ -718,69 +955,57 @@ class Parser:
 
         if self.current_tok.type == TT_LPAREN:
             res.register_advancement()
-            self.current_tok = self.advance()
-            arg_nodes:list[Any] = []
-            kwargs_nodes:list[tuple[Token, Any]] = []
-            kwargs = False
+            self.advance()
+            arg_nodes: list[Any] = []
+            kwargs_nodes: list[tuple[Token, Any]] = []
 
             if self.current_tok.type == TT_RPAREN:
                 res.register_advancement()
-                self.current_tok = self.advance()
-            else:
-                if self.current_tok.type == TT_IDENTIFIER:
+                self.advance()
+                return res.success(FuncCallNode(atom, arg_nodes, kwargs_nodes))
+
+            while True:
+                # `name =` starts a keyword argument, anything else is a
+                # positional one. One token of lookahead tells them apart.
+                if self.current_tok.type == TT_IDENTIFIER and self.peek().type == TT_EQ:
                     var_name = self.current_tok
                     res.register_advancement()
-                    self.current_tok = self.advance()
-
-                    if self.current_tok.type == TT_EQ:
-                        res.register_advancement()
-                        self.advance()
-                        expr = res.register(self.expr())
-                        kwargs = True
-                        kwargs_nodes.append((var_name, expr))
-                    else:
-                        arg_nodes.append(res.register(self.expr()))
-                else:
-                    arg_nodes.append(res.register(self.expr()))
-                
-                while self.current_tok.type == TT_COMMA:
+                    self.advance()
                     res.register_advancement()
-                    self.current_tok = self.advance()
+                    self.advance()
+                    expr = res.register(self.expr())
+                    if res.error:
+                        return res
+                    kwargs_nodes.append((var_name, expr))
+                else:
+                    if kwargs_nodes:
+                        return res.failure(
+                            InvalidSyntaxError(
+                                self.current_tok.pos_start,
+                                self.current_tok.pos_end,
+                                "keyword argument can't follow positional argument",
+                            )
+                        )
+                    expr = res.register(self.expr())
+                    if res.error:
+                        return res
+                    arg_nodes.append(expr)
 
-                    if self.current_tok.type == TT_IDENTIFIER:
-                        var_name = self.current_tok
-                        res.register_advancement()
-                        self.current_tok = self.advance()
-
-                        if self.current_tok.type == TT_EQ:
-                            res.register_advancement()
-                            self.advance()
-                            expr = res.register(self.expr())
-                            kwargs = True
-                            kwargs_nodes.append((var_name, expr))
-                        else:
-                            if kwargs:
-                                return res.failure(
-                                    InvalidSyntaxError(
-                                        self.current_tok.pos_start,
-                                        self.current_tok.pos_end,
-                                        "keyword argument can't follow positional argument",
-                                    )
-                                )
-                            arg_nodes.append(res.register(self.expr()))
-                    else:
-                        if kwargs:
-                                return res.failure(
-                                    InvalidSyntaxError(
-                                        self.current_tok.pos_start,
-                                        self.current_tok.pos_end,
-                                        "keyword argument can't follow positional argument",
-                                    )
-                                )
-                        arg_nodes.append(res.register(self.expr()))
-                
+                if self.current_tok.type != TT_COMMA:
+                    break
                 res.register_advancement()
                 self.advance()
+
+            if self.current_tok.type != TT_RPAREN:
+                return res.failure(
+                    InvalidSyntaxError(
+                        self.current_tok.pos_start,
+                        self.current_tok.pos_end,
+                        "Expected ',' or ')'",
+                    )
+                )
+            res.register_advancement()
+            self.advance()
             return res.success(FuncCallNode(atom, arg_nodes, kwargs_nodes))
         return res.success(atom)
 
@@ -1349,28 +1574,3 @@ class Parser:
                 tok.pos_start, tok.pos_end, "Expected int or float or '('"
             )
         )
-
-    ## Ops: List of tuple of tuple of token type and value || tuple of token type
-    def bin_op(
-        self,
-        func_a: Callable[[], ParseResult],
-        ops: Any,
-        func_b: Callable[[], ParseResult] | None = None,
-    ) -> ParseResult:
-        func_b = func_b or func_a
-        res = ParseResult()
-        left = res.register(func_a())
-        if res.error:
-            return res
-        while (
-            self.current_tok.type in ops
-            or (self.current_tok.type, self.current_tok.value) in ops
-        ):
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-            right = res.register(func_b())
-            if res.error:
-                return res
-            left = BinOpNode(left, op_tok, right)
-        return res.success(left)
\ No newline at end of file
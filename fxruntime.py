@@ -0,0 +1,154 @@
+from interpreter import *
+
+#######################################
+# COMPILED SCRIPT RUNTIME
+#######################################
+
+# What the modules `fxc build` writes call into. Each helper does what the
+# matching visit method of the Interpreter does, given the values the
+# compiled code already worked out and the positions of the node as a
+# (pos_start, pos_end) span. Nothing here lexes or parses, a compiled script
+# carries its source text only to render errors.
+
+
+def span(source: Source, start: int, end: int, end_after: bool) -> tuple[Position, Position]:
+    return Position(start, source), Position(end, source, end_after)
+
+
+def not_defined(name: str, span: tuple[Position, Position], context: Context) -> ErrorSignal:
+    return ErrorSignal(RTError(*span, f"'{name}' is not defined", context))
+
+
+def fail(span: tuple[Position, Position], message: str, context: Context) -> ErrorSignal:
+    return ErrorSignal(RTError(*span, message, context))
+
+
+def load_fast(context: Context, slot: int, name: str, span: tuple[Position, Position]) -> Value:
+    symbol_table: SymbolTable = context.symbol_table  # type: ignore
+    value = symbol_table.slots[slot]
+    if value is None:
+        value = symbol_table.get(name)
+    if not value:
+        raise not_defined(name, span, context)
+    return value.copy().set_pos(*span)
+
+
+def load_global(context: Context, name: str, span: tuple[Position, Position]) -> Value:
+    value = context.symbol_table.root.symbols.get(name)  # type: ignore
+    if not value:
+        raise not_defined(name, span, context)
+    return value.copy().set_pos(*span)
+
+
+def load_name(context: Context, name: str, span: tuple[Position, Position]) -> Value:
+    value = context.symbol_table.get(name)  # type: ignore
+    if not value:
+        raise not_defined(name, span, context)
+    return value.copy().set_pos(*span)
+
+
+# The value a variable holds, not a copy of it, for `let name/index = value`.
+def lookup(context: Context, depth: int, slot: int, name: str, span: tuple[Position, Position]) -> Value:
+    symbol_table: SymbolTable = context.symbol_table  # type: ignore
+    if depth == 0:
+        value = symbol_table.slots[slot]
+        if value is None:
+            value = symbol_table.get(name)
+    elif depth == DEPTH_GLOBAL:
+        value = symbol_table.root.symbols.get(name)
+    else:
+        value = symbol_table.get(name)
+    if not value:
+        raise not_defined(name, span, context)
+    return value
+
+
+def set_index(target: Value, index: Value, value: Value, context: Context, span: tuple[Position, Position]) -> Value:
+    result, error = target.set_index(index, value)
+    if not result:
+        raise ErrorSignal(error or RTError(*span, "Illegal operation", context))
+    return result
+
+
+def default_value(default: Callable[[Context], Value], context: Context) -> Optional[Value]:
+    # A default that fails to evaluate leaves the argument without one.
+    try:
+        return default(context)
+    except FlowSignal:
+        return None
+
+
+###################################
+
+# A compiled module is a function taking the context it runs in.
+Module = Callable[[Context], Value]
+
+
+def run_module(body: Module, context: Context):
+    # Return, break and continue at the top of a module only end it.
+    try:
+        body(context)
+    except ErrorSignal:
+        raise
+    except FlowSignal:
+        pass
+
+
+def native_symbols(context: Context, module: str, span: tuple[Position, Position]) -> Optional[dict[str, Value]]:
+    prefix, _, name = module.partition(".")
+    loader = module_loaders.get(prefix)
+    if loader is None or not name:
+        return None
+    symbols = loader(name)
+    if symbols is None:
+        raise fail(span, f"Module '{module}' not found", context)
+    return symbols
+
+
+def import_module(context: Context, module: str, alias: str, file: str, body: Optional[Module], span: tuple[Position, Position]) -> Value:
+    symbols = native_symbols(context, module, span)
+    if symbols is None:
+        if body is None:
+            raise fail(span, f"Module '{module}' not found", context)
+        module_context = Context(file)
+        module_context.symbol_table = global_symbol_table.copy()
+        run_module(body, module_context)
+        symbols = module_context.symbol_table.symbols
+    context.symbol_table.update({f"{alias}.{key}": value for key, value in symbols.items()})  # type: ignore
+    return Null
+
+
+def from_import(context: Context, module: str, names: list[tuple[str, Optional[str]]], file: str, body: Optional[Module], span: tuple[Position, Position]) -> Value:
+    symbols = native_symbols(context, module, span)
+    if symbols is None:
+        if body is None:
+            raise fail(span, f"Module '{module}' not found", context)
+        module_context = Context(file, context)
+        module_context.symbol_table = global_symbol_table
+        run_module(body, module_context)
+        symbols = module_context.symbol_table.symbols
+    context.symbol_table.update({alias or name: symbols[name] for name, alias in names if name in symbols})  # type: ignore
+    return Null
+
+
+###################################
+
+
+def execute(program: Module) -> tuple[Any, Any]:
+    # Same as run.start for a compiled program.
+    context = Context("<program>")
+    context.symbol_table = global_symbol_table.copy()
+    try:
+        value = program(context)
+    except ErrorSignal as signal:
+        return None, signal.error
+    except FlowSignal:
+        # return, break or continue outside of any function ends the program
+        return None, None
+    return value, None
+
+
+def main(program: Module):
+    _, error = execute(program)
+    if error:
+        print(error.as_string())
@@ -1,10 +1,13 @@
 from __future__ import annotations
 from abc import ABC
+import math
+import operator
 import os
 import random
-from typing import Self
+from typing import Callable, Self
 from fxparser import *
 import sys
+import threading
 
 sys.set_int_max_str_digits(1000000)
 
@@ -65,6 +68,49 @@ class RTResult:
         )
 
 
+#######################################
+# CONTROL FLOW
+#######################################
+
+
+# The interpreters return plain values and leave a node early by raising one
+# of these. RTResult is only used where functions are executed.
+class FlowSignal(Exception):
+    pass
+
+
+class ErrorSignal(FlowSignal):
+    def __init__(self, error: Optional[Error]):
+        self.error = error
+
+
+class ReturnSignal(FlowSignal):
+    def __init__(self, value: Value):
+        self.value = value
+
+
+class BreakSignal(FlowSignal):
+    pass
+
+
+class ContinueSignal(FlowSignal):
+    pass
+
+
+class TailCall(FlowSignal):
+    # `return f(...)` in a function body, with the call worked out but not
+    # made. The Function.call that is running the body makes it instead, see
+    # Function.trampoline. `replace_frame` is True for TAIL_CALL_REPLACE.
+    def __init__(self, function: Function, args: list[Value], kwargs: dict[str|Token, Value], pos_start: Position, pos_end: Position, replace_frame: bool):
+        self.function = function
+        # Not `args`, which exceptions keep as a tuple.
+        self.call_args = args
+        self.call_kwargs = kwargs
+        self.pos_start = pos_start
+        self.pos_end = pos_end
+        self.replace_frame = replace_frame
+
+
 #######################################
 # VALUES
 #######################################
@@ -154,9 +200,25 @@ class Value(ABC):
     def notted(self) -> tuple[Boolean, None] | tuple[None, Optional[RTError]]:
         return None, self.illegal_operation()
 
+    # `let value/index = new_value`, changes this value in place. Without an
+    # error the assignment reports an illegal operation where it is written,
+    # the value may have been made anywhere.
+    def set_index(
+        self, index: Self, value: Self
+    ) -> tuple[Self, None] | tuple[None, Optional[RTError]]:
+        return None, None
+
     def execute(self, args: list[Value], kwargs: dict[str|Token, Value], context: Context):
         return RTResult().failure(self.illegal_operation())
 
+    # How the interpreters call a value: the result of execute, with a
+    # failure raised as an ErrorSignal.
+    def call(self, args: list[Value], kwargs: dict[str|Token, Value], context: Context) -> Value:
+        res = self.execute(args, kwargs, context)
+        if res.error:
+            raise ErrorSignal(res.error)
+        return res.value  # type: ignore
+
     def copy(self) -> Self:
         raise NotImplemented
 
@@ -463,6 +525,17 @@ class List(Value):
         else:
             return None, Value.illegal_operation(self, other)
 
+    def set_index(self, index: Value, value: Value):  # type: ignore
+        if isinstance(index, Number) and isinstance(index.value, int):
+            try:
+                self.elements[index.value] = value
+                return value, None
+            except:
+                return None, RTError(
+                    index.pos_start, index.pos_end, "Index out of bounds", self.context
+                )
+        return super().set_index(index, value)
+
     def get_comparison_eq(self, other: List):
         return Boolean(self.elements == other.elements).set_context(self.context), None
 
@@ -515,6 +588,8 @@ class List(Value):
 class Dictionary(Value):
     def __init__(self, elements: dict[str|int, Value]):
         super().__init__()
+        # Copies share `elements`, index assignment changes them for every
+        # copy, as it does the elements of a List. `-` gives a new Dictionary.
         self.elements = elements
         
     def added_to(self, other: Value):
@@ -526,8 +601,9 @@ class Dictionary(Value):
     def subbed_by(self, other: Value):
         if isinstance(other, String):
             try:
-                del self.elements[other.value]
-                return self, None
+                elements = self.elements.copy()
+                del elements[other.value]
+                return Dictionary(elements).set_context(self.context), None
             except:
                 return None, RTError(other.pos_start, other.pos_end, "Key not found", self.context)
         else:
@@ -541,7 +617,13 @@ class Dictionary(Value):
                 return None, RTError(other.pos_start, other.pos_end, "Key not found", self.context)
         else:
             return None, Value.illegal_operation(self, other)
-        
+
+    def set_index(self, index: Value, value: Value):  # type: ignore
+        if isinstance(index, String):
+            self.elements[index.value] = value
+            return value, None
+        return super().set_index(index, value)
+
     def get_comparison_eq(self, other: Dictionary):
         return Boolean(self.elements == other.elements).set_context(self.context), None
     
@@ -552,7 +634,7 @@ class Dictionary(Value):
         return len(self.elements) > 0
     
     def copy(self):
-        copy = Dictionary(self.elements.copy())
+        copy = Dictionary(self.elements)
         copy.set_pos(self.pos_start, self.pos_end)
         copy.set_context(self.context)
         return copy
@@ -571,260 +653,457 @@ class Dictionary(Value):
 #######################################
 # FUNCTIONS
 #######################################
+class BindingPlan:
+    # How a function binds the arguments of a call, worked out once when it
+    # is defined: the name and frame slot of every parameter, how many are
+    # required and how to make the default of the others.
+    __slots__ = ("names", "slots", "leading", "defaults", "indexes", "required", "mul_args", "mul_kwargs", "simple")
+
+    def __init__(self, arg_names: list[tuple[Token|str, bool, Any]], mul_args: Token|None, mul_kwargs: Token|None, layout: dict[str, int] | None):
+        self.names = [str(name.value) if isinstance(name, Token) else name for name, _, _ in arg_names]
+        self.indexes = {name: i for i, name in enumerate(self.names)}
+        self.required = sum(1 for _, optional, _ in arg_names if not optional)
+        # Called for an optional parameter the call leaves out. A default
+        # that failed to evaluate gives 0.
+        self.defaults: list[Optional[Callable[[], Value]]] = [
+            (default.copy if default else zero) if optional else None
+            for _, optional, default in arg_names
+        ]
+        self.mul_args = str(mul_args.value) if mul_args else None
+        self.mul_kwargs = str(mul_kwargs.value) if mul_kwargs else None
+
+        # Frame slots of the parameters, if they all have one. The resolver
+        # numbers parameters first, so they are usually the leading slots.
+        slots = [layout.get(name) for name in self.names] if layout else None
+        self.slots: Optional[list[int]] = None if slots is None or None in slots else slots  # type: ignore
+        self.leading = self.slots == list(range(len(self.names)))
+        self.simple = not mul_args and not mul_kwargs
+
+    def bind(self, function: BaseFunction, args: list[Value], kwargs: dict[str, Value], exec_ctx: Context) -> Optional[RTError]:
+        # Sets the parameters in the frame of `exec_ctx`, or returns why the
+        # call doesn't fit.
+        names = self.names
+        count = len(names)
+        symbol_table: SymbolTable = exec_ctx.symbol_table  # type: ignore
+
+        if not kwargs and len(args) == count and self.simple:
+            # Every parameter given by position, nothing to check
+            values = args
+        else:
+            values, error = self.collect(function, args, kwargs, exec_ctx)
+            if error:
+                return error
+
+        if self.leading:
+            symbol_table.slots[:count] = values[:count]
+        elif self.slots is not None:
+            slots = symbol_table.slots
+            for slot, value in zip(self.slots, values):
+                slots[slot] = value
+        else:
+            for name, value in zip(names, values):
+                symbol_table.set(name, value)  # type: ignore
+        if self.mul_args:
+            symbol_table.set(self.mul_args, values[count])  # type: ignore
+        if self.mul_kwargs:
+            symbol_table.set(self.mul_kwargs, values[-1])  # type: ignore
+        return None
+
+    def collect(self, function: BaseFunction, args: list[Value], kwargs: dict[str, Value], exec_ctx: Context) -> tuple[list[Value], None] | tuple[None, RTError]:
+        # The value of every parameter in order, followed by the List of
+        # *args and the Dictionary of **kwargs if the function takes them.
+        names = self.names
+        count = len(names)
+        pos_start, pos_end = function.pos_start, function.pos_end
+
+        for key in kwargs:
+            if key not in self.indexes and not self.mul_kwargs:
+                return None, RTError(pos_start, pos_end, f"Invalid argument: {key}", function.context)  # type: ignore
+        total_args = len(args) + len(kwargs)
+        if total_args < self.required:
+            return None, RTError(pos_start, pos_end, f"{self.required} arguments required", function.context)  # type: ignore
+        if total_args > count and not self.mul_args and not self.mul_kwargs:
+            return None, RTError(pos_start, pos_end, f"{count} arguments required", function.context)  # type: ignore
+        if len(args) > count and not self.mul_args:
+            return None, RTError(pos_start, pos_end, f"{self.required} arguments required", function.context)  # type: ignore
+
+        values: list[Optional[Value]] = args[:count] + [None] * (count - len(args))
+        extra_kwargs: dict[str|int, Value] = {}
+        for key, value in kwargs.items():
+            i = self.indexes.get(key)
+            if i is None:
+                extra_kwargs[key] = value
+            elif values[i] is not None:
+                return None, RTError(pos_start, pos_end, f"Duplicate argument: {key}", exec_ctx)  # type: ignore
+            else:
+                values[i] = value
+        for i, default in enumerate(self.defaults):
+            if values[i] is None:
+                if default is None:
+                    return None, RTError(pos_start, pos_end, f"Missing argument '{names[i]}'", exec_ctx)  # type: ignore
+                values[i] = default()
+
+        if self.mul_args:
+            values.append(List(args[count:]))
+        if self.mul_kwargs:
+            values.append(Dictionary(extra_kwargs))
+        return values, None  # type: ignore
+
+
+def zero() -> Value:
+    return Number(0)
+
+
 class BaseFunction(Value):
     def __init__(self, name: str):
         super().__init__()
         self.name = name
         self.mul_args:Token|None = None
         self.mul_kwargs:Token|None = None
+        self.layout: dict[str, int] | None = None
+        self.plan: BindingPlan
 
     def generate_new_context(self, context:Context) -> Context:
         new_context = Context(self.name, context, self.pos_start)
-        new_context.symbol_table = SymbolTable(context.symbol_table) # type: ignore
+        if new_context.depth > MAX_DEPTH:
+            raise self.fail(context, "Maximum recursion depth exceeded")
+        free_tables = thread_state.free_tables
+        if free_tables:
+            symbol_table = free_tables.pop()
+            symbol_table.reset(context.symbol_table, self.layout)
+        else:
+            symbol_table = SymbolTable(context.symbol_table, self.layout)
+        new_context.symbol_table = symbol_table
         return new_context
+
+    # Called once a call has finished with the context generate_new_context
+    # made. Values may still point at the Context for their tracebacks, but
+    # unless it was kept (Context.keep) nothing reads its symbol table again,
+    # so the table is reused by the next call.
+    @staticmethod
+    def release_context(exec_ctx: Context):
+        free_tables = thread_state.free_tables
+        if len(free_tables) < FREE_TABLES_MAX and not exec_ctx.kept:
+            symbol_table: SymbolTable = exec_ctx.symbol_table  # type: ignore
+            symbol_table.symbols.clear()
+            symbol_table.parent = symbol_table.root = symbol_table.slots = None  # type: ignore
+            free_tables.append(symbol_table)
     
-    def check_args(self, arg_names: list[tuple[Token|str,bool,Any]], args: list[Value], kwargs:dict[str|Token, Value]):
-        res = RTResult()
-        for key, _ in kwargs.items():
-            if (key not in [arg[0] for arg in arg_names] and key not in [arg[0].value for arg in arg_names if isinstance(arg[0], Token)]) and not self.mul_kwargs:
-                return res.failure(RTError(self.pos_start, self.pos_end, f"Invalid argument: {key}", self.context))
-        required = 0
-        total_args = len(args) + len(kwargs)
-        
-        for i in range(len(arg_names)):
-            arg = arg_names[i]
-            if not arg[1]:
-                required += 1
-        if total_args < required:
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{required} arguments required", self.context))
-        if total_args > len(arg_names) and not self.mul_args and not self.mul_kwargs:
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{len(arg_names)} arguments required", self.context))
-        if len(args) > len(arg_names) and not self.mul_args:
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{required} arguments required", self.context))
-        return res.success(Null)
-    
-    
-    def populate_args(self, arg_names: list[tuple[Token|str, bool, Value]], args: list[Value], kwargs:dict[str|Token, Value], exec_ctx: Context):
-        if not exec_ctx.symbol_table:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "No symbol table", exec_ctx))
-        usefull_args:dict[Token|str, Value] = {}
-    
-        for i in range(len(arg_names)):
-            arg_name, _, _ = arg_names[i]
-            if isinstance(arg_name, Token):
-                if arg_name in kwargs:
-                    usefull_args[arg_name] = kwargs[arg_name]
-                    kwargs.pop(arg_name)
-                else:
-                    arg_name = str(arg_name.value)
-            else:
-                if arg_name in kwargs:
-                    usefull_args[arg_name] = kwargs[arg_name]
-                    kwargs.pop(arg_name)
-                else:
-                    arg_name = str(arg_name)
-    
-        for key, value in usefull_args.items():
-            if isinstance(key, Token):
-                exec_ctx.symbol_table.set(str(key.value), value)
-            else:
-                exec_ctx.symbol_table.set(key, value)
-        
-        if self.mul_kwargs:
-            new_kwargs:dict[str|int, Value] = {}
-            for key, value in kwargs.items():
-                if isinstance(key, Token):
-                    new_kwargs[str(key.value)] = value
-                else:
-                    new_kwargs[key] = value
-            exec_ctx.symbol_table.set(str(self.mul_kwargs.value), Dictionary(new_kwargs))
-    
-        for i in range(len(arg_names)):
-            arg_name, optional, default_value = arg_names[i]
-            if isinstance(arg_name, Token):
-                if arg_name.value in kwargs or arg_name in kwargs:
-                    return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Duplicate argument: {arg_name.value}", exec_ctx))
-            value = Number(0)
-            if len(args) <= i and optional:
-                if default_value:
-                    value = default_value.copy()
-            elif len(args) > i:
-                value = args.pop(0)
-            else:
-                    arg_name = arg_name.value if isinstance(arg_name, Token) else arg_name
-                    return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Missing argument '{arg_name}'", exec_ctx))
-            if not exec_ctx.symbol_table:
-                return RTResult().failure(RTError(self.pos_start, self.pos_end, "Argument name must be string", exec_ctx))
-            if isinstance(arg_name, Token):  
-                if isinstance(arg_name.value, str):
-                    exec_ctx.symbol_table.set(arg_name.value, value)
-            else:
-                exec_ctx.symbol_table.set(arg_name, value)
-            
-        if self.mul_args and len(args) > 0:
-            exec_ctx.symbol_table.set(str(self.mul_args.value), List(args)) # type: ignore
-            
-        return RTResult().success(Null)
-            
-    def check_and_populate_args(self, arg_names: list[tuple[Token|str, bool, Any]], args: list[Value], kwargs:dict[str|Token, Value], exec_ctx: Context):
-        res = RTResult()
-        res.register(self.check_args(arg_names, args, kwargs))
-        if res.error:
-            return res
-        self.populate_args(arg_names, args, kwargs, exec_ctx)
-        return res.success(Null)
-    
+    def bind_args(self, args: list[Value], kwargs: dict[str, Value], exec_ctx: Context) -> Optional[RTError]:
+        return self.plan.bind(self, args, kwargs, exec_ctx)
+
+    # The context the errors of a function without a frame of its own, a
+    # builtin or a native function, are reported in. Only made for an error
+    # so a call doesn't need one.
+    def frame(self, context: Context) -> Context:
+        return Context(self.name, context, self.pos_start)
+
+    def fail(self, context: Context, message: str) -> ErrorSignal:
+        return ErrorSignal(RTError(self.pos_start, self.pos_end, message, self.frame(context)))  # type: ignore
+
     def __str__(self):
         return f"<function {self.name}>"
     
     def __repr__(self):
         return f"<function {self.name}>"
     
+# How deep calls can nest before the next one fails with "Maximum recursion
+# depth exceeded". Only the VM gets this deep: it keeps the frames of fex
+# functions in a list, while the other engines recurse in Python and fail
+# the same way once Python's own limit is hit.
+MAX_DEPTH = 200000
+
+# Calls after which a function is handed to Tier.compiler.
+JIT_THRESHOLD = 50
+
+
+class Tier:
+    # The calls made to a function definition, shared by every copy of it.
+    # Once there are JIT_THRESHOLD of them `compiler` is asked for a native
+    # version of the function, which is tried first from then on. It is
+    # called with the arguments and the calling context and returns the
+    # result, or None to leave the call to the function's own code.
+    __slots__ = ("calls", "native")
+    # Set by fxjit.
+    compiler: Optional[Callable[[Function], Optional[Callable[[list[Value], Context], Optional[Value]]]]] = None
+
+    def __init__(self):
+        self.calls = 0
+        self.native: Optional[Callable[[list[Value], Context], Optional[Value]]] = None
+
+
 class Function(BaseFunction):
-    def __init__(self, name: str, body_node: Any, arg_names: list[tuple[Token|str, bool, Any]], mul_args:Token|None, mul_kwargs:Token|None, auto_return: bool = False):
+    # `code` is the compiled body when the function was defined by the
+    # closure engine or the VM, otherwise the body is walked by an
+    # Interpreter.
+    def __init__(self, name: str, body_node: Any, arg_names: list[tuple[Token|str, bool, Any]], mul_args:Token|None, mul_kwargs:Token|None, auto_return: bool = False, layout: dict[str, int] | None = None, code: Callable[[Context], Value] | None = None, plan: BindingPlan | None = None, tier: Tier | None = None):
         super().__init__(name)
         self.body_node = body_node
         self.arg_names = arg_names
         self.auto_return = auto_return
         self.mul_args = mul_args
         self.mul_kwargs = mul_kwargs
+        self.layout = layout
+        self.code = code
+        # Copies share the plan and tier of the function they were made from.
+        self.plan = plan or BindingPlan(arg_names, mul_args, mul_kwargs, layout)
+        if plan is None and layout:
+            frame_names.update(layout)
+        self.tier = tier or Tier()
         
     def execute(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context):
-        res = RTResult()
-        interpreter = Interpreter(self.generate_new_context(context))
-        res.register(self.check_and_populate_args(self.arg_names, args, kwargs, interpreter.context))
-        if res.error:
-            return res
-        value = res.register(interpreter.visit(self.body_node))
-        if res.error:
-            return res
-        return_value = (value if self.auto_return else None) or res.func_return_value or Number(0)
-        
-        return res.success(return_value)
+        try:
+            return RTResult().success(self.call(args, kwargs, context))
+        except ErrorSignal as signal:
+            return RTResult().failure(signal.error)
+
+    def call(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context) -> Value:
+        value = self.native_call(args, kwargs, context)
+        if value is not None:
+            return value
+
+        exec_ctx = self.generate_new_context(context)
+        try:
+            error = self.bind_args(args, kwargs, exec_ctx)
+            if error:
+                raise ErrorSignal(error)
+            if self.code:
+                value = self.code(exec_ctx)
+            else:
+                value = thread_state.interpreter.visit(self.body_node, exec_ctx)
+        except ReturnSignal as signal:
+            return signal.value or Number(0)
+        except TailCall as signal:
+            return self.trampoline(signal, exec_ctx)
+        except (BreakSignal, ContinueSignal):
+            return Number(0)
+        except RecursionError:
+            # Raised again by a caller if there isn't stack enough left here.
+            raise self.fail(context, "Maximum recursion depth exceeded")
+        finally:
+            self.release_context(exec_ctx)
+        return (value if self.auto_return else None) or Number(0)
+
+    # The result of the native version of the function, None where there is
+    # none yet or it leaves the call to the function's own code. Calls are
+    # counted until the function is handed to Tier.compiler.
+    def native_call(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context) -> Optional[Value]:
+        tier = self.tier
+        if tier.native is not None:
+            if not kwargs:
+                return tier.native(args, context)
+        elif tier.calls < JIT_THRESHOLD:
+            tier.calls += 1
+            if tier.calls == JIT_THRESHOLD and Tier.compiler:
+                tier.native = Tier.compiler(self)
+        return None
+
+    def trampoline(self, signal: TailCall, exec_ctx: Context) -> Value:
+        # Makes the tail calls that follow from `signal` one after the other,
+        # each once the last has left its body, so they take no Python stack.
+        # A function calling itself runs again in the frame it has. Another
+        # function gets a new frame. Where the resolver found that nothing
+        # reads the names of the frame making the call (TAIL_CALL_REPLACE),
+        # that frame is let go and the new one takes its place, called from
+        # where the first call was made, so any chain of such calls runs in
+        # one frame. Otherwise the new frame's parent is the caller's, as
+        # usual, and the frames are only released at the end.
+        pos_start, pos_end = signal.pos_start, signal.pos_end
+        context = exec_ctx
+        function = self
+        # The frame made here that is running, and those kept for the
+        # frames made after them to look names up in.
+        frame: Optional[Context] = None
+        frames: list[Context] = []
+        try:
+            while True:
+                callee = signal.function
+                args, kwargs = signal.call_args, signal.call_kwargs
+                value = callee.native_call(args, kwargs, exec_ctx)
+                if value is not None:
+                    break
+                if callee.plan is not function.plan or exec_ctx.kept:
+                    if signal.replace_frame:
+                        new_ctx = callee.generate_new_context(exec_ctx.parent)  # type: ignore
+                        new_ctx.parent_entry_pos = exec_ctx.parent_entry_pos
+                        if frame is not None:
+                            self.release_context(frame)
+                    else:
+                        new_ctx = callee.generate_new_context(exec_ctx)
+                        if frame is not None:
+                            frames.append(frame)
+                    exec_ctx = frame = new_ctx
+                function = callee
+                try:
+                    error = function.bind_args(args, kwargs, exec_ctx)
+                    if error:
+                        raise ErrorSignal(error)
+                    if function.code:
+                        value = function.code(exec_ctx)
+                    else:
+                        value = thread_state.interpreter.visit(function.body_node, exec_ctx)
+                    value = (value if function.auto_return else None) or Number(0)
+                    break
+                except ReturnSignal as returned:
+                    value = returned.value or Number(0)
+                    break
+                except TailCall as call:
+                    signal = call
+                except (BreakSignal, ContinueSignal):
+                    value = Number(0)
+                    break
+        finally:
+            if frame is not None:
+                frames.append(frame)
+            for frame in frames:
+                self.release_context(frame)
+        # What `return f(...)` would have returned from the first frame.
+        return value.copy().set_pos(pos_start, pos_end).set_context(context)
     
     def copy(self):
-        copy = Function(self.name, self.body_node, self.arg_names, self.mul_args, self.mul_kwargs, self.auto_return)
+        copy = Function(self.name, self.body_node, self.arg_names, self.mul_args, self.mul_kwargs, self.auto_return, self.layout, self.code, self.plan, self.tier)
         copy.set_context(self.context)
         copy.set_pos(self.pos_start, self.pos_end)
         return copy
     
 class BuiltInFunction(BaseFunction):
+    # Builtins are the execute_<name> methods below. Each takes the calling
+    # context and its arguments by position, already bound and defaulted,
+    # and returns a Value or raises an ErrorSignal like the engines do. The
+    # method and binding plan of a name are looked up once and shared by
+    # every copy.
+    builtins: dict[str, tuple[Callable[..., Value], BindingPlan]] = {}
+
     def __init__(self, name: str):
         super().__init__(name)
-        
+        builtin = self.builtins.get(name)
+        if builtin is None:
+            method = getattr(BuiltInFunction, f"execute_{name}")
+            builtin = self.builtins[name] = (method, BindingPlan(method.arg_names, None, None, None))
+        self.method, self.plan = builtin
+
     def execute(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context):
-        res = RTResult()
-        exec_ctx = self.generate_new_context(context)
-        
-        method_name = f"execute_{self.name}"
-        method = getattr(self, method_name, self.no_visit_method)
-        
-        res.register(self.check_and_populate_args(method.arg_names, args, kwargs, exec_ctx)) # type: ignore
-        if res.should_return():
-            return res
-        
-        return_value = res.register(method(exec_ctx)) # type: ignore
-        if res.should_return():
-            return res
-        
-        return res.success(return_value)
-    
-    def no_visit_method(self, node: Any, context: Context):
-        raise Exception(f"No execute_{self.name} method defined")
-    
+        try:
+            return RTResult().success(self.call(args, kwargs, context))
+        except ErrorSignal as signal:
+            return RTResult().failure(signal.error)
+
+    def call(self, args: list[Value], kwargs:dict[str|Token, Value], context: Context) -> Value:
+        plan = self.plan
+        if kwargs or len(args) != len(plan.names):
+            args, error = plan.collect(self, args, kwargs, self.frame(context))  # type: ignore
+            if error:
+                raise ErrorSignal(error)
+        return self.method(self, context, *args)
+
     def copy(self):
-        copy = BuiltInFunction(self.name)
-        copy.set_context(self.context)
-        copy.set_pos(self.pos_start, self.pos_end)
+        # Taken on every read of the name, so the fields are copied as they
+        # are instead of looking the builtin up again.
+        copy = BuiltInFunction.__new__(BuiltInFunction)
+        copy.__dict__.update(self.__dict__)
         return copy
-    
-    def execute_print(self, exec_ctx: Context):
-        if not exec_ctx.symbol_table:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "No symbol table", exec_ctx))
-        value = exec_ctx.symbol_table.get("value")
-        ends_with  = exec_ctx.symbol_table.get("ends_with")
-        
+
+    def execute_print(self, context: Context, value: Value, ends_with: Value):
         print(str(value), end=str(ends_with))
-        
-        return RTResult().success(Null)
-    
+        return Null
+
     execute_print.arg_names = [("value", True, String("")), ("ends_with", True, String("\n"))] # type: ignore
-    
-    def execute_input(self, exec_ctx: Context):
-        if not exec_ctx.symbol_table:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "No symbol table", exec_ctx))
-        text = exec_ctx.symbol_table.get("text")
-        input_value = input(str(text))
-        return RTResult().success(String(input_value))
-    
+
+    def execute_input(self, context: Context, text: Value):
+        return String(input(str(text)))
+
     execute_input.arg_names = [("text", True, String(""))] # type: ignore
-    
-    def execute_clear(self, exec_ctx: Context):
+
+    def execute_clear(self, context: Context):
         os.system("cls" if os.name == "nt" else "clear")
-        return RTResult().success(Null)
-    
+        return Null
+
     execute_clear.arg_names = [] # type: ignore
-    
-    def execute_type(self, exec_ctx: Context):
-        value = exec_ctx.symbol_table.get("value") # type: ignore
-        return RTResult().success(String(type(value).__name__))
+
+    def execute_type(self, context: Context, value: Value):
+        return String(type(value).__name__)
 
     execute_type.arg_names = [("value", False, Null)] # type: ignore
-    
-    def execute_len(self, exec_ctx: Context):
-        value = exec_ctx.symbol_table.get("value") # type: ignore
+
+    def execute_len(self, context: Context, value: Value):
         if isinstance(value, String):
-            return RTResult().success(Number(len(value.value)))
+            return Number(len(value.value))
         elif isinstance(value, List):
-            return RTResult().success(Number(len(value.elements)))
+            return Number(len(value.elements))
         else:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Argument must be string or list", exec_ctx))
-        
+            raise self.fail(context, "Argument must be string or list")
+
     execute_len.arg_names = [("value", False, Null)] # type: ignore
-    
-    def execute_eval(self, exec_ctx: Context):
-        value = exec_ctx.symbol_table.get("value") # type: ignore
+
+    def execute_eval(self, context: Context, value: Value):
         if not isinstance(value, String):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Argument must be string", exec_ctx))
+            raise self.fail(context, "Argument must be string")
         try:
-            return RTResult().success(eval(value)) # type: ignore
+            return eval(value) # type: ignore
         except Exception as e:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Invalid expression: {e}", exec_ctx))
+            raise self.fail(context, f"Invalid expression: {e}")
 
     execute_eval.arg_names = [("value", False, Null)] # type: ignore
-    
-    def execute_convert(self, exec_ctx: Context):
-        value = exec_ctx.symbol_table.get("value") # type: ignore
-        to = exec_ctx.symbol_table.get("to") # type: ignore
+
+    def execute_convert(self, context: Context, value: Value, to: Value):
         if not isinstance(to, String):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Conversion type must be string", exec_ctx))
+            raise self.fail(context, "Conversion type must be string")
         if to.value == "string":
-            return RTResult().success(String(str(value)))
-        elif to.value == "number": 
+            return String(str(value))
+        elif to.value == "number":
             try:
-                return RTResult().success(Number(int(value.value))) # type: ignore
+                return Number(int(value.value)) # type: ignore
             except Exception as e:
                 print(e)
-                return RTResult().failure(RTError(self.pos_start, self.pos_end, "Invalid conversion", exec_ctx))
+                raise self.fail(context, "Invalid conversion")
         elif to == "boolean": # type: ignore
-            return RTResult().success(Boolean(value.is_true())) # type: ignore
+            return Boolean(value.is_true())
         else:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Invalid conversion", exec_ctx))
-        
+            raise self.fail(context, "Invalid conversion")
+
     execute_convert.arg_names = [("value", False, Null), ("to", True, String("string"))] # type: ignore
-    
-    def execute_random_choices(self, exec_ctx: Context):
-        value = exec_ctx.symbol_table.get("value") # type: ignore
-        count = exec_ctx.symbol_table.get("count") # type: ignore
+
+    def execute_random_choices(self, context: Context, value: Value, count: Value):
         if isinstance(value, List):
-            return RTResult().success(random.choices(value.elements, k=count.value)) # type: ignore
+            return List(random.choices(value.elements, k=count.value)) # type: ignore
         else:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Argument must be list", exec_ctx))
-        
-    
+            raise self.fail(context, "Argument must be list")
+
     execute_random_choices.arg_names = [("value", False, Null), ("count", True, Number(1))] # type: ignore
-    
-    def execute_exit(self, exec_ctx: Context):
+
+    # append, extend and pop change the list in place. Copies of a list share
+    # its elements, so every variable holding it sees the change.
+    def execute_append(self, context: Context, list_: Value, value: Value):
+        if not isinstance(list_, List):
+            raise self.fail(context, "First argument must be list")
+        list_.elements.append(value)
+        return Null
+
+    execute_append.arg_names = [("list", False, Null), ("value", False, Null)] # type: ignore
+
+    def execute_extend(self, context: Context, list_: Value, values: Value):
+        if not isinstance(list_, List):
+            raise self.fail(context, "First argument must be list")
+        if not isinstance(values, List):
+            raise self.fail(context, "Second argument must be list")
+        list_.elements.extend(values.elements)
+        return Null
+
+    execute_extend.arg_names = [("list", False, Null), ("values", False, Null)] # type: ignore
+
+    def execute_pop(self, context: Context, list_: Value, index: Value):
+        if not isinstance(list_, List):
+            raise self.fail(context, "First argument must be list")
+        if not (isinstance(index, Number) and isinstance(index.value, int)):
+            raise self.fail(context, "Index must be integer")
+        try:
+            return list_.elements.pop(index.value)
+        except IndexError:
+            raise self.fail(context, "Index out of bounds")
+
+    execute_pop.arg_names = [("list", False, Null), ("index", True, Number(-1))] # type: ignore
+
+    def execute_exit(self, context: Context):
         sys.exit()
 
     execute_exit.arg_names = [] # type: ignore
@@ -835,6 +1114,8 @@ class BuiltInFunction(BaseFunction):
 
 
 class Context:
+    __slots__ = ("display_name", "parent", "parent_entry_pos", "symbol_table", "depth", "kept")
+
     def __init__(
         self,
         display_name: str,
@@ -845,6 +1126,20 @@ class Context:
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
         self.symbol_table: SymbolTable | None = None
+        # How many contexts are above this one, the calls it is nested in.
+        self.depth: int = parent.depth + 1 if parent else 0
+        # See keep.
+        self.kept = False
+
+    # For a value that reads names through the context after its call has
+    # returned, as a callback Python holds on to does. release_context then
+    # leaves the symbol tables of this context and of its callers as they
+    # are. The callers of a kept context are already kept.
+    def keep(self):
+        context: Context | None = self
+        while context is not None and not context.kept:
+            context.kept = True
+            context = context.parent
 
 
 #######################################
@@ -852,26 +1147,69 @@ class Context:
 #######################################
 
 
+# Every name a function frame may hold: those in the layout of any function
+# made so far and any other a frame was given. Other names can only be in
+# the program's table, so looking one up skips the frames of the callers
+# and a deep recursion doesn't make it slower.
+frame_names: set[str] = set()
+
+
 class SymbolTable:
-    def __init__(self, parent: Self | None = None):
+    # Function frames keep the names their body binds in `slots`, at the
+    # index `layout` gives them. Any other name lives in `symbols`.
+    __slots__ = ("symbols", "parent", "root", "layout", "slots")
+
+    def __init__(self, parent: Self | None = None, layout: dict[str, int] | None = None):
         self.symbols: dict[str, Value] = {}
+        self.reset(parent, layout)
+
+    def reset(self, parent: Self | None, layout: dict[str, int] | None):
         self.parent = parent
+        self.root: SymbolTable = parent.root if parent else self
+        self.layout = layout
+        self.slots: list[Value | None] = [None] * len(layout) if layout else []
 
     def get(self, name: str) -> Value | None:
-        value: Value | None = self.symbols.get(name, None)
-        if value == None and self.parent:
-            return self.parent.get(name)
-        return value
+        if name not in frame_names:
+            return self.root.symbols.get(name, None)
+        # Walks up to the callers in a loop, a deep recursion has as many.
+        table: SymbolTable | None = self
+        while table is not None:
+            if table.layout:
+                slot = table.layout.get(name)
+                if slot is not None:
+                    value = table.slots[slot]
+                    if value is not None:
+                        return value
+            value = table.symbols.get(name, None)
+            if value is not None:
+                return value
+            table = table.parent
+        return None
 
     def set(self, name: str, value: Value) -> None:
+        if self.layout:
+            slot = self.layout.get(name)
+            if slot is not None:
+                self.slots[slot] = value
+                return
+        if self.root is not self:
+            frame_names.add(name)
         self.symbols[name] = value
 
+    # Binds every name in `symbols`, as an import does.
+    def update(self, symbols: dict[str, Value]):
+        if self.root is not self:
+            frame_names.update(symbols)
+        self.symbols.update(symbols)
+
     def remove(self, name: str):
         del self.symbols[name]
 
     def copy(self):
-        copy = SymbolTable(self.parent)
+        copy = SymbolTable(self.parent, self.layout)
         copy.symbols = self.symbols.copy()
+        copy.slots = self.slots.copy()
         return copy
 
 global_reserved_symbols = [
@@ -887,6 +1225,9 @@ global_reserved_symbols = [
     "eval",
     "convert",
     "random_choices",
+    "append",
+    "extend",
+    "pop",
 ]
 
 global_symbol_table = SymbolTable()
@@ -903,6 +1244,617 @@ global_symbol_table.set("exit", BuiltInFunction("exit"))
 global_symbol_table.set("eval", BuiltInFunction("eval"))
 global_symbol_table.set("convert", BuiltInFunction("convert"))
 global_symbol_table.set("random_choices", BuiltInFunction("random_choices"))
+global_symbol_table.set("append", BuiltInFunction("append"))
+global_symbol_table.set("extend", BuiltInFunction("extend"))
+global_symbol_table.set("pop", BuiltInFunction("pop"))
+
+# Loaders of modules that aren't .fx files, keyed by the first part of the
+# module name, as `py` in `import py.math`. A loader gets the rest of the
+# name and returns the symbols of the module, or None if there is no such
+# module. See fxffi.
+module_loaders: dict[str, Callable[[str], Optional[dict[str, Value]]]] = {}
+
+#######################################
+# OPTIMIZER
+#######################################
+
+# Value method for every binary operator, keyed like BINARY_PRECEDENCE.
+BINARY_OPERATIONS = {
+    TT_PLUS: "added_to",
+    TT_MINUS: "subbed_by",
+    TT_MUL: "multed_by",
+    TT_DIV: "dived_by",
+    TT_POW: "powed_by",
+    TT_EE: "get_comparison_eq",
+    TT_NE: "get_comparison_ne",
+    TT_LT: "get_comparison_lt",
+    TT_GT: "get_comparison_gt",
+    TT_LTE: "get_comparison_lte",
+    TT_GTE: "get_comparison_gte",
+    "and": "anded_by",
+    "or": "ored_by",
+}
+
+# Folding is skipped where the result could get large, the program might
+# never evaluate the expression.
+FOLD_MAX_EXPONENT = 64
+FOLD_MAX_STRING = 1024
+
+
+def bound_name(node: Node) -> Optional[str]:
+    # The name a let, a for loop or a named function sets where it runs.
+    if node.kind == NODE_VAR_ASSIGN or node.kind == NODE_FOR or node.kind == NODE_FUNC_DEF:
+        if node.var_name_tok:
+            return node.var_name_tok.value  # type: ignore
+    return None
+
+
+def param_names(node: FuncDefNode) -> list[str]:
+    names = [arg[0].value for arg in node.arg_name_toks]
+    if node.mulargs:
+        names.append(node.mulargs.value)
+    if node.mulkwargs:
+        names.append(node.mulkwargs.value)
+    return names  # type: ignore
+
+
+class Optimizer:
+    # Runs between parsing and interpreting. Operators over literals are
+    # folded into ConstNodes, and reads of `let` constants are replaced in
+    # top level code. Anything that fails to evaluate is left as it is, so the
+    # error is still raised at runtime by the same node.
+    def __init__(self) -> None:
+        self.constants: dict[str, Value] = {}
+        self.function_depth = 0
+
+    def optimize(self, tree: Node) -> Node:
+        if not isinstance(tree, ListNode):
+            return self.visit(tree)
+
+        # Top level code runs in the program's own symbol table, which only
+        # top level statements and imported modules write to. A name bound
+        # exactly once, by a top level `let` of a constant, keeps that value
+        # for every top level statement after it.
+        counts: dict[str, int] = {}
+        if self.count_bindings(tree, counts):
+            candidates = {
+                name for name, count in counts.items()
+                if count == 1 and name not in global_reserved_symbols
+            }
+        else:
+            candidates = set()
+
+        statements = tree.element_nodes
+        for i, statement in enumerate(statements):
+            statement = statements[i] = self.visit(statement)
+            if (
+                statement.kind == NODE_VAR_ASSIGN
+                and statement.var_name_tok.value in candidates
+                and statement.value_node.kind == NODE_CONST
+            ):
+                self.constants[statement.var_name_tok.value] = statement.value_node.value
+        return tree
+
+    def count_bindings(self, node: Node, counts: dict[str, int]) -> bool:
+        # Counts the names every node binds, returns False if the tree
+        # imports a module, as the module can set any name.
+        if node.kind == NODE_IMPORT or node.kind == NODE_FROM_IMPORT:
+            return False
+        names = param_names(node) if node.kind == NODE_FUNC_DEF else []
+        name = bound_name(node)
+        if name is not None:
+            names.append(name)
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+
+        for child in node.children():
+            if not self.count_bindings(child, counts):
+                return False
+        return True
+
+    def visit(self, node: Node) -> Node:
+        return self.visitors[node.kind](self, node)
+
+    def constant(self, node: Node) -> Optional[Value]:
+        if node.kind == NODE_CONST:
+            return node.value
+        if node.kind == NODE_NUMBER:
+            return Number(node.tok.value)  # type: ignore
+        if node.kind == NODE_STRING:
+            return String(node.tok.value)  # type: ignore
+        return None
+
+    def fold_bin_op(self, left: Value, op_tok: Token, right: Value) -> Optional[Value]:
+        operation = BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)  # type: ignore
+        if operation is None:
+            return None
+        if op_tok.type == TT_POW and isinstance(right, Number) and abs(right.value) > FOLD_MAX_EXPONENT:
+            return None
+        if op_tok.type == TT_MUL and isinstance(left, String) and isinstance(right, Number):
+            if len(left.value) * right.value > FOLD_MAX_STRING:
+                return None
+
+        try:
+            result, error = getattr(left, operation)(right)
+        except Exception:
+            # Raised straight out of Python, e.g. a float overflow
+            return None
+        if error or not isinstance(result, (Number, String, Boolean)):
+            return None
+        return result
+
+    ###################################
+
+    def visit_NumberNode(self, node: NumberNode) -> Node:
+        return node
+
+    def visit_BinOpNode(self, node: BinOpNode) -> Node:
+        node.left_node = self.visit(node.left_node)
+        node.right_node = self.visit(node.right_node)
+
+        left = self.constant(node.left_node)
+        right = self.constant(node.right_node)
+        if left is not None and right is not None:
+            value = self.fold_bin_op(left, node.op_tok, right)
+            if value is not None:
+                return ConstNode(value, node)
+        return node
+
+    def visit_UnaryOpNode(self, node: UnaryOpNode) -> Node:
+        node.node = self.visit(node.node)
+
+        value = self.constant(node.node)
+        if value is None:
+            return node
+        if node.op_tok.type == TT_MINUS:
+            value = self.fold_bin_op(value, Token(TT_MUL, None, 0, 0, node.source), Number(-1))
+        elif node.op_tok.type == TT_NOT:
+            try:
+                value, error = value.notted()  # type: ignore
+            except Exception:
+                return node
+            if error:
+                return node
+        if value is None:
+            return node
+        return ConstNode(value, node)
+
+    def visit_VarAccessNode(self, node: VarAccessNode) -> Node:
+        if self.function_depth == 0:
+            value = self.constants.get(node.var_name_tok.value)  # type: ignore
+            if value is not None:
+                return ConstNode(value, node)
+        return node
+
+    def visit_VarAssignNode(self, node: VarAssignNode) -> Node:
+        node.value_node = self.visit(node.value_node)
+        value = self.constant(node.value_node)
+        if value is not None and node.value_node.kind != NODE_CONST:
+            node.value_node = ConstNode(value, node.value_node)
+        return node
+
+    def visit_StringNode(self, node: StringNode) -> Node:
+        return node
+
+    def visit_ReturnNode(self, node: ReturnNode) -> Node:
+        if node.node_to_return:
+            node.node_to_return = self.visit(node.node_to_return)
+        return node
+
+    def visit_ContinueNode(self, node: ContinueNode) -> Node:
+        return node
+
+    def visit_BreakNode(self, node: BreakNode) -> Node:
+        return node
+
+    def visit_IfNode(self, node: IfNode) -> Node:
+        node.cases = [(self.visit(condition), self.visit(expr)) for condition, expr in node.cases]
+        if node.else_case:
+            node.else_case = self.visit(node.else_case)
+        return node
+
+    def visit_ListNode(self, node: ListNode) -> Node:
+        node.element_nodes = [self.visit(element) for element in node.element_nodes]
+        return node
+
+    def visit_ForNode(self, node: ForNode) -> Node:
+        node.start_value_node = self.visit(node.start_value_node)
+        node.end_value_node = self.visit(node.end_value_node)
+        node.step_value_node = self.visit(node.step_value_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_WhileNode(self, node: WhileNode) -> Node:
+        node.condition_node = self.visit(node.condition_node)
+        node.body_node = self.visit(node.body_node)
+        return node
+
+    def visit_FuncDefNode(self, node: FuncDefNode) -> Node:
+        # Defaults are evaluated where the function is defined, the body
+        # wherever it is called from.
+        node.arg_name_toks = [
+            (name, optional, self.visit(default) if optional else default)
+            for name, optional, default in node.arg_name_toks
+        ]
+        self.function_depth += 1
+        node.body_node = self.visit(node.body_node)
+        self.function_depth -= 1
+        return node
+
+    def visit_FuncCallNode(self, node: FuncCallNode) -> Node:
+        node.node_to_call = self.visit(node.node_to_call)
+        node.arg_nodes = [self.visit(arg) for arg in node.arg_nodes]
+        node.kwargs_nodes = [(name, self.visit(value)) for name, value in node.kwargs_nodes]
+        return node
+
+    def visit_ImportNode(self, node: ImportNode) -> Node:
+        return node
+
+    def visit_FromImportNode(self, node: FromImportNode) -> Node:
+        return node
+
+    def visit_DictNode(self, node: DictNode) -> Node:
+        node.key_value_pairs = {
+            self.visit(key): self.visit(value) for key, value in node.key_value_pairs.items()
+        }
+        return node
+
+    def visit_ConstNode(self, node: ConstNode) -> Node:
+        return node
+
+    def visit_SetIndexNode(self, node: SetIndexNode) -> Node:
+        # The variable being changed is read where it is stored, never
+        # replaced by its constant.
+        if node.base_node.kind != NODE_VAR_ACCESS:
+            node.base_node = self.visit(node.base_node)
+        node.index_node = self.visit(node.index_node)
+        node.value_node = self.visit(node.value_node)
+        return node
+
+    visitors = [
+        visit_NumberNode,
+        visit_BinOpNode,
+        visit_UnaryOpNode,
+        visit_VarAccessNode,
+        visit_VarAssignNode,
+        visit_StringNode,
+        visit_ReturnNode,
+        visit_ContinueNode,
+        visit_BreakNode,
+        visit_IfNode,
+        visit_ListNode,
+        visit_ForNode,
+        visit_WhileNode,
+        visit_FuncDefNode,
+        visit_FuncCallNode,
+        visit_ImportNode,
+        visit_FromImportNode,
+        visit_DictNode,
+        visit_ConstNode,
+        visit_SetIndexNode,
+    ]
+
+
+class Resolver:
+    # Gives variables a fixed place where it can be known before running.
+    # Names are looked up through the calling frames, not the defining ones,
+    # so the only static places are the running function's own frame and the
+    # program's symbol table. Names a function binds get a slot in its frame;
+    # reading one that isn't set yet still falls back to the callers. In a
+    # whole program without imports, a name no function binds can only live in
+    # the program's table. Everything else keeps the dictionary lookup.
+    def __init__(self, whole_program: bool = True) -> None:
+        self.whole_program = whole_program
+        self.function_names: set[str] = set()
+        self.layout: Optional[dict[str, int]] = None
+        # Parameters of the function being visited, set on every call.
+        self.params: set[str] = set()
+        # Names a function body may find in the frame of one of its callers:
+        # those it doesn't bind, and those it binds but can read before it
+        # has.
+        self.caller_reads: set[str] = set()
+        # The layout of every function with the `return f(...)` in its body.
+        self.tail_calls: list[tuple[dict[str, int], list[ReturnNode]]] = []
+
+    def resolve(self, tree: Node) -> Node:
+        if self.whole_program and not self.scan(tree, False):
+            self.whole_program = False
+        self.visit(tree)
+        # Only a whole program shows every read there is of a frame.
+        if self.whole_program:
+            for layout, returns in self.tail_calls:
+                if self.caller_reads.isdisjoint(layout):
+                    for node in returns:
+                        node.tail = TAIL_CALL_REPLACE
+        return tree
+
+    def scan(self, node: Node, in_function: bool) -> bool:
+        # Collects the names bound inside functions, returns False if the tree
+        # imports a module.
+        if node.kind == NODE_IMPORT or node.kind == NODE_FROM_IMPORT:
+            return False
+        name = bound_name(node)
+        if name is not None and in_function:
+            self.function_names.add(name)
+        if node.kind == NODE_FUNC_DEF:
+            self.function_names.update(param_names(node))
+            for _, optional, default in node.arg_name_toks:
+                if optional and not self.scan(default, in_function):
+                    return False
+            return self.scan(node.body_node, True)
+
+        for child in node.children():
+            if not self.scan(child, in_function):
+                return False
+        return True
+
+    def bind(self, node: Node, layout: dict[str, int]):
+        # Gives every name bound in the body of a function a slot, without
+        # going into the functions defined inside it.
+        name = bound_name(node)
+        if name is not None and name not in layout:
+            layout[name] = len(layout)
+        if node.kind == NODE_FUNC_DEF:
+            for _, optional, default in node.arg_name_toks:
+                if optional:
+                    self.bind(default, layout)
+            return
+        for child in node.children():
+            self.bind(child, layout)
+
+    def visit(self, node: Node):
+        kind = node.kind
+        if kind == NODE_VAR_ACCESS or kind == NODE_VAR_ASSIGN:
+            name = node.var_name_tok.value  # type: ignore
+            if self.layout is not None and name in self.layout:
+                node.depth = 0  # type: ignore
+                node.slot = self.layout[name]  # type: ignore
+                if kind == NODE_VAR_ACCESS and name not in self.params:
+                    self.caller_reads.add(name)
+            elif kind == NODE_VAR_ACCESS and self.whole_program and name not in self.function_names:
+                node.depth = DEPTH_GLOBAL  # type: ignore
+            elif kind == NODE_VAR_ACCESS and self.layout is not None:
+                self.caller_reads.add(name)
+        elif kind == NODE_FUNC_DEF:
+            # Defaults are evaluated where the function is defined.
+            for _, optional, default in node.arg_name_toks:  # type: ignore
+                if optional:
+                    self.visit(default)
+            layout = {name: slot for slot, name in enumerate(dict.fromkeys(param_names(node)))}  # type: ignore
+            self.bind(node.body_node, layout)  # type: ignore
+            node.layout = layout  # type: ignore
+
+            outer, outer_params = self.layout, self.params
+            self.layout, self.params = layout, set(param_names(node))  # type: ignore
+            self.visit(node.body_node)  # type: ignore
+            self.layout, self.params = outer, outer_params
+            returns: list[ReturnNode] = []
+            self.mark_tail_calls(node.body_node, returns)  # type: ignore
+            if returns:
+                self.tail_calls.append((layout, returns))
+            return
+
+        for child in node.children():
+            self.visit(child)
+
+    def mark_tail_calls(self, node: Node, returns: list[ReturnNode]):
+        # Finds the `return f(...)` of a function body and adds them to
+        # `returns`. Nothing between them and the call of the function
+        # catches what they raise, so the call can be made once the body is
+        # left.
+        kind = node.kind
+        if kind == NODE_RETURN:
+            if node.node_to_return is not None and node.node_to_return.kind == NODE_FUNC_CALL:  # type: ignore
+                node.tail = TAIL_CALL  # type: ignore
+                returns.append(node)  # type: ignore
+        elif kind == NODE_LIST:
+            for element in node.element_nodes:  # type: ignore
+                self.mark_tail_calls(element, returns)
+        elif kind == NODE_IF:
+            for _, body in node.cases:  # type: ignore
+                self.mark_tail_calls(body, returns)
+            if node.else_case:  # type: ignore
+                self.mark_tail_calls(node.else_case, returns)  # type: ignore
+        elif kind == NODE_FOR or kind == NODE_WHILE:
+            self.mark_tail_calls(node.body_node, returns)  # type: ignore
+
+
+#######################################
+# QUICKENING
+#######################################
+
+# Executions of a BinOpNode whose operand classes are recorded before it is
+# specialised.
+QUICKEN_AFTER = 8
+# Guard failures in a row after which a specialised node goes back to
+# recording, and how often that may happen before it stays generic.
+QUICKEN_MAX_MISSES = 8
+QUICKEN_MAX_DEOPTS = 4
+
+new_value = object.__new__
+
+
+class BinOpFeedback:
+    # The type feedback and specialised handler of one BinOpNode. The first
+    # QUICKEN_AFTER executions go through the Value methods and record the
+    # classes of the operands. If they never changed and HANDLERS has an
+    # entry for them, the node runs that handler from then on. A handler
+    # returns None where its guards fail, the node then takes the generic
+    # path and counts a miss.
+    __slots__ = ("operation", "pos_start", "pos_end", "types", "runs", "handler", "hits", "misses", "strikes", "missed_at", "deopts")
+
+    def __init__(self, operation: str, node: Node):
+        self.operation = operation
+        self.pos_start = node.pos_start
+        self.pos_end = node.pos_end
+        self.types: Optional[tuple[type, type]] = None
+        self.runs = 0
+        self.handler: Optional[Callable[[Value, Value, Position, Position], Optional[Value]]] = None
+        self.hits = 0
+        self.misses = 0
+        # Misses in a row, and the hits counted at the last one.
+        self.strikes = 0
+        self.missed_at = 0
+        self.deopts = 0
+
+    def record(self, left: Value, right: Value):
+        types = (left.__class__, right.__class__)
+        runs = self.runs
+        if runs == 0:
+            self.types = types
+        elif types != self.types:
+            self.types = None
+        self.runs = runs = runs + 1
+        if runs == QUICKEN_AFTER and self.types is not None:
+            self.handler = HANDLERS.get((self.operation, *self.types))
+            self.strikes = 0
+
+    def miss(self):
+        self.misses += 1
+        if self.missed_at != self.hits:
+            self.missed_at = self.hits
+            self.strikes = 0
+        self.strikes += 1
+        if self.strikes >= QUICKEN_MAX_MISSES:
+            self.handler = None
+            self.deopts += 1
+            if self.deopts < QUICKEN_MAX_DEOPTS:
+                self.runs = 0
+
+    def __repr__(self):
+        if self.handler is not None:
+            state = "%s %s %s" % (self.types[0].__name__, self.operation, self.types[1].__name__)  # type: ignore
+        elif self.runs < QUICKEN_AFTER:
+            state = "recording"
+        else:
+            state = "generic"
+        return f"<{state}: {self.hits} hits, {self.misses} misses, {self.deopts} deopts>"
+
+
+# Handlers skip the dispatch and isinstance checks of the Value methods and
+# build the result with its position already set, they must give exactly
+# what the method would.
+def number_operation(function: Callable[[Any, Any], Any]):
+    def handler(left: Value, right: Value, pos_start: Position, pos_end: Position) -> Optional[Value]:
+        if left.__class__ is Number and right.__class__ is Number:
+            result = new_value(Number)
+            result.pos_start = pos_start
+            result.pos_end = pos_end
+            result.context = left.context
+            result.value = function(left.value, right.value)  # type: ignore
+            return result
+    return handler
+
+
+def number_division(left: Value, right: Value, pos_start: Position, pos_end: Position) -> Optional[Value]:
+    # Division by zero is reported by dived_by.
+    if left.__class__ is Number and right.__class__ is Number and right.value:  # type: ignore
+        result = new_value(Number)
+        result.pos_start = pos_start
+        result.pos_end = pos_end
+        result.context = left.context
+        result.value = left.value / right.value  # type: ignore
+        return result
+
+
+def number_comparison(function: Callable[[Any, Any], bool]):
+    def handler(left: Value, right: Value, pos_start: Position, pos_end: Position) -> Optional[Value]:
+        if left.__class__ is Number and right.__class__ is Number:
+            result = new_value(Boolean)
+            result.pos_start = pos_start
+            result.pos_end = pos_end
+            result.context = left.context
+            result.value = 1 if function(left.value, right.value) else 0  # type: ignore
+            return result
+    return handler
+
+
+def string_operation(result_class: type[Value], function: Callable[[str, str], Any]):
+    def handler(left: Value, right: Value, pos_start: Position, pos_end: Position) -> Optional[Value]:
+        if left.__class__ is String and right.__class__ is String:
+            result = new_value(result_class)
+            result.pos_start = pos_start
+            result.pos_end = pos_end
+            result.context = left.context
+            result.value = function(left.value, right.value)  # type: ignore
+            return result
+    return handler
+
+
+# Handlers by the Value method and the classes of the two operands.
+HANDLERS: dict[tuple[str, type, type], Callable[[Value, Value, Position, Position], Optional[Value]]] = {
+    ("added_to", Number, Number): number_operation(operator.add),
+    ("subbed_by", Number, Number): number_operation(operator.sub),
+    ("multed_by", Number, Number): number_operation(operator.mul),
+    ("dived_by", Number, Number): number_division,
+    ("powed_by", Number, Number): number_operation(operator.pow),
+    ("get_comparison_eq", Number, Number): number_comparison(operator.eq),
+    ("get_comparison_ne", Number, Number): number_comparison(operator.ne),
+    ("get_comparison_lt", Number, Number): number_comparison(operator.lt),
+    ("get_comparison_gt", Number, Number): number_comparison(operator.gt),
+    ("get_comparison_lte", Number, Number): number_comparison(operator.le),
+    ("get_comparison_gte", Number, Number): number_comparison(operator.ge),
+    ("added_to", String, String): string_operation(String, operator.add),
+    ("get_comparison_eq", String, String): string_operation(Boolean, operator.eq),
+    ("get_comparison_ne", String, String): string_operation(Boolean, operator.ne),
+}
+
+
+# The feedback of every BinOpNode in `tree` that has run, for diagnostics.
+def bin_op_feedback(tree: Node) -> list[tuple[BinOpNode, BinOpFeedback]]:
+    found = []
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if node.kind == NODE_BIN_OP and node.feedback is not None:  # type: ignore
+            found.append((node, node.feedback))  # type: ignore
+        nodes.extend(node.children())
+    found.sort(key=lambda item: item[0].start)
+    return found
+
+
+#######################################
+# COUNTED LOOPS
+#######################################
+
+
+# The values `for i = start to end step step` takes, as a range, when start
+# and step are ints. Other loops are counted by comparing each value.
+def counted_range(start: Any, end: Any, step: Any) -> Optional[range]:
+    if start.__class__ is not int or step.__class__ is not int or not step:
+        return None
+    if end.__class__ is float and math.isfinite(end):
+        end = math.floor(end) if step > 0 else math.ceil(end)
+    elif end.__class__ is not int:
+        return None
+    return range(start, end + 1 if step > 0 else end - 1, step)
+
+
+# Where `name` is set in `symbol_table`, as a container and key, so a loop
+# can set its variable with one item assignment.
+def variable_store(symbol_table: SymbolTable, name: str) -> tuple[Any, Any]:
+    if symbol_table.layout:
+        slot = symbol_table.layout.get(name)
+        if slot is not None:
+            return symbol_table.slots, slot
+    return symbol_table.symbols, name
+
+
+# Number(value) without going through the constructors, for loop variables.
+def new_number(value: int) -> Number:
+    number = new_value(Number)
+    number.pos_start = None
+    number.pos_end = None
+    number.context = None
+    number.value = value
+    return number
+
+
+# The statements of a loop body, run one by one since the List a body
+# evaluates to is never used.
+def loop_statements(body_node: Node) -> list[Node]:
+    return body_node.element_nodes if body_node.kind == NODE_LIST else [body_node]  # type: ignore
+
 
 #######################################
 # INTERPRETER
@@ -912,96 +1864,66 @@ global_symbol_table.set("random_choices", BuiltInFunction("random_choices"))
 class Interpreter:
     def __init__(self, context: Context) -> None:
         self.context = context
-        self.methods: dict[str, function] = {
-            "NumberNode": self.visit_NumberNode,
-            "BinOpNode": self.visit_BinOpNode,
-            "UnaryOpNode": self.visit_UnaryOpNode,
-            "VarAccessNode": self.visit_VarAccessNode,
-            "VarAssignNode": self.visit_VarAssignNode,
-            "StringNode": self.visit_StringNode,
-            "IfNode": self.visit_IfNode,
-            "ListNode": self.visit_ListNode,
-            "ForNode": self.visit_ForNode,
-            "WhileNode": self.visit_WhileNode,
-            "BreakNode": self.visit_BreakNode,
-            "ContinueNode": self.visit_ContinueNode,
-            "FunctionDefNode": self.visit_FuncDefNode,
-            "FunctionCallNode": self.visit_FuncCallNode,
-            "ReturnNode": self.visit_ReturnNode,
-            "ImportNode": self.visit_ImportNode,
-            "FromImportNode": self.visit_FromImportNode,
-            "DictNode": self.visit_DictNode,
-        }
 
-    def visit(self, node: Any, context: Optional[Context] = None):
-        context = context or self.context
-        method_name = f"visit_{type(node).__name__}"
-        method = getattr(self, method_name, self.no_visit_method)
-        return method(node, context)
-
-    def no_visit_method(self, node: Any, context: Context):
-        raise Exception(f"No visit_{type(node).__name__} method defined")
+    # Returns the value of `node`. Errors, return, break and continue leave
+    # through the FlowSignal exceptions instead.
+    def visit(self, node: Node, context: Optional[Context] = None) -> Any:
+        return self.visitors[node.kind](self, node, context or self.context)
+
+    # Turns a parsed tree into what `visit` runs. Engines that execute
+    # something other than the tree override these two.
+    @classmethod
+    def prepare(cls, tree: Node, whole_program: bool = True) -> Any:
+        return Resolver(whole_program).resolve(Optimizer().optimize(tree))
+
+    @classmethod
+    def load(cls, file_name: str, text: str, whole_program: bool = True) -> tuple[Any, Optional[Error]]:
+        # Only here, compiled scripts import this module but never parse,
+        # and the cache's pickle and hashlib would double their startup.
+        import fxcache
+        tree, error = fxcache.parse(file_name, text)
+        if error:
+            return None, error
+        return cls.prepare(tree, whole_program), None
 
     ###################################
 
     def visit_NumberNode(self, node: NumberNode, context: Context):
-        return RTResult().success(
+        return (
             Number(node.tok.value)  # type: ignore
             .set_context(context)
             .set_pos(node.pos_start, node.pos_end)
         )
 
     def visit_BinOpNode(self, node: BinOpNode, context: Context):
-        res = RTResult()
-        left: Value = res.register(self.visit(node.left_node, context))  # type: ignore
-        if res.should_return():
-            return res
-        right: Value = res.register(self.visit(node.right_node, context))  # type: ignore
-        if res.error:
-            return res
-
-        if node.op_tok.type == TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.op_tok.type == TT_MINUS:
-            result, error = left.subbed_by(right)
-        elif node.op_tok.type == TT_MUL:
-            result, error = left.multed_by(right)
-        elif node.op_tok.type == TT_DIV:
-            result, error = left.dived_by(right)
-        elif node.op_tok.type == TT_POW:
-            result, error = left.powed_by(right)
-        elif node.op_tok.type == TT_EE:
-            result, error = left.get_comparison_eq(right)
-        elif node.op_tok.type == TT_NE:
-            result, error = left.get_comparison_ne(right)
-        elif node.op_tok.type == TT_LT:
-            result, error = left.get_comparison_lt(right)
-        elif node.op_tok.type == TT_GT:
-            result, error = left.get_comparison_gt(right)
-        elif node.op_tok.type == TT_LTE:
-            result, error = left.get_comparison_lte(right)
-        elif node.op_tok.type == TT_GTE:
-            result, error = left.get_comparison_gte(right)
-        elif node.op_tok.matches(TT_KEYWORD, "and"):
-            result, error = left.anded_by(right)
-        elif node.op_tok.matches(TT_KEYWORD, "or"):
-            result, error = left.ored_by(right)
-        else:
-            result, error = None, RTError(
-                node.pos_start, node.pos_end, "Invalid operation", context
-            )
-
-        if not result or error:
-            return res.failure(error)
-        else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+        left: Value = self.visit(node.left_node, context)
+        right: Value = self.visit(node.right_node, context)
+
+        feedback: Optional[BinOpFeedback] = node.feedback  # type: ignore
+        if feedback is None:
+            op_tok = node.op_tok
+            operation = BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)  # type: ignore
+            if not operation:
+                raise ErrorSignal(RTError(node.pos_start, node.pos_end, "Invalid operation", context))
+            feedback = node.feedback = BinOpFeedback(operation, node)
+
+        handler = feedback.handler
+        if handler is not None:
+            result = handler(left, right, feedback.pos_start, feedback.pos_end)
+            if result is not None:
+                feedback.hits += 1
+                return result
+            feedback.miss()
+        elif feedback.runs < QUICKEN_AFTER:
+            feedback.record(left, right)
+
+        result, error = getattr(left, feedback.operation)(right)
+        if error:
+            raise ErrorSignal(error)
+        return result and result.set_pos(feedback.pos_start, feedback.pos_end)
 
     def visit_UnaryOpNode(self, node: UnaryOpNode, context: Context):
-        res = RTResult()
-        number: Number | Boolean = res.register(self.visit(node.node, context))  # type: ignore
-        if res.should_return():
-            return res
-
+        number: Number | Boolean = self.visit(node.node, context)
         error = None
 
         if node.op_tok.type == TT_MINUS:
@@ -1010,16 +1932,26 @@ class Interpreter:
             number, error = number.notted()  # type: ignore
 
         if error:
-            return res.failure(error)
-        else:
-            return res.success(number.set_pos(node.pos_start, node.pos_end))
+            raise ErrorSignal(error)
+        return number.set_pos(node.pos_start, node.pos_end)
 
     def visit_VarAccessNode(self, node: VarAccessNode, context: Context):
-        res = RTResult()
+        return self.lookup(node, context).copy().set_pos(node.pos_start, node.pos_end)
+
+    # The value a variable holds, not a copy of it.
+    def lookup(self, node: VarAccessNode, context: Context) -> Value:
         var_name = node.var_name_tok.value
-        value = context.symbol_table.get(var_name)  # type: ignore
+        symbol_table: SymbolTable = context.symbol_table  # type: ignore
+        if node.depth == 0:
+            value = symbol_table.slots[node.slot]
+            if value is None:
+                value = symbol_table.get(var_name)  # type: ignore
+        elif node.depth == DEPTH_GLOBAL:
+            value = symbol_table.root.symbols.get(var_name)  # type: ignore
+        else:
+            value = symbol_table.get(var_name)  # type: ignore
         if not value:
-            return res.failure(
+            raise ErrorSignal(
                 RTError(
                     node.pos_start,
                     node.pos_end,
@@ -1027,14 +1959,12 @@ class Interpreter:
                     context,
                 )
             )
-        value = value.copy().set_pos(node.pos_start, node.pos_end)
-        return res.success(value)
+        return value
 
     def visit_VarAssignNode(self, node: VarAssignNode, context: Context):
-        res = RTResult()
         var_name = node.var_name_tok.value
         if var_name in global_reserved_symbols:
-            return res.failure(
+            raise ErrorSignal(
                 RTError(
                     node.pos_start,
                     node.pos_end,
@@ -1042,67 +1972,65 @@ class Interpreter:
                     context,
                 )
             )
-        value = res.register(self.visit(node.value_node, context))
-        if res.should_return():
-            return res
-        context.symbol_table.set(var_name, value)  # type: ignore
-        return res.success(value)  # type: ignore
+        value = self.visit(node.value_node, context)
+        if node.depth == 0:
+            context.symbol_table.slots[node.slot] = value  # type: ignore
+        else:
+            context.symbol_table.set(var_name, value)  # type: ignore
+        return value
+
+    def visit_SetIndexNode(self, node: SetIndexNode, context: Context):
+        value = self.visit(node.value_node, context)
+        # The variable itself rather than the copy a read makes. The copy
+        # would share its elements, this only saves making it.
+        base_node = node.base_node
+        if base_node.kind == NODE_VAR_ACCESS:
+            target = self.lookup(base_node, context)  # type: ignore
+        else:
+            target = self.visit(base_node, context)
+        index = self.visit(node.index_node, context)
+        return self.set_index(node, target, index, value, context)
+
+    def set_index(self, node: SetIndexNode, target: Value, index: Value, value: Value, context: Context) -> Value:
+        result, error = target.set_index(index, value)
+        if not result:
+            raise ErrorSignal(error or RTError(node.pos_start, node.pos_end, "Illegal operation", context))
+        return result
 
     def visit_StringNode(self, node: StringNode, context: Context):
-        return RTResult().success(
+        return (
             String(node.tok.value)  # type: ignore
             .set_context(context)
             .set_pos(node.pos_start, node.pos_end)
         )
 
     def visit_IfNode(self, node: IfNode, context: Context):
-        res = RTResult()
         for condition, expr in node.cases:
-            condition_value = res.register(self.visit(condition, context))
-            if res.should_return():
-                return res
-            if condition_value.is_true():  # type: ignore
-                expr_value = res.register(self.visit(expr, context))
-                if res.should_return():
-                    return res
-                return res.success(expr_value)  # type: ignore
+            if self.visit(condition, context).is_true():
+                return self.visit(expr, context)
 
         if node.else_case:
-            else_value = res.register(self.visit(node.else_case, context))
-            if res.should_return():
-                return res
-            return res.success(else_value)  # type: ignore
-        return res.success(Null) 
+            return self.visit(node.else_case, context)
+        return Null
 
     def visit_ListNode(self, node: ListNode, context: Context):
-        res = RTResult()
-        elements: list[Value | None] = []
-        for element_node in node.element_nodes:
-            elements.append(res.register(self.visit(element_node, context)))
-            if res.should_return():
-                return res
-        return res.success(
-            List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        elements: list[Value | None] = [self.visit(element_node, context) for element_node in node.element_nodes]
+        return List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
 
     def visit_ForNode(self, node: ForNode, context: Context):
-        res = RTResult()
-        start_value: Number = res.register(self.visit(node.start_value_node, context))  # type: ignore
-        if res.should_return():
-            return res
-        end_value = res.register(self.visit(node.end_value_node, context))
-        if res.should_return():
-            return res
-        step_value = res.register(self.visit(node.step_value_node, context))
-        if res.should_return():
-            return res
+        start_value: Number = self.visit(node.start_value_node, context)
+        end_value = self.visit(node.end_value_node, context)
+        step_value = self.visit(node.step_value_node, context)
         i = start_value.value
-        if step_value == 0:  # type: ignore
-            return res.failure(
+        if step_value.value == 0:  # type: ignore
+            raise ErrorSignal(
                 RTError(
-                    node.pos_start, node.pos_end, "Step value cannot be zero", context
+                    node.step_value_node.pos_start, node.step_value_node.pos_end, "Step value cannot be zero", context
                 )
             )
+        values = counted_range(i, end_value.value, step_value.value)  # type: ignore
+        if values is not None:
+            return self.run_counted(node, values, context)
         elif step_value.value > 0:  # type: ignore
             condition = lambda: i <= end_value.value  # type: ignore
         else:
@@ -1110,43 +2038,49 @@ class Interpreter:
         while condition():
             context.symbol_table.set(node.var_name_tok.value, Number(i))  # type: ignore
             i += step_value.value  # type: ignore
-            res.register(self.visit(node.body_node, context))
-            if res.should_return():
-                if res.loop_should_continue:
-                    continue
-                if res.loop_should_break:
-                    break
-                return res
-        return res.success(Null)
+            try:
+                self.visit(node.body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+        return Null
+
+    def run_counted(self, node: ForNode, values: range, context: Context):
+        store, key = variable_store(context.symbol_table, node.var_name_tok.value)  # type: ignore
+        visitors = self.visitors
+        statements = [(visitors[statement.kind], statement) for statement in loop_statements(node.body_node)]
+        for i in values:
+            store[key] = new_number(i)
+            try:
+                for visit, statement in statements:
+                    visit(self, statement, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+        return Null
 
     def visit_WhileNode(self, node: WhileNode, context: Context):
-        res = RTResult()
-        while True:
-            condition = res.register(self.visit(node.condition_node, context))
-            if res.should_return():
-                return res
-            if not condition.is_true():  # type: ignore
+        while self.visit(node.condition_node, context).is_true():
+            try:
+                self.visit(node.body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
                 break
-            res.register(self.visit(node.body_node, context))
-            if res.should_return():
-                if res.loop_should_continue:
-                    continue
-                if res.loop_should_break:
-                    break
-                return res
-        return res.success(Null)
+        return Null
 
     def visit_BreakNode(self, node: BreakNode, context: Context):
-        return RTResult().success_break()
+        raise BreakSignal()
 
     def visit_ContinueNode(self, node: ContinueNode, context: Context):
-        return RTResult().success_continue()
+        raise ContinueSignal()
 
     def visit_FuncDefNode(self, node: FuncDefNode, context: Context):
-        res = RTResult()
         func_name:str = node.var_name_tok.value  # type: ignore
         if func_name in global_reserved_symbols:
-            return res.failure(
+            raise ErrorSignal(
                 RTError(
                     node.pos_start,
                     node.pos_end,
@@ -1155,77 +2089,85 @@ class Interpreter:
                 )
             )
         body_node = node.body_node
-        args:list[tuple[Token|str, bool, Any]] = [(arg_name[0], arg_name[1], res.register(self.visit(arg_name[2], context)) if arg_name[1] else None) for arg_name in node.arg_name_toks]
-        func_value = Function(func_name, body_node, args, node.mulargs, node.mulkwargs).set_context(context).set_pos(node.pos_start, node.pos_end)
+        args:list[tuple[Token|str, bool, Any]] = [(arg_name[0], arg_name[1], self.default_value(arg_name[2], context) if arg_name[1] else None) for arg_name in node.arg_name_toks]
+        func_value = Function(func_name, body_node, args, node.mulargs, node.mulkwargs, layout=node.layout).set_context(context).set_pos(node.pos_start, node.pos_end)
         context.symbol_table.set(func_name, func_value) # type: ignore
-        return res.success(func_value)
+        return func_value
+
+    def default_value(self, node: Node, context: Context) -> Optional[Value]:
+        # A default that fails to evaluate leaves the argument without one.
+        try:
+            return self.visit(node, context)
+        except FlowSignal:
+            return None
     
     def visit_FuncCallNode(self, node: FuncCallNode, context: Context):
-        res = RTResult()
-        args:list[Any] = []
-        kwargs:dict[Any, Any] = {}
-        value_to_call = res.register(self.visit(node.node_to_call, context))
+        value_to_call, args, kwargs = self.call_parts(node, context)
+        return_value = value_to_call.call(args, kwargs, context)
+        return return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)  # type: ignore function always returns a value or Null
+
+    # The value a call is made on and its arguments.
+    def call_parts(self, node: FuncCallNode, context: Context) -> tuple[Value, list[Value], dict[str|Token, Value]]:
+        try:
+            value_to_call = self.visit(node.node_to_call, context)
+        except FlowSignal:
+            value_to_call = None
         if not value_to_call:
-            return res.failure(RTError(node.pos_start, node.pos_end, "Function not defined", context))
-        for arg_node in node.arg_nodes:
-            args.append(res.register(self.visit(arg_node, context)))
-            if res.should_return():
-                return res
+            raise ErrorSignal(RTError(node.pos_start, node.pos_end, "Function not defined", context))
+        args:list[Any] = [self.visit(arg_node, context) for arg_node in node.arg_nodes]
+        kwargs:dict[Any, Any] = {}
         for kwarg in node.kwargs_nodes:
-            kwargs[kwarg[0].value] = res.register(self.visit(kwarg[1], context))
-            if res.should_return():
-                return res
-    
-        return_value = res.register(value_to_call.execute(args, kwargs, context))
-        if res.should_return():
-            return res
-        return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)  # type: ignore function always returns a value or Null
-        
-        return res.success(return_value)
-    
+            kwargs[kwarg[0].value] = self.visit(kwarg[1], context)
+        return value_to_call, args, kwargs
+
     def visit_ReturnNode(self, node: ReturnNode, context: Context):
-        res = RTResult()
-        if node.node_to_return:
-            value = res.register(self.visit(node.node_to_return, context))
-            if res.should_return():
-                return res
+        if node.tail:
+            call: FuncCallNode = node.node_to_return  # type: ignore
+            value_to_call, args, kwargs = self.call_parts(call, context)
+            if value_to_call.__class__ is Function:
+                raise TailCall(value_to_call, args, kwargs, call.pos_start, call.pos_end, node.tail == TAIL_CALL_REPLACE)  # type: ignore
+            value = value_to_call.call(args, kwargs, context).copy().set_pos(call.pos_start, call.pos_end).set_context(context)
+        elif node.node_to_return:
+            value = self.visit(node.node_to_return, context)
         else:
             value = Number(0)
-        return res.success_return(value) # type: ignore
+        raise ReturnSignal(value)
+
+    def run_module(self, tree: Any):
+        # Return, break and continue at the top of a module only end it.
+        try:
+            self.visit(tree)
+        except ErrorSignal:
+            raise
+        except FlowSignal:
+            pass
          
     def visit_ImportNode(self, node: ImportNode, context: Context):
-        res = RTResult()
         module = node.module_name.value
         
         if not isinstance(module, str):
             return
+        native = self.load_native(node, context)
+        if native is not None:
+            alias = node.alias.value or module
+            context.symbol_table.update({f"{alias}.{key}": value for key, value in native.items()})  # type: ignore
+            return Null
         file = module.replace('.', '/') 
         file += ".fx"  
         try:
             with open(file, "r") as f: 
                 script = f.read()
         except:
-            return res.failure(RTError(node.pos_start, node.pos_end, f"Module '{module}' not found", context))  # type: ignore
-        lexer = Lexer(file, script)
-        tokens, error = lexer.make_tokens()
-        
+            raise ErrorSignal(RTError(node.pos_start, node.pos_end, f"Module '{module}' not found", context))  # type: ignore
+        tree, error = self.load(file, script, False)
         if error:
-            return res.failure(error) 
-        if not tokens:
-            return res.failure(RTError(node.pos_start, node.pos_end, f"Module '{module}' is empty", context)) # type: ignore
-        parser = Parser(tokens) 
-        ast = parser.parse()
-        
-        if ast.error:
-            return res.failure(ast.error) 
+            raise ErrorSignal(error)
+
         execcontext = Context(file)
         execcontext.symbol_table = global_symbol_table.copy()
 
-        interpreter = Interpreter(execcontext)
-        value = interpreter.visit(ast.node) 
-        
-        if value.error:
-            return res.failure(value.error)
+        interpreter = type(self)(execcontext)
+        interpreter.run_module(tree)
 
         alias = node.alias.value or module
         
@@ -1234,46 +2176,17 @@ class Interpreter:
             f"{alias}.{key}": value for key, value in interpreter.context.symbol_table.symbols.items() # type: ignore
         }
         
-        context.symbol_table.symbols.update(symbols) # type: ignore
+        context.symbol_table.update(symbols) # type: ignore
         
-        return res.success(Null)
+        return Null
     
     def visit_FromImportNode(self, node: FromImportNode, context: Context):
-        res = RTResult()
         module = node.module_name.value
         if not isinstance(module, str):
             return
-        file:str = module.replace('.', '/')
-        file += ".fx"
-        try:
-            with open(file, "r") as f:
-                script = f.read()
-        except:
-            return res.failure(RTError(node.pos_start, node.pos_end, f"Module '{module}' not found", context))
-            
-        lexer = Lexer(file, script) 
-        tokens, error = lexer.make_tokens()
-        
-        if error:
-            return res.failure(error) 
-        if not tokens:
-            return res.failure(RTError(node.pos_start, node.pos_end, f"Module '{module}' is empty", context))
-        parser = Parser(tokens) 
-        ast = parser.parse()
-        
-        if ast.error:
-            return res.failure(ast.error) 
-        
-        context = Context(file, context) 
-        context.symbol_table = global_symbol_table
-        
-        interpreter = Interpreter(context)
-        value = interpreter.visit(ast.node)
-        
-        if value.error:
-            return res.failure(value.error) 
-        
-        modulesymbols = interpreter.context.symbol_table.symbols # type: ignore
+        modulesymbols = self.load_native(node, context)
+        if modulesymbols is None:
+            modulesymbols = self.run_file_module(node, context)
         
         functions = node.functions
         
@@ -1287,29 +2200,503 @@ class Interpreter:
                 
                 symbols[f"{alias}"] = modulesymbols[function[0].value]
                 
-        self.context.symbol_table.symbols.update(symbols) # type: ignore
+        context.symbol_table.update(symbols) # type: ignore
         
-        return res.success(Null)
+        return Null
             
+    def run_file_module(self, node: FromImportNode, context: Context) -> dict[str, Value]:
+        module:str = node.module_name.value  # type: ignore
+        file:str = module.replace('.', '/')
+        file += ".fx"
+        try:
+            with open(file, "r") as f:
+                script = f.read()
+        except:
+            raise ErrorSignal(RTError(node.pos_start, node.pos_end, f"Module '{module}' not found", context))
+            
+        tree, error = self.load(file, script, False)
+        if error:
+            raise ErrorSignal(error)
+
+        context = Context(file, context) 
+        context.symbol_table = global_symbol_table
+        
+        interpreter = type(self)(context)
+        interpreter.run_module(tree)
+        
+        return interpreter.context.symbol_table.symbols # type: ignore
+
+    # The symbols of a module that isn't a .fx file, from the loader in
+    # module_loaders for the first part of its name. None for other modules.
+    def load_native(self, node: ImportNode | FromImportNode, context: Context) -> Optional[dict[str, Value]]:
+        module:str = node.module_name.value  # type: ignore
+        prefix, _, name = module.partition(".")
+        loader = module_loaders.get(prefix)
+        if loader is None or not name:
+            return None
+        symbols = loader(name)
+        if symbols is None:
+            raise ErrorSignal(RTError(node.pos_start, node.pos_end, f"Module '{module}' not found", context))  # type: ignore
+        return symbols
+
+    def visit_ConstNode(self, node: ConstNode, context: Context):
+        return node.value.copy().set_context(context).set_pos(node.pos_start, node.pos_end)
+
     def visit_DictNode(self, node: DictNode, context: Context):
-        res = RTResult()
         elements:dict[str|int, Value] = {}
         for key, value in node.key_value_pairs.items():
-            key:Value|None = res.register(self.visit(key, context))
-            if res.should_return():
-                return res
+            key:Value|None = self.visit(key, context)
             if not isinstance(key, String):
-                return res.failure(RTError(node.pos_start, node.pos_end, "Dictionary keys must be strings", context))
+                raise ErrorSignal(RTError(node.pos_start, node.pos_end, "Dictionary keys must be strings", context))
             
-            elements[key.value] = res.register(self.visit(value, context)) # type: ignore
+            elements[key.value] = self.visit(value, context) # type: ignore
 
-            if res.should_return():
-                return res
-        return res.success(
-            Dictionary(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-        )
+        return Dictionary(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
 
         
         
             
-    
\ No newline at end of file
+    
+
+    # Visit methods indexed by node kind, see the NODE_* constants.
+    visitors = [
+        visit_NumberNode,
+        visit_BinOpNode,
+        visit_UnaryOpNode,
+        visit_VarAccessNode,
+        visit_VarAssignNode,
+        visit_StringNode,
+        visit_ReturnNode,
+        visit_ContinueNode,
+        visit_BreakNode,
+        visit_IfNode,
+        visit_ListNode,
+        visit_ForNode,
+        visit_WhileNode,
+        visit_FuncDefNode,
+        visit_FuncCallNode,
+        visit_ImportNode,
+        visit_FromImportNode,
+        visit_DictNode,
+        visit_ConstNode,
+        visit_SetIndexNode,
+    ]
+
+
+#######################################
+# CLOSURE COMPILER
+#######################################
+
+
+class Compiler(Interpreter):
+    # Turns every node into a Python closure once, before anything runs, so
+    # executing the program no longer dispatches on node kinds or reads node
+    # attributes. Each closure takes the context it runs in and behaves
+    # exactly like the matching visit method of the Interpreter.
+    def visit(self, node: Node, context: Optional[Context] = None):
+        return self.compile(node)(context or self.context)
+
+    def compile(self, node: Node) -> Callable[[Context], Any]:
+        return self.compilers[node.kind](self, node)
+
+    ###################################
+
+    def compile_NumberNode(self, node: NumberNode):
+        number = node.tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_number(context: Context):
+            return Number(number).set_context(context).set_pos(pos_start, pos_end)  # type: ignore
+        return run_number
+
+    def compile_BinOpNode(self, node: BinOpNode):
+        left = self.compile(node.left_node)
+        right = self.compile(node.right_node)
+        op_tok = node.op_tok
+        operation = BINARY_OPERATIONS.get(op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type)  # type: ignore
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        if not operation:
+            def run_invalid_bin_op(context: Context):
+                left(context)
+                right(context)
+                raise ErrorSignal(RTError(pos_start, pos_end, "Invalid operation", context))
+            return run_invalid_bin_op
+
+        feedback = node.feedback = BinOpFeedback(operation, node)
+
+        def run_bin_op(context: Context):
+            left_value = left(context)
+            right_value = right(context)
+
+            handler = feedback.handler
+            if handler is not None:
+                result = handler(left_value, right_value, pos_start, pos_end)
+                if result is not None:
+                    feedback.hits += 1
+                    return result
+                feedback.miss()
+            elif feedback.runs < QUICKEN_AFTER:
+                feedback.record(left_value, right_value)
+
+            result, error = getattr(left_value, operation)(right_value)
+            if error:
+                raise ErrorSignal(error)
+            return result and result.set_pos(pos_start, pos_end)
+        return run_bin_op
+
+    def compile_UnaryOpNode(self, node: UnaryOpNode):
+        operand = self.compile(node.node)
+        op_type = node.op_tok.type
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_unary_op(context: Context):
+            number = operand(context)
+            error = None
+
+            if op_type == TT_MINUS:
+                number, error = number.multed_by(Number(-1))  # type: ignore
+            elif op_type == TT_NOT:
+                number, error = number.notted()  # type: ignore
+
+            if error:
+                raise ErrorSignal(error)
+            return number.set_pos(pos_start, pos_end)  # type: ignore
+        return run_unary_op
+
+    def compile_VarAccessNode(self, node: VarAccessNode):
+        var_name = node.var_name_tok.value
+        slot = node.slot
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def not_defined(context: Context):
+            return ErrorSignal(
+                RTError(pos_start, pos_end, f"'{var_name}' is not defined", context)
+            )
+
+        if node.depth == 0:
+            def run_var_access(context: Context):
+                symbol_table: SymbolTable = context.symbol_table  # type: ignore
+                value = symbol_table.slots[slot]
+                if value is None:
+                    value = symbol_table.get(var_name)  # type: ignore
+                if not value:
+                    raise not_defined(context)
+                return value.copy().set_pos(pos_start, pos_end)
+        elif node.depth == DEPTH_GLOBAL:
+            def run_var_access(context: Context):
+                value = context.symbol_table.root.symbols.get(var_name)  # type: ignore
+                if not value:
+                    raise not_defined(context)
+                return value.copy().set_pos(pos_start, pos_end)
+        else:
+            def run_var_access(context: Context):
+                value = context.symbol_table.get(var_name)  # type: ignore
+                if not value:
+                    raise not_defined(context)
+                return value.copy().set_pos(pos_start, pos_end)
+        return run_var_access
+
+    def compile_VarAssignNode(self, node: VarAssignNode):
+        var_name = node.var_name_tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+        if var_name in global_reserved_symbols:
+            def run_reserved(context: Context):
+                raise ErrorSignal(
+                    RTError(pos_start, pos_end, f"'{var_name}' is a reserved symbol", context)
+                )
+            return run_reserved
+
+        value_code = self.compile(node.value_node)
+        slot = node.slot
+
+        if node.depth == 0:
+            def run_var_assign(context: Context):
+                value = value_code(context)
+                context.symbol_table.slots[slot] = value  # type: ignore
+                return value
+        else:
+            def run_var_assign(context: Context):
+                value = value_code(context)
+                context.symbol_table.set(var_name, value)  # type: ignore
+                return value
+        return run_var_assign
+
+    def compile_SetIndexNode(self, node: SetIndexNode):
+        value_code = self.compile(node.value_node)
+        index_code = self.compile(node.index_node)
+        base_node = node.base_node
+        if base_node.kind == NODE_VAR_ACCESS:
+            lookup = self.lookup
+            target_code = lambda context: lookup(base_node, context)  # type: ignore
+        else:
+            target_code = self.compile(base_node)
+        set_index = self.set_index
+
+        def run_set_index(context: Context):
+            value = value_code(context)
+            target = target_code(context)
+            return set_index(node, target, index_code(context), value, context)
+        return run_set_index
+
+    def compile_StringNode(self, node: StringNode):
+        string = node.tok.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_string(context: Context):
+            return String(string).set_context(context).set_pos(pos_start, pos_end)  # type: ignore
+        return run_string
+
+    def compile_IfNode(self, node: IfNode):
+        cases = [(self.compile(condition), self.compile(expr)) for condition, expr in node.cases]
+        else_case = self.compile(node.else_case) if node.else_case else None
+
+        def run_if(context: Context):
+            for condition, expr in cases:
+                if condition(context).is_true():
+                    return expr(context)
+            if else_case:
+                return else_case(context)
+            return Null
+        return run_if
+
+    def compile_ListNode(self, node: ListNode):
+        element_codes = [self.compile(element_node) for element_node in node.element_nodes]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_list(context: Context):
+            elements: list[Value | None] = [element(context) for element in element_codes]
+            return List(elements).set_context(context).set_pos(pos_start, pos_end)
+        return run_list
+
+    def compile_ForNode(self, node: ForNode):
+        start_code = self.compile(node.start_value_node)
+        end_code = self.compile(node.end_value_node)
+        step_code = self.compile(node.step_value_node)
+        statements = [self.compile(statement) for statement in loop_statements(node.body_node)]
+        var_name = node.var_name_tok.value
+        pos_start, pos_end = node.step_value_node.pos_start, node.step_value_node.pos_end
+
+        def run_for(context: Context):
+            start_value: Number = start_code(context)
+            end_value = end_code(context)
+            step_value = step_code(context)
+            i = start_value.value
+            if step_value.value == 0:  # type: ignore
+                raise ErrorSignal(
+                    RTError(pos_start, pos_end, "Step value cannot be zero", context)
+                )
+            step = step_value.value  # type: ignore
+            values = counted_range(i, end_value.value, step)  # type: ignore
+            if values is not None:
+                store, key = variable_store(context.symbol_table, var_name)  # type: ignore
+                for i in values:
+                    store[key] = new_number(i)
+                    try:
+                        for statement in statements:
+                            statement(context)
+                    except ContinueSignal:
+                        continue
+                    except BreakSignal:
+                        break
+                return Null
+            ascending = step > 0
+            symbol_table: SymbolTable = context.symbol_table  # type: ignore
+            while i <= end_value.value if ascending else i >= end_value.value:  # type: ignore
+                symbol_table.set(var_name, Number(i))  # type: ignore
+                i += step
+                try:
+                    for statement in statements:
+                        statement(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+            return Null
+        return run_for
+
+    def compile_WhileNode(self, node: WhileNode):
+        condition = self.compile(node.condition_node)
+        body = self.compile(node.body_node)
+
+        def run_while(context: Context):
+            while condition(context).is_true():
+                try:
+                    body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+            return Null
+        return run_while
+
+    def compile_BreakNode(self, node: BreakNode):
+        def run_break(context: Context):
+            raise BreakSignal()
+        return run_break
+
+    def compile_ContinueNode(self, node: ContinueNode):
+        def run_continue(context: Context):
+            raise ContinueSignal()
+        return run_continue
+
+    def compile_FuncDefNode(self, node: FuncDefNode):
+        var_name_tok = node.var_name_tok
+        defaults = [
+            (arg_name[0], arg_name[1], self.compile(arg_name[2]) if arg_name[1] else None)
+            for arg_name in node.arg_name_toks
+        ]
+        body = self.compile(node.body_node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def default_value(default: Callable[[Context], Any], context: Context) -> Optional[Value]:
+            try:
+                return default(context)
+            except FlowSignal:
+                return None
+
+        def run_func_def(context: Context):
+            func_name: str = var_name_tok.value  # type: ignore
+            if func_name in global_reserved_symbols:
+                raise ErrorSignal(
+                    RTError(pos_start, pos_end, f"'{func_name}' is a reserved symbol", context)
+                )
+            args: list[tuple[Token|str, bool, Any]] = [(name, has_default, default_value(default, context) if default else None) for name, has_default, default in defaults]
+            func_value = Function(func_name, node.body_node, args, node.mulargs, node.mulkwargs, layout=node.layout, code=body).set_context(context).set_pos(pos_start, pos_end)
+            context.symbol_table.set(func_name, func_value)  # type: ignore
+            return func_value
+        return run_func_def
+
+    def compile_FuncCallNode(self, node: FuncCallNode):
+        call_parts = self.compile_call_parts(node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_func_call(context: Context):
+            value_to_call, args, kwargs = call_parts(context)
+            return_value = value_to_call.call(args, kwargs, context)
+            return return_value.copy().set_pos(pos_start, pos_end).set_context(context)  # type: ignore function always returns a value or Null
+        return run_func_call
+
+    def compile_call_parts(self, node: FuncCallNode) -> Callable[[Context], tuple[Value, list[Value], dict[str|Token, Value]]]:
+        callee = self.compile(node.node_to_call)
+        arg_codes = [self.compile(arg_node) for arg_node in node.arg_nodes]
+        kwarg_codes = [(kwarg[0].value, self.compile(kwarg[1])) for kwarg in node.kwargs_nodes]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_call_parts(context: Context):
+            try:
+                value_to_call = callee(context)
+            except FlowSignal:
+                value_to_call = None
+            if not value_to_call:
+                raise ErrorSignal(RTError(pos_start, pos_end, "Function not defined", context))
+            args: list[Any] = [arg(context) for arg in arg_codes]
+            kwargs: dict[Any, Any] = {}
+            for name, kwarg in kwarg_codes:
+                kwargs[name] = kwarg(context)
+            return value_to_call, args, kwargs
+        return run_call_parts
+
+    def compile_ReturnNode(self, node: ReturnNode):
+        if not node.node_to_return:
+            def run_return_zero(context: Context):
+                raise ReturnSignal(Number(0))
+            return run_return_zero
+        if node.tail:
+            call_parts = self.compile_call_parts(node.node_to_return)  # type: ignore
+            pos_start, pos_end = node.node_to_return.pos_start, node.node_to_return.pos_end
+            replace_frame = node.tail == TAIL_CALL_REPLACE
+
+            def run_tail_call(context: Context):
+                value_to_call, args, kwargs = call_parts(context)
+                if value_to_call.__class__ is Function:
+                    raise TailCall(value_to_call, args, kwargs, pos_start, pos_end, replace_frame)  # type: ignore
+                raise ReturnSignal(value_to_call.call(args, kwargs, context).copy().set_pos(pos_start, pos_end).set_context(context))
+            return run_tail_call
+        value_code = self.compile(node.node_to_return)
+
+        def run_return(context: Context):
+            raise ReturnSignal(value_code(context))
+        return run_return
+
+    # Imports parse and compile the module when they run, the same way the
+    # Interpreter visits it.
+    def compile_ImportNode(self, node: ImportNode):
+        return lambda context: Compiler(context).visit_ImportNode(node, context)
+
+    def compile_FromImportNode(self, node: FromImportNode):
+        return lambda context: Compiler(context).visit_FromImportNode(node, context)
+
+    def compile_DictNode(self, node: DictNode):
+        pairs = [(self.compile(key), self.compile(value)) for key, value in node.key_value_pairs.items()]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_dict(context: Context):
+            elements: dict[str|int, Value] = {}
+            for key_code, value_code in pairs:
+                key = key_code(context)
+                if not isinstance(key, String):
+                    raise ErrorSignal(RTError(pos_start, pos_end, "Dictionary keys must be strings", context))
+                elements[key.value] = value_code(context)  # type: ignore
+            return Dictionary(elements).set_context(context).set_pos(pos_start, pos_end)
+        return run_dict
+
+    def compile_ConstNode(self, node: ConstNode):
+        value = node.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run_const(context: Context):
+            return value.copy().set_context(context).set_pos(pos_start, pos_end)
+        return run_const
+
+    # Compile methods indexed by node kind, see the NODE_* constants.
+    compilers = [
+        compile_NumberNode,
+        compile_BinOpNode,
+        compile_UnaryOpNode,
+        compile_VarAccessNode,
+        compile_VarAssignNode,
+        compile_StringNode,
+        compile_ReturnNode,
+        compile_ContinueNode,
+        compile_BreakNode,
+        compile_IfNode,
+        compile_ListNode,
+        compile_ForNode,
+        compile_WhileNode,
+        compile_FuncDefNode,
+        compile_FuncCallNode,
+        compile_ImportNode,
+        compile_FromImportNode,
+        compile_DictNode,
+        compile_ConstNode,
+        compile_SetIndexNode,
+    ]
+
+
+# Selected with `shell.py --engine`.
+ENGINES: dict[str, type[Interpreter]] = {
+    "tree": Interpreter,
+    "closure": Compiler,
+}
+
+
+#######################################
+# THREAD STATE
+#######################################
+
+# Symbol tables kept per thread for reuse, enough for the calls a loop
+# makes without holding on to every frame of a deep recursion.
+FREE_TABLES_MAX = 64
+
+
+class ThreadState(threading.local):
+    # What each thread reuses between calls: the Interpreter that walks the
+    # bodies of tree functions, which keeps nothing but a default context,
+    # and the symbol tables of calls that have returned.
+    def __init__(self):
+        self.interpreter = Interpreter(Context("<thread>"))
+        self.free_tables: list[SymbolTable] = []
+
+
+thread_state = ThreadState()
@@ -1,5 +1,7 @@
 from errors import *
-import string
+from string_with_arrows import Source
+import re
+from typing import IO, Iterator
 
 global_variables = [
     "Null",
@@ -66,23 +68,36 @@ RESERVED_KEYWORDS = [
 
 
 class Token:
+    __slots__ = ("type", "value", "start", "end", "source")
+    # Token ends always point just past the last character.
+    end_after = True
+
     def __init__(
         self,
         type_: str,
-        value: Optional[str | int | float] = None,
-        pos_start: Optional[Position] = None,
-        pos_end: Optional[Position] = None,
+        value: Optional[str | int | float],
+        start: int,
+        end: int,
+        source: Source,
     ):
         self.type = type_
         self.value = value
+        self.start = start
+        self.end = end
+        self.source = source
+
+    @property
+    def pos_start(self) -> Position:
+        return Position(self.start, self.source)
 
-        if pos_start:
-            self.pos_start = pos_start.copy()
-            self.pos_end = pos_start.copy()
-            self.pos_end.advance()
+    @property
+    def pos_end(self) -> Position:
+        return Position(self.end, self.source, True)
 
-        if pos_end:
-            self.pos_end = pos_end.copy()
+    def __reduce__(self):
+        # Pickled as constructor arguments, which loads much faster than the
+        # default slot state when trees are read back from the AST cache.
+        return (Token, (self.type, self.value, self.start, self.end, self.source))
 
     def matches(self, type_: str, value: str) -> bool:
         return self.type == type_ and self.value == value
@@ -91,215 +106,151 @@ class Token:
         return self.type + (f":{self.value}" if self.value != None else "")
 
 
+TOKEN_REGEX = re.compile(
+    r"""
+    (?P<SKIP>[ \t]+)
+    |(?P<NEWLINE>\n)
+    |(?P<NUMBER>[0-9]+(?:\.[0-9]*)?)
+    |(?P<IDENTIFIER>[A-Za-z_][A-Za-z0-9_.]*)
+    |(?P<STRING>"[^"]*"?|'[^']*'?)
+    |(?P<COMMENT>\#[^\n]*\n?)
+    |(?P<DOUBLE>==|!=|<=|>=|->)
+    |(?P<SINGLE>[;,+\-*/%()^:\[\]{}=!<>])
+    |(?P<ILLEGAL>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+SINGLE_CHAR_TOKENS = {
+    ";": TT_NEWLINE,
+    ",": TT_COMMA,
+    "+": TT_PLUS,
+    "-": TT_MINUS,
+    "*": TT_MUL,
+    "/": TT_DIV,
+    "%": TT_MOD,
+    "(": TT_LPAREN,
+    ")": TT_RPAREN,
+    "^": TT_POW,
+    ":": TT_COLON,
+    "[": TT_LSQB,
+    "]": TT_RSQB,
+    "{": TT_LBRACE,
+    "}": TT_RBRACE,
+    "=": TT_EQ,
+    "!": TT_NOT,
+    "<": TT_LT,
+    ">": TT_GT,
+}
+
+DOUBLE_CHAR_TOKENS = {
+    "==": TT_EE,
+    "!=": TT_NE,
+    "<=": TT_LTE,
+    ">=": TT_GTE,
+    "->": TT_ARROW,
+}
+
+RESERVED_KEYWORD_SET = frozenset(RESERVED_KEYWORDS)
+
+# Once a backslash is seen, every following character in the string is read
+# as an escape: further backslashes are dropped and n/t/r are translated.
+ESCAPE_TABLE = str.maketrans({"\\": None, "n": "\n", "t": "\t", "r": "\r"})
+
+
 class Lexer:
-    def __init__(self, file_name: str, text: str):
+    def __init__(self, file_name: str, text: "str | IO[str] | IO[bytes]"):
         self.file_name = file_name
-        self.text = text
-        self.pos = Position(-1, 0, -1, file_name, text)
-        self.current_char = None
-        self.advance()
-
-    def advance(self):
-        self.pos.advance(self.current_char)
-        self.current_char = (
-            self.text[self.pos.idx] if self.pos.idx < len(self.text) else None
-        )
+        self.source = Source(file_name, text)
+        self.error: Optional[Error] = None
 
     def make_tokens(self) -> tuple[Optional[list[Token]], Optional[Error]]:
-        tokens: list[Token] = []
-        while self.current_char != None:
-            if self.current_char in " \t":
-                self.advance()
-            elif self.current_char in "\n;":
-                tokens.append(Token(TT_NEWLINE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char in "0123456789":
-                tokens.append(self.make_number())
-            elif self.current_char in string.ascii_letters + "_":
-                tokens.append(self.make_identifier())
-            elif self.current_char in "'\"":
-                tokens.append(self.make_string())
-            elif self.current_char == "=":
-                tokens.append(self.make_equals())
-            elif self.current_char == "!":
-                tokens.append(self.make_not_equals())
-            elif self.current_char == "<":
-                tokens.append(self.make_less_than())
-            elif self.current_char == ">":
-                tokens.append(self.make_greater_than())
-            elif self.current_char == ",":
-                tokens.append(Token(TT_COMMA, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "#":
-                self.skip_comment()
-            elif self.current_char == "+":
-                tokens.append(Token(TT_PLUS, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "-":
-                tokens.append(self.make_sub_or_arrow())
-            elif self.current_char == "*":
-                tokens.append(Token(TT_MUL, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "/":
-                tokens.append(Token(TT_DIV, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "%":
-                tokens.append(Token(TT_MOD, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "(":
-                tokens.append(Token(TT_LPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ")":
-                tokens.append(Token(TT_RPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "^":
-                tokens.append(Token(TT_POW, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ":":
-                tokens.append(Token(TT_COLON, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "[":
-                tokens.append(Token(TT_LSQB, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "]":
-                tokens.append(Token(TT_RSQB, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "{":
-                tokens.append(Token(TT_LBRACE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == "}":
-                tokens.append(Token(TT_RBRACE, pos_start=self.pos))
-                self.advance()
-            else:
-                pos_start = self.pos.copy()
-                char = self.current_char
-                self.advance()
-                return [], IllegalCharError(pos_start, self.pos, "'" + char + "'")
-        tokens.append(Token(TT_EOF, pos_start=self.pos))
+        tokens = list(self.generate_tokens())
+        if self.error:
+            return [], self.error
         return tokens, None
 
-    def make_number(self):
-        num_str: str = ""
-        dot_count = 0
-        pos_start = self.pos.copy()
+    def generate_tokens(self) -> Iterator[Token]:
+        # Tokens are scanned from a window over the source. A match that runs
+        # into the end of the window might continue in the next chunk, so it
+        # is rescanned once more text has been read.
+        source = self.source
+        chunks = source.read_chunks()
+        window = ""
+        base = 0
+        eof = False
+        end = 0
+
+        while True:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                window += chunk
+            window_end = len(window)
+            rest = window_end
 
-        while self.current_char != None and self.current_char in "0123456789.":
-            if self.current_char == ".":
-                if dot_count == 1:
+            for match in TOKEN_REGEX.finditer(window):
+                if not eof and match.end() == window_end:
+                    rest = match.start()
                     break
-                dot_count += 1
-                num_str += "."
-            else:
-                num_str += self.current_char
-            self.advance()
 
-        if dot_count == 0:
-            return Token(TT_INT, int(num_str), pos_start, self.pos)
+                kind = match.lastgroup
+                start, end = match.span()
+                start += base
+                end += base
+
+                if kind == "SKIP" or kind == "COMMENT":
+                    continue
+                elif kind == "SINGLE":
+                    yield Token(SINGLE_CHAR_TOKENS[match.group()], None, start, end, source)
+                elif kind == "IDENTIFIER":
+                    id_str = match.group()
+                    if id_str in RESERVED_KEYWORD_SET:
+                        yield Token(TT_KEYWORD, id_str, start, end, source)
+                    else:
+                        yield Token(TT_IDENTIFIER, id_str, start, end, source)
+                elif kind == "NEWLINE":
+                    yield Token(TT_NEWLINE, None, start, end, source)
+                elif kind == "NUMBER":
+                    num_str = match.group()
+                    if "." in num_str:
+                        yield Token(TT_FLOAT, float(num_str), start, end, source)
+                    else:
+                        yield Token(TT_INT, int(num_str), start, end, source)
+                elif kind == "DOUBLE":
+                    yield Token(DOUBLE_CHAR_TOKENS[match.group()], None, start, end, source)
+                elif kind == "STRING":
+                    raw = match.group()
+                    if len(raw) == 1 or raw[-1] != raw[0]:
+                        # An unterminated string runs to the end of the file
+                        # and the closing advance steps one past it.
+                        end += 1
+                    yield self.make_string(raw, start, end)
+                else:
+                    self.error = IllegalCharError(
+                        Position(start, source),
+                        Position(end, source, True),
+                        "'" + match.group() + "'",
+                    )
+                    yield Token(TT_EOF, None, start, start + 1, source)
+                    return
+
+            if eof:
+                break
+            window = window[rest:]
+            base += rest
+
+        yield Token(TT_EOF, None, end, end + 1, source)
+
+    def make_string(self, raw: str, start: int, end: int) -> Token:
+        if len(raw) > 1 and raw[-1] == raw[0]:
+            string = raw[1:-1]
         else:
-            return Token(TT_FLOAT, float(num_str), pos_start, self.pos)
-
-    def make_identifier(self):
-        id_str = ""
-        pos_start = self.pos.copy()
+            string = raw[1:]
 
-        while (
-            self.current_char != None
-            and self.current_char in string.ascii_letters + "_" + "0123456789" + "."
-        ):
-            id_str += self.current_char
-            self.advance()
+        escape = string.find("\\")
+        if escape >= 0:
+            string = string[:escape] + string[escape + 1 :].translate(ESCAPE_TABLE)
 
-        if id_str in RESERVED_KEYWORDS:
-            token = Token(TT_KEYWORD, id_str, pos_start, self.pos)
-        else:
-            token = Token(TT_IDENTIFIER, id_str, pos_start, self.pos)
-
-        return token
-
-    def make_equals(self):
-        token_type = TT_EQ
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            token_type = TT_EE
-
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_not_equals(self):
-        token_type = TT_NOT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            token_type = TT_NE
-
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_less_than(self):
-        token_type = TT_LT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            token_type = TT_LTE
-
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_greater_than(self):
-        token_type = TT_GT
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.current_char == "=":
-            self.advance()
-            token_type = TT_GTE
-
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
-
-    def skip_comment(self):
-        self.advance()
-
-        while self.current_char != "\n":
-            self.advance()
-
-        self.advance()
-
-    def make_string(self):
-        string = ""
-        pos_start = self.pos.copy()
-        quote_type = self.current_char
-        self.advance()
-
-        escape_character = {
-            "n": "\n",
-            "t": "\t",
-            "r": "\r",
-            "\\": "\\",
-            "'": "'",
-            '"': '"',
-        }
-        escape = False
-        while self.current_char != None and self.current_char != quote_type:
-            if self.current_char == "\\":
-                escape = True
-            elif escape:
-                string += escape_character.get(self.current_char, self.current_char)
-            else:
-                string += self.current_char
-            self.advance()
-
-        self.advance()
-        return Token(TT_STRING, string, pos_start, self.pos)
-
-    def make_sub_or_arrow(self):
-        token = TT_MINUS
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == ">":
-            self.advance()
-            token = TT_ARROW
-        return Token(token, pos_start=pos_start, pos_end=self.pos)
+        return Token(TT_STRING, string, start, end, self.source)
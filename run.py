@@ -1,21 +1,63 @@
 from interpreter import *
+import fxbytecode
+import fxcache
+import fxffi
+import fxjit
+import interpreter
 
 global_symbol_table = global_symbol_table.copy()
 
-def run(file_name: str, text: str) -> tuple[Any, Any]:
-    lexer = Lexer(file_name, text)
-    tokens, error = lexer.make_tokens()
-    print(tokens)
+
+# Makes a Python callable or value a global of the programs run from here.
+# See fxffi.NativeFunction for `signature` and `raw`, and
+# fxffi.register_module and fxffi.allow_module for modules.
+def expose(name: str, object_: Any, signature: Optional[list] = None, raw: bool = False) -> Value:
+    return fxffi.expose(name, object_, signature, raw, global_symbol_table)
+
+# Programs run with global_symbol_table, which later runs share, so names
+# are only resolved against the text alone when `whole_program` says no
+# other input will run with those globals, as for a script the shell runs.
+# `engine` names the executor in ENGINES, the results are the same.
+def run(file_name: str, text: str, whole_program: bool = False, engine: str = "tree") -> tuple[Any, Any]:
+    program, error = ENGINES[engine].load(file_name, text, whole_program)
     if error:
         return None, error
-    parser = Parser(tokens)  # type: ignore
+    return start(program, engine)
+
+
+def run_stream(file_name: str, stream: IO[str] | IO[bytes], engine: str = "tree", whole_program: bool = False) -> tuple[Any, Any]:
+    lexer = Lexer(file_name, stream)
+    tokens = lexer.generate_tokens()
+    parser = Parser(tokens)
     ast = parser.parse()
+    # Drain the rest of the stream so a lexing error further down still takes
+    # precedence over the syntax error, as it does for run().
+    for _ in tokens:
+        pass
+    if lexer.error:
+        return None, lexer.error
     if ast.error:
         return None, ast.error
-    print(ast.node)
+    return execute(ast.node, whole_program, engine)
+
+
+def execute(node: Any, whole_program: bool = False, engine: str = "tree") -> tuple[Any, Any]:
+    return start(ENGINES[engine].prepare(node, whole_program), engine)
+
+
+def start(program: Any, engine: str = "tree") -> tuple[Any, Any]:
     context = Context("<program>")
     context.symbol_table = global_symbol_table
-    interpreter = Interpreter(context)
-    result = interpreter.visit(ast.node)
+    interpreter = ENGINES[engine](context)
+    try:
+        value = interpreter.visit(program)
+    except ErrorSignal as signal:
+        return None, signal.error
+    except FlowSignal:
+        # return, break or continue outside of any function ends the program
+        return None, None
+    except RecursionError:
+        # Out of Python's stack outside of any call that could report it.
+        return None, RTError(None, None, "Maximum recursion depth exceeded", context)
 
-    return result.value, result.error
+    return value, None
@@ -1,18 +1,85 @@
+import argparse
 import run
 import sys
 
+arg_parser = argparse.ArgumentParser(prog="fxpy")
+arg_parser.add_argument("file", nargs="?", help="script to run, starts the shell if omitted")
+arg_parser.add_argument(
+    "--stream",
+    action="store_true",
+    help="lex and parse the script straight from the file instead of reading it into memory",
+)
+arg_parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="always lex and parse, without reading or writing the __fxcache__ directories",
+)
+arg_parser.add_argument(
+    "--no-jit",
+    action="store_true",
+    help="never translate hot functions to Python, to compare the results",
+)
+arg_parser.add_argument(
+    "--max-depth",
+    type=int,
+    default=run.interpreter.MAX_DEPTH,
+    help="calls that can be nested before the script fails, only the vm engine goes deeper than about a hundred",
+)
+arg_parser.add_argument(
+    "--clear-cache",
+    action="store_true",
+    help="remove the __fxcache__ directories under the current directory first",
+)
+arg_parser.add_argument(
+    "--engine",
+    choices=sorted(run.ENGINES),
+    default="tree",
+    help="walk the tree (default), compile it to closures, or to bytecode for the stack VM",
+)
+arg_parser.add_argument(
+    "--allow-py",
+    action="append",
+    default=[],
+    metavar="MODULE",
+    help="let the script import the Python module MODULE as py.MODULE, none can be imported otherwise",
+)
+args = arg_parser.parse_args()
+
+if args.no_cache:
+    run.fxcache.enabled = False
+
+if args.no_jit:
+    run.fxjit.enabled = False
+
+run.interpreter.MAX_DEPTH = args.max_depth
+
+for module in args.allow_py:
+    run.fxffi.allow_module(module)
+
+if args.clear_cache:
+    run.fxcache.clear()
+    if not args.file:
+        sys.exit()
+
 running = True
 
-if len(sys.argv) > 1:
+if args.file:
     running = False
-    with open(sys.argv[1], "r") as file:
-        text = file.read()
-        _, error = run.run(sys.argv[1], text)
+    if args.stream:
+        with open(args.file, "rb") as file:
+            _, error = run.run_stream(args.file, file, args.engine, whole_program=True)
 
-        if error:
-            print(error.as_string())
+            if error:
+                print(error.as_string())
+    else:
+        with open(args.file, "r") as file:
+            text = file.read()
+            _, error = run.run(args.file, text, whole_program=True, engine=args.engine)
+
+            if error:
+                print(error.as_string())
         
-        sys.exit()
+    sys.exit()
 
 while running:
     try:
@@ -20,7 +87,7 @@ while running:
     except KeyboardInterrupt:
         continue
 
-    result, error = run.run("<stdin>", text)
+    result, error = run.run("<stdin>", text, whole_program=False, engine=args.engine)
 
     if error:
         print(error.as_string())
@@ -1,50 +1,178 @@
+import io
+from bisect import bisect_right
+from codecs import getincrementaldecoder
+from typing import IO, Iterator
+
+
+CHUNK_SIZE = 1 << 16
+
+
+class Source:
+    # Streamed sources don't keep their text in memory, it is only read back
+    # when an error has to be rendered, or read again from the file named
+    # `fn` once the stream is closed. The chunks of a stream that can't seek
+    # back, such as a pipe, are kept as they are read.
+    def __init__(self, fn: str, text: "str | IO[str] | IO[bytes]"):
+        self.fn = fn
+        self.chunks: list[str] | None = None
+        if isinstance(text, str):
+            self.stream = None
+            self._text: str | None = text
+        else:
+            self.stream = text
+            self._text = None
+            if not seekable(text):
+                self.chunks = []
+        self._line_starts: list[int] | None = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.read_all()
+        return self._text
+
+    @property
+    def line_starts(self) -> list[int]:
+        # Offset of the first character of every line, built once per file.
+        if self._line_starts is None:
+            text = self.text
+            find = text.find
+            starts = [0]
+            idx = find("\n")
+            while idx >= 0:
+                starts.append(idx + 1)
+                idx = find("\n", idx + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def line_col(self, idx: int) -> tuple[int, int]:
+        line_starts = self.line_starts
+        ln = bisect_right(line_starts, idx) - 1
+        return ln, idx - line_starts[ln]
+
+    def read_chunks(self) -> Iterator[str]:
+        if self.stream is None:
+            yield self.text
+            return
+        decoder = None
+        while True:
+            raw = self.stream.read(CHUNK_SIZE)
+            if isinstance(raw, (bytes, bytearray)):
+                if decoder is None:
+                    decoder = new_decoder()
+                chunk = decoder.decode(raw, final=not raw)
+            else:
+                chunk = raw
+            if chunk:
+                if self.chunks is not None:
+                    self.chunks.append(chunk)
+                yield chunk
+            if not raw:
+                return
+
+    def read_all(self) -> str:
+        if self.stream is None:
+            return ""
+        if self.chunks is not None:
+            return "".join(self.chunks)
+        try:
+            here = self.stream.tell()
+            self.stream.seek(0)
+            data = self.stream.read()
+            self.stream.seek(here)
+        except (OSError, ValueError):  # already closed
+            try:
+                with open(self.fn, "rb") as file:
+                    data = file.read()
+            except (OSError, ValueError):
+                return ""
+        if isinstance(data, (bytes, bytearray)):
+            return new_decoder().decode(data, final=True)
+        return data
+
+
+def seekable(stream: "IO[str] | IO[bytes]") -> bool:
+    try:
+        return stream.seekable()
+    except AttributeError:  # mmap, before Python 3.13
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def new_decoder() -> io.IncrementalNewlineDecoder:
+    # Byte streams (binary files, mmap) are decoded the way open(file, "r")
+    # would read them, so offsets match the text used to render errors.
+    return io.IncrementalNewlineDecoder(getincrementaldecoder("utf-8")(), True)
+
+
 class Position:
-    def __init__(self, idx: int, ln: int, col: int, fn: str, ftxt: str):
+    # Only the offset is stored, line and column are worked out from the
+    # source when an error is rendered. An `after` position points just past
+    # the character before it, which is how token ends are reported.
+    __slots__ = ("idx", "source", "after")
+
+    def __init__(self, idx: int, source: Source, after: bool = False):
         self.idx = idx
-        self.ln = ln
-        self.col = col
-        self.fn = fn
-        self.ftxt = ftxt
+        self.source = source
+        self.after = after
+
+    @property
+    def fn(self) -> str:
+        return self.source.fn
+
+    @property
+    def ftxt(self) -> str:
+        return self.source.text
 
-    def advance(self, current_char: str | None = None):
-        self.idx += 1
-        self.col += 1
+    @property
+    def ln(self) -> int:
+        return self.line_col()[0]
 
-        if current_char == "\n":
-            self.ln += 1
-            self.col = 0
+    @property
+    def col(self) -> int:
+        return self.line_col()[1]
 
-        return self
+    def line_col(self) -> tuple[int, int]:
+        if self.after and self.idx > 0:
+            ln, col = self.source.line_col(self.idx - 1)
+            return ln, col + 1
+        return self.source.line_col(self.idx)
 
     def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fn, self.ftxt)
+        return self  # positions are immutable
 
 
 def string_with_arrows(text: str, pos_start: Position, pos_end: Position) -> str:
     result = ""
+    line_starts = pos_start.source.line_starts
+    ln_start, col_start = pos_start.line_col()
+    ln_end, col_end = pos_end.line_col()
 
-    # Calculate indices
-    idx_start = max(text.rfind("\n", 0, pos_start.idx), 0)
-    idx_end = text.find("\n", idx_start + 1)
-    if idx_end < 0:
-        idx_end = len(text)
+    # Lines are sliced from the newline in front of them. The first slice of
+    # the file starts at 0 and runs to the first newline after that offset.
+    line_count: int = ln_end - ln_start + 1
+    first_ln = ln_start
+    if ln_start == 0 and text[:1] == "\n":
+        first_ln += 1
+    newlines = [idx - 1 for idx in line_starts[first_ln + 1 : first_ln + line_count + 1]]
 
     # Generate each line
-    line_count: int = pos_end.ln - pos_start.ln + 1
     for i in range(line_count):
+        # Calculate indices
+        if i == 0:
+            idx_start = line_starts[ln_start] - 1 if ln_start > 0 else 0
+        else:
+            idx_start = newlines[i - 1] if i - 1 < len(newlines) else len(text)
+        idx_end = newlines[i] if i < len(newlines) else len(text)
+
         # Calculate line columns
         line = text[idx_start:idx_end]
-        col_start = pos_start.col if i == 0 else 0
-        col_end = pos_end.col if i == line_count - 1 else len(line) - 1
+        col_from = col_start if i == 0 else 0
+        col_to = col_end if i == line_count - 1 else len(line) - 1
 
         # Append to result
         result += line + "\n"
-        result += " " * col_start + "^" * (col_end - col_start)
-
-        # Re-calculate indices
-        idx_start = idx_end
-        idx_end = text.find("\n", idx_start + 1)
-        if idx_end < 0:
-            idx_end = len(text)
+        result += " " * col_from + "^" * (col_to - col_from)
 
     return result.replace("\t", "")
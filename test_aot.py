@@ -0,0 +1,82 @@
+import contextlib
+import io
+import fxaot
+import run
+
+# Each program is compiled with fxaot.build and run, and has to print, give
+# and fail the same as the tree walker running its source.
+PROGRAMS = [
+    # Bodies that leave nothing to run.
+    """
+fex one() -> 1
+fex five():
+    5
+end
+fex same(x) -> x
+[one(), five(), same(3)]
+""",
+    """
+fex fact(n):
+    if n <= 1:
+        return 1
+    end
+    return n * fact(n - 1)
+end
+let total = 0
+for i = 1 to 10:
+    let total = total + fact(i) / i
+end
+print(total)
+let j = 0
+while True:
+    let j = j + 1
+    if j == 5:
+        break
+    end
+end
+[total, j, 2 ^ -1, 7 / 7]
+""",
+    """
+let l = [1, 2]
+append(l, 3)
+let l/0 = 9
+let d = {"a": 1}
+let d/"b" = l
+let e = d - "a"
+print(d)
+fex greet(name, greeting="hello") -> return greeting + " " + name
+[l, d, e, greet("a"), greet("b", greeting="hi")]
+""",
+    """
+fex inv(x) -> return 1 / x
+print(inv(4))
+inv(0)
+""",
+    """
+let x = 1
+print(x + missing)
+""",
+]
+
+
+def compiled(source: str) -> tuple[str, str, str | None]:
+    code, error = fxaot.build("<test>", source)
+    assert error is None, error.as_string()
+    namespace: dict = {"__name__": "test_aot"}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exec(compile(code, "<test>.py", "exec"), namespace)  # type: ignore
+        value, error = namespace["run"]()
+    return output.getvalue(), repr(value), error.as_string() if error else None
+
+
+def walked(source: str) -> tuple[str, str, str | None]:
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        value, error = run.run("<test>", source, whole_program=True)
+    return output.getvalue(), repr(value), error.as_string() if error else None
+
+
+def test_compiled_programs_match():
+    for source in PROGRAMS:
+        assert compiled(source) == walked(source), source
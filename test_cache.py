@@ -0,0 +1,152 @@
+import os
+import pickle
+import subprocess
+import sys
+import fxbytecode
+import fxcache
+import run
+
+SHELL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shell.py")
+
+SOURCE = """
+fex scale(x, by=2) -> return x * by
+let total = 0
+for i = 1 to 10:
+    let total = total + scale(i) / 4
+end
+total
+"""
+
+
+def write(tmp_path, name: str, text: str) -> str:
+    file_name = str(tmp_path / name)
+    with open(file_name, "w") as file:
+        file.write(text)
+    return file_name
+
+
+# The tree stored for `text`, None if there is no entry that fits it.
+def cached(file_name: str, text: str):
+    return fxcache.load(file_name, text, fxcache.cache_key(file_name, text))
+
+
+def entry_key(file_name: str, suffix: str) -> bytes:
+    with open(fxcache.cache_path(file_name, suffix), "rb") as file:
+        return file.readline()
+
+
+def test_bytecode_round_trip(tmp_path):
+    file_name = write(tmp_path, "program.fx", SOURCE)
+    compiled, error = fxbytecode.VM.load(file_name, SOURCE)
+    assert error is None
+    # Whole programs and modules are resolved differently, each has its own
+    # entry.
+    module, error = fxbytecode.VM.load(file_name, SOURCE, whole_program=False)
+    assert error is None
+    assert entry_key(file_name, "b").startswith(fxbytecode.BYTECODE_MAGIC)
+    assert entry_key(file_name, "m").startswith(fxbytecode.BYTECODE_MAGIC)
+
+    for whole_program, first in ((True, compiled), (False, module)):
+        loaded, error = fxbytecode.VM.load(file_name, SOURCE, whole_program)
+        assert error is None
+        assert isinstance(loaded, fxbytecode.Code) and loaded is not first
+        assert loaded.ops == first.ops
+        value, error = run.start(loaded, "vm")
+        assert error is None
+        assert repr(value.elements[-1]) == "27.5"
+
+
+def test_bytecode_magic_invalidates(tmp_path, monkeypatch):
+    file_name = write(tmp_path, "program.fx", SOURCE)
+    fxbytecode.VM.load(file_name, SOURCE)
+    monkeypatch.setattr(fxbytecode, "BYTECODE_MAGIC", b"FXB0")
+    compiled = []
+    compile = fxbytecode.BytecodeCompiler.compile
+    monkeypatch.setattr(fxbytecode.BytecodeCompiler, "compile", lambda self, node: compiled.append(node) or compile(self, node))
+
+    code, error = fxbytecode.VM.load(file_name, SOURCE)
+    assert error is None and compiled
+    # Stored again under the new magic.
+    assert entry_key(file_name, "b").startswith(b"FXB0")
+    del compiled[:]
+    fxbytecode.VM.load(file_name, SOURCE)
+    assert not compiled
+
+
+def test_changed_source_same_mtime(tmp_path):
+    file_name = write(tmp_path, "program.fx", "let a = 1\n")
+    fxcache.parse(file_name, "let a = 1\n")
+    mtime = os.stat(file_name).st_mtime_ns
+    write(tmp_path, "program.fx", "let a = 2\n")
+    os.utime(file_name, ns=(mtime, mtime))
+
+    assert cached(file_name, "let a = 2\n") is None
+    tree, error = fxcache.parse(file_name, "let a = 2\n")
+    assert error is None
+    assert tree.element_nodes[0].value_node.tok.value == 2
+    assert cached(file_name, "let a = 2\n") is not None
+
+
+def test_truncated_entry(tmp_path):
+    file_name = write(tmp_path, "program.fx", SOURCE)
+    fxcache.parse(file_name, SOURCE)
+    path = fxcache.cache_path(file_name)
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[: len(data) // 2])
+
+    assert cached(file_name, SOURCE) is None
+    value, error = run.run(file_name, SOURCE, whole_program=True)
+    assert error is None
+    assert repr(value.elements[-1]) == "27.5"
+    # Written again whole.
+    assert cached(file_name, SOURCE) is not None
+
+
+def test_version_bump(tmp_path, monkeypatch):
+    file_name = write(tmp_path, "program.fx", SOURCE)
+    fxcache.parse(file_name, SOURCE)
+    monkeypatch.setattr(fxcache, "FXPY_VERSION", fxcache.FXPY_VERSION + ".1")
+    assert cached(file_name, SOURCE) is None
+    fxcache.parse(file_name, SOURCE)
+    assert entry_key(file_name, "c").split()[1] == fxcache.FXPY_VERSION.encode()
+    assert cached(file_name, SOURCE) is not None
+
+
+class Planted:
+    def __reduce__(self):
+        return (os.mkdir, ("planted",))
+
+
+def test_planted_entry_not_loaded(tmp_path, monkeypatch):
+    # An entry with the right key whose pickle names a class that isn't part
+    # of a tree.
+    monkeypatch.chdir(tmp_path)
+    file_name = write(tmp_path, "program.fx", SOURCE)
+    os.makedirs(os.path.dirname(fxcache.cache_path(file_name)))
+    for suffix, magic in (("c", fxcache.CACHE_MAGIC), ("b", fxbytecode.BYTECODE_MAGIC)):
+        with open(fxcache.cache_path(file_name, suffix), "wb") as file:
+            file.write(fxcache.cache_key(file_name, SOURCE, magic))
+            pickle.dump(Planted(), file)
+
+    for engine in ("tree", "vm"):
+        value, error = run.run(file_name, SOURCE, whole_program=True, engine=engine)
+        assert error is None
+        assert repr(value.elements[-1]) == "27.5"
+    assert not os.path.exists("planted")
+
+
+def test_shell_cache_flags(tmp_path):
+    file_name = write(tmp_path, "program.fx", "print(1 + 2)\n")
+    cache_dir = tmp_path / fxcache.CACHE_DIR
+
+    def shell(*args: str) -> str:
+        return subprocess.run([sys.executable, SHELL, *args], cwd=tmp_path, capture_output=True, text=True, check=True).stdout
+
+    assert shell("--no-cache", file_name) == "3\n"
+    assert not cache_dir.exists()
+    assert shell(file_name) == "3\n"
+    assert cache_dir.exists()
+    shell("--clear-cache")
+    assert not cache_dir.exists()
@@ -0,0 +1,72 @@
+import run
+
+# Index assignment changes a List or Dictionary in place, and every
+# variable or argument holding it sees the change.
+ALIAS_SOURCE = """
+let l = [1, 2]
+let m = l
+let m/0 = 9
+let d = {"a": 1}
+let e = d
+let e/"b" = 2
+[l, d]
+"""
+
+ARGUMENT_SOURCE = """
+fex set_first(p) -> let p/0 = 1
+fex set_key(p) -> let p/"k" = 1
+let l = [0, 0]
+let d = {"k": 0}
+set_first(l)
+set_key(d)
+[l, d]
+"""
+
+# `-` still leaves the Dictionary it is applied to alone.
+REMOVE_SOURCE = """
+let d = {"a": 1, "b": 2}
+let e = d - "a"
+let e/"c" = 3
+[d, e]
+"""
+
+# Nor does it change any other variable, argument or element holding it.
+HOLDERS_SOURCE = """
+let d = {"a": 1, "b": 2}
+let e = d
+let l = [d]
+fex drop(p) -> return p - "a"
+let f = d - "a"
+let g = drop(d)
+let h = l/0 - "b"
+let d = d - "b"
+[e, l, f, g, h, d]
+"""
+
+
+def last_value(source: str, engine: str) -> str:
+    value, error = run.run("<test>", source, engine=engine)
+    assert error is None, (engine, error.as_string())
+    return str(value.elements[-1])
+
+
+def test_index_assignment_aliases():
+    for engine in run.ENGINES:
+        assert last_value(ALIAS_SOURCE, engine) == "[[9, 2], {a: 1, b: 2}]", engine
+
+
+def test_index_assignment_changes_arguments():
+    for engine in run.ENGINES:
+        assert last_value(ARGUMENT_SOURCE, engine) == "[[1, 0], {k: 1}]", engine
+
+
+def test_remove_keeps_operand():
+    for engine in run.ENGINES:
+        assert last_value(REMOVE_SOURCE, engine) == "[{a: 1, b: 2}, {b: 2, c: 3}]", engine
+
+
+def test_remove_keeps_other_holders():
+    for engine in run.ENGINES:
+        assert last_value(HOLDERS_SOURCE, engine) == (
+            "[{a: 1, b: 2}, [{a: 1, b: 2}], {b: 2}, {b: 2}, {a: 1}, {a: 1}]"
+        ), engine
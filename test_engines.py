@@ -0,0 +1,147 @@
+import fxjit
+import interpreter
+import run
+
+# Each program is run by every engine, with and without the JIT, and all of
+# them have to give the same value and the same error.
+PROGRAMS = [
+    # Ints stay ints until a division, a negative power or a float.
+    """
+fex half(n) -> return n / 2
+fex mix(a, b) -> return a * b + a / b - b ^ 2
+let values = []
+for i = 1 to 80:
+    append(values, [half(i), mix(i, 2.5), mix(i, 2)])
+end
+[values / 79, 7 / 7, 2 ^ -1, 2 ^ 3, 1 + 0.5, 10 - 10.0, 3 * 1.5]
+""",
+    # The translation of inv fails on 0, the error comes from its own code.
+    """
+fex inv(x) -> return 1 / x
+let total = 0
+for i = 1 to 100:
+    let total = total + inv(i)
+end
+inv(0)
+""",
+    """
+fex count(n):
+    let i = 0
+    while i < n:
+        let i = i + 1
+        if i == 30:
+            break
+        end
+    end
+    return i
+end
+let total = 0
+for i = 1 to 60:
+    let total = total + count(i)
+end
+[total, count(100)]
+""",
+    """
+fex greet(name, greeting="hello") -> return greeting + " " + name
+[greet("a"), greet("b", greeting="hi"), greet(1)]
+""",
+    # Operands the VM pushes without a copy, read by quickened nodes and
+    # kept by `items + n`. Loops left by break and continue.
+    """
+let items = []
+let n = 0
+while n < 12:
+    let n = n + 1
+    if n == 4 or n == 9:
+        continue
+    end
+    let items = items + n
+    let half = n / 2
+end
+for i = 1 to 20:
+    if i > 15:
+        break
+    end
+    let items = items + (half - i)
+end
+[items, n, i]
+""",
+]
+
+# `y` is only local to pick where n > 0, otherwise the global is read, which
+# the translation gives up on.
+DEOPT_SOURCE = """
+let y = 7
+fex pick(n):
+    if n > 0:
+        let y = n
+    end
+    return y
+end
+let total = 0
+for i = 1 to {hot}:
+    let total = total + pick(1)
+end
+for i = 1 to {deopts}:
+    let total = total + pick(0)
+end
+[total, pick]
+"""
+
+
+def result(source: str, engine: str) -> tuple:
+    value, error = run.run("<test>", source, engine=engine)
+    return repr(value), error.as_string() if error else None
+
+
+def test_engines_agree():
+    for source in PROGRAMS:
+        expected = result(source, "tree")
+        for jit in (True, False):
+            fxjit.enabled = jit
+            try:
+                for engine in run.ENGINES:
+                    assert result(source, engine) == expected, (engine, jit, source)
+            finally:
+                fxjit.enabled = True
+
+
+def test_translation_dropped_after_max_deopts():
+    hot = interpreter.JIT_THRESHOLD
+    for engine in run.ENGINES:
+        for deopts, translated in ((fxjit.MAX_DEOPTS - 1, True), (fxjit.MAX_DEOPTS, False)):
+            value, error = run.run("<test>", DEOPT_SOURCE.format(hot=hot, deopts=deopts), engine=engine)
+            assert error is None, engine
+            total, pick = value.elements[-1].elements
+            assert total.value == hot + deopts * 7, engine
+            assert (pick.tier.native is not None) == translated, (engine, deopts)
+
+
+def test_runs_share_globals():
+    # Each input is run on its own, as an embedder would, with the globals
+    # the ones before it left. `g` reads the `a` of its caller.
+    for engine in run.ENGINES:
+        for text in ("let share_a = 1", "fex share_g() -> return share_a", "fex share_h(share_a) -> return share_g()"):
+            _, error = run.run("<test>", text, engine=engine)
+            assert error is None, engine
+        value, error = run.run("<test>", "share_h(5)", engine=engine)
+        assert error is None, engine
+        assert repr(value.elements[-1]) == "5", engine
+
+
+def test_from_import_in_function(tmp_path, monkeypatch):
+    # The names go to the frame of the call, not the context of whatever
+    # runs the body.
+    (tmp_path / "simple.fx").write_text("fex double(x) -> return x * 2\n")
+    monkeypatch.chdir(tmp_path)
+    source = """
+fex g():
+    from simple import double
+    return double(5)
+end
+g()
+"""
+    for engine in run.ENGINES:
+        value, error = run.run("<test>", source, engine=engine)
+        assert error is None, engine
+        assert repr(value.elements[-1]) == "10", engine
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import interpreter
+import run
+
+MUTUAL_SOURCE = """
+fex ping(n) -> return 1 + pong(n + 1)
+fex pong(n) -> return 1 + ping(n + 1)
+ping(0)
+"""
+
+# Not a tail call, every call keeps its frame.
+DEEP_SOURCE = """
+fex total(n):
+    if n == 0:
+        return 0
+    end
+    return n + total(n - 1)
+end
+total(100000)
+"""
+
+STREAMED_SOURCE = "let a = 1\nlet b = 2\nprint(a + c)\n"
+
+
+def traceback(source: str, engine: str) -> str:
+    max_depth = interpreter.MAX_DEPTH
+    interpreter.MAX_DEPTH = 50
+    try:
+        _, error = run.run("<test>", source, engine=engine)
+    finally:
+        interpreter.MAX_DEPTH = max_depth
+    assert error is not None and "Maximum recursion depth exceeded" in error.details
+    return error.generate_traceback()
+
+
+def test_recursion_collapsed():
+    lines = traceback("fex down(n) -> return 1 + down(n + 1)\ndown(0)\n", "vm").splitlines()
+    assert lines[-1] == "  [Previous line repeated 48 more times]"
+    assert len(lines) == 6
+
+
+def test_mutual_recursion_collapsed():
+    for engine in run.ENGINES:
+        lines = traceback(MUTUAL_SOURCE, engine).splitlines()
+        assert "  [Previous 2 lines repeated 22 more times]" in lines, engine
+        assert len(lines) < 12, engine
+
+
+def test_deep_recursion():
+    # As the shell runs input, the names the program reads are found without
+    # going through the frames of the callers.
+    value, error = run.run("<test>", DEEP_SOURCE, engine="vm")
+    assert error is None
+    assert repr(value.elements[-1]) == str(100000 * 100001 // 2)
+
+
+def test_streamed_error_line():
+    # From a pipe, which can't be read back, and from a file that is closed
+    # by the time the error is rendered.
+    read, write = os.pipe()
+    with open(write, "wb") as file:
+        file.write(STREAMED_SOURCE.encode())
+    with open(read, "rb") as file:
+        _, error = run.run_stream("<pipe>", file)
+    assert "\nprint(a + c)\n" in error.as_string()
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "streamed.fx")
+        with open(file_name, "w") as file:
+            file.write(STREAMED_SOURCE)
+        with open(file_name, "rb") as file:
+            _, error = run.run_stream(file_name, file)
+        assert "line 3" in error.as_string()
+        assert "\nprint(a + c)\n" in error.as_string()
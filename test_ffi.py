@@ -0,0 +1,65 @@
+import fxffi
+import run
+
+kept = []
+run.expose("keep", kept.append)
+run.expose("put", lambda container, key, value: container.__setitem__(key, value))
+run.expose("remove", lambda container, key: container.__delitem__(key))
+
+# `add` is handed to Python inside make, and called once make has returned
+# and other calls have run in the frames make's would be reused for.
+CALLBACK_SOURCE = """
+fex make(x):
+    fex add(y) -> return x + y
+    keep(add)
+end
+make(10)
+fex other(x):
+    let z = x
+    return z
+end
+for i = 1 to 10:
+    other(1000)
+end
+"""
+
+
+def test_callback_after_return():
+    for engine in run.ENGINES:
+        kept.clear()
+        _, error = run.run("<test>", CALLBACK_SOURCE, engine=engine)
+        assert error is None, engine
+        assert [kept[0](1) for _ in range(5)] == [11] * 5, engine
+
+
+def test_view_after_return():
+    for engine in run.ENGINES:
+        kept.clear()
+        source = "fex make(x):\n    fex add(y) -> return x + y\n    keep([add])\nend\nmake(10)\nfex other(x) -> return x\nother(1000)\n"
+        _, error = run.run("<test>", source, engine=engine)
+        assert error is None, engine
+        assert kept[0][0](1) == 11, engine
+
+
+def test_view_writes_reach_program():
+    source = 'let d = {"a": 0, "b": 0}\nput(d, "k", 1)\nremove(d, "b")\nlet l = [0, 0]\nput(l, 0, 1)\nremove(l, 1)\n[d, l]\n'
+    for engine in run.ENGINES:
+        value, error = run.run("<test>", source, engine=engine)
+        assert error is None, engine
+        assert str(value.elements[-1]) == "[{a: 0, k: 1}, [1]]", engine
+
+
+def test_python_modules_need_allowing():
+    source = "import py.math as m\nm.sqrt(16)\n"
+    for engine in run.ENGINES:
+        _, error = run.run("<test>", source, engine=engine)
+        assert "Module 'py.math' not found" in error.as_string(), engine
+    fxffi.allow_module("math")
+    try:
+        for engine in run.ENGINES:
+            value, error = run.run("<test>", source, engine=engine)
+            assert error is None, engine
+            assert repr(value.elements[-1]) == "4.0", engine
+    finally:
+        fxffi.allowed_modules.discard("math")
+        fxffi.loaded.pop("math", None)
@@ -0,0 +1,108 @@
+import math
+import fxaot
+import interpreter
+import run
+from interpreter import counted_range
+
+LOOPS_SOURCE = """
+let seen = []
+for i = 1 to 3.5:
+    append(seen, i)
+end
+let after_float_end = i
+for j = 5 to 1 step -2:
+    append(seen, j)
+end
+let after_down = j
+for k = 1 to 10:
+    if k == 2:
+        continue
+    end
+    if k == 5:
+        break
+    end
+    append(seen, k)
+end
+for m = 0 to 1 step 0.5:
+    append(seen, m)
+end
+[seen, after_float_end, after_down, k, m]
+"""
+
+LOOPS_RESULT = "1, 2, 3, 5, 3, 1, 1, 3, 4, 0, 0.5, 1.0, 3, 1, 5, 1.0"
+
+ZERO_STEP_SOURCE = """
+let x = 0
+for i = 1 to 3 step 0:
+    let x = i
+    let x = x + 1
+end
+"""
+
+# Hot enough to be translated by the JIT before the step is zero.
+ZERO_STEP_FUNCTION_SOURCE = """
+fex total(n, by):
+    let t = 0
+    for i = n to 1 step by:
+        let t = t + i
+    end
+    return t + i
+end
+let sum = 0
+for call = 1 to {calls}:
+    let sum = sum + total(4, -1)
+end
+total(4, 0)
+"""
+
+
+def test_counted_range():
+    assert counted_range(1, 3, 1) == range(1, 4)
+    # A float end is rounded towards the start.
+    assert list(counted_range(1, 3.5, 1)) == [1, 2, 3]  # type: ignore
+    assert list(counted_range(0, -2.5, -1)) == [0, -1, -2]  # type: ignore
+    assert list(counted_range(5, 1, -2)) == [5, 3, 1]  # type: ignore
+    assert list(counted_range(1, 0, 1)) == []  # type: ignore
+    # Left to the loop that compares the variable to the end.
+    for start, end, step in ((1.5, 3, 1), (1, 3, 0.5), (1, math.inf, 1), (1, math.nan, 1), (1, 3, 0)):
+        assert counted_range(start, end, step) is None, (start, end, step)
+
+
+def test_loops_on_every_engine():
+    for engine in run.ENGINES:
+        value, error = run.run("<test>", LOOPS_SOURCE, engine=engine)
+        assert error is None, engine
+        assert repr(value.elements[-1]) == LOOPS_RESULT, engine
+
+
+def zero_step_error(error) -> list[str]:
+    # The error's last two lines, the loop's header and the carets under
+    # its step.
+    assert error is not None and error.details == "Step value cannot be zero"
+    return error.as_string().splitlines()[-2:]
+
+
+def test_zero_step():
+    for engine in run.ENGINES:
+        _, error = run.run("<test>", ZERO_STEP_SOURCE, engine=engine)
+        assert zero_step_error(error) == [
+            "for i = 1 to 3 step 0:",
+            "                    ^",
+        ], engine
+
+        source = ZERO_STEP_FUNCTION_SOURCE.format(calls=interpreter.JIT_THRESHOLD + 5)
+        _, error = run.run("<test>", source, engine=engine)
+        assert zero_step_error(error) == [
+            "    for i = n to 1 step by:",
+            "                        ^^",
+        ], engine
+
+    code, error = fxaot.build("<test>", ZERO_STEP_SOURCE)
+    assert error is None
+    namespace: dict = {"__name__": "test_loops"}
+    exec(compile(code, "<test>.py", "exec"), namespace)  # type: ignore
+    _, error = namespace["run"]()
+    assert zero_step_error(error) == [
+        "for i = 1 to 3 step 0:",
+        "                    ^",
+    ]
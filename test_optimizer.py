@@ -0,0 +1,104 @@
+from interpreter import NODE_BIN_OP, NODE_CONST, NODE_VAR_ACCESS, Lexer, Node, Optimizer, Parser
+import run
+
+# The function reads `k` where it is called from, the callers bind it
+# themselves.
+SHOW_SOURCE = """
+let k = 1
+fex show() -> return k
+"""
+
+REBINDING_CALLERS = {
+    "parameter": "fex bind(k) -> return show()\nfex caller() -> return bind(7)\n",
+    "for": """
+fex caller():
+    for k = 7 to 7:
+        let r = show()
+    end
+    return r
+end
+""",
+    "fex": """
+fex caller():
+    fex k() -> return 7
+    let g = show()
+    return g()
+end
+""",
+}
+
+# `k` in simple.fx, see test_imports_stop_propagation.
+IMPORTS = {
+    "import": "let simple.k = 1\nimport simple\nsimple.k + 1\n",
+    "from": "let k = 1\nfrom simple import k\nk + 1\n",
+}
+
+
+def optimized(source: str) -> list[Node]:
+    tokens, error = Lexer("<test>", source).make_tokens()
+    assert error is None
+    ast = Parser(tokens).parse()  # type: ignore
+    assert ast.error is None
+    return Optimizer().optimize(ast.node).element_nodes  # type: ignore
+
+
+def reads(node: Node, name: str) -> int:
+    # The reads of `name` left in the tree.
+    count = 1 if node.kind == NODE_VAR_ACCESS and node.var_name_tok.value == name else 0  # type: ignore
+    return count + sum(reads(child, name) for child in node.children())
+
+
+def last_value(source: str, engine: str) -> str:
+    value, error = run.run("<test>", source, engine=engine)
+    assert error is None, (engine, error.as_string())
+    return repr(value.elements[-1])
+
+
+def test_fold_limits():
+    statements = optimized('2 ^ 64\n2 ^ 65\n2 ^ 100\n"a" * 1024\n"a" * 1025\n"ab" * 3000\n')
+    assert [statement.kind for statement in statements] == [
+        NODE_CONST, NODE_BIN_OP, NODE_BIN_OP, NODE_CONST, NODE_BIN_OP, NODE_BIN_OP,
+    ]
+    for engine in run.ENGINES:
+        assert last_value("2 ^ 100", engine) == str(2 ** 100), engine
+        assert last_value('"ab" * 3000', engine) == "ab" * 3000, engine
+
+
+def test_failed_folds_stay():
+    # Python raises for the first, which has its inner power folded, the
+    # second and third give an error.
+    statements = optimized('(10.0 ^ 60) ^ 6\n1 / 0\n"ab" * 2.5\n')
+    assert [statement.kind for statement in statements] == [NODE_BIN_OP] * 3
+    assert statements[0].left_node.kind == NODE_CONST  # type: ignore
+
+    for engine in run.ENGINES:
+        for source, carets in (("1 / 0", "    ^"), ('"ab" * 2.5', "^" * 10)):
+            _, error = run.run("<test>", source, engine=engine)
+            assert error is not None, engine
+            assert error.as_string().splitlines()[-2:] == [source, carets], engine
+
+
+def test_constant_propagation():
+    statements = optimized(SHOW_SOURCE + "k + 1\n")
+    # Read where it is bound once, but not in the function, which can be
+    # called from where `k` is something else.
+    assert statements[-1].kind == NODE_CONST
+    assert reads(statements[1], "k") == 1
+
+
+def test_rebound_constant_stays():
+    for caller, source in REBINDING_CALLERS.items():
+        source = SHOW_SOURCE + source + "[k + 1, caller()]\n"
+        assert sum(reads(statement, "k") for statement in optimized(source)) == 2, caller
+        for engine in run.ENGINES:
+            assert last_value(source, engine) == "2, 7", (caller, engine)
+
+
+def test_imports_stop_propagation(tmp_path, monkeypatch):
+    # The module can set any name of the program.
+    (tmp_path / "simple.fx").write_text("let k = 5\n")
+    monkeypatch.chdir(tmp_path)
+    for kind, source in IMPORTS.items():
+        assert optimized(source)[-1].kind == NODE_BIN_OP, kind
+        for engine in run.ENGINES:
+            assert last_value(source, engine) == "6", (kind, engine)
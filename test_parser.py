@@ -0,0 +1,42 @@
+import run
+from fxparser import *
+
+# Statements that once needed the parser to back up: `return` with and
+# without a value, and keyword arguments after positional ones.
+STATEMENTS = """
+fex scale{i}(x, by=2):
+    if x == 0:
+        return
+    end
+    return x * by + {i}
+end
+print(scale{i}(3, by=4))
+print(scale{i}(scale{i}(1), by={i}))
+let done{i} = scale{i}(0)
+"""
+
+
+# Yields the tokens of `text` one at a time and fails if the parser reads
+# more than one token ahead of the current one.
+def one_way_tokens(text: str, parser: list[Parser]):
+    for tok in Lexer("<test>", text).generate_tokens():
+        if parser:
+            assert parser[0].read_count - parser[0].tok_idx <= 1, tok
+        yield tok
+
+
+def test_parser_never_rewinds():
+    source = "".join(STATEMENTS.format(i=i) for i in range(40))
+    parser: list[Parser] = []
+    # A window of two holds the current token and the next, any step back
+    # would read a token that was overwritten.
+    parser.append(Parser(one_way_tokens(source, parser), 2))
+    ast = parser[0].parse()
+    assert ast.error is None
+    assert parser[0].read_count > TOKEN_WINDOW
+
+    expected, error = run.run("<test>", source)
+    assert error is None
+    value, error = run.start(run.ENGINES["tree"].prepare(ast.node))
+    assert error is None
+    assert repr(value) == repr(expected)
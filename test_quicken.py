@@ -0,0 +1,106 @@
+import fxjit
+import interpreter
+import run
+from interpreter import QUICKEN_AFTER, QUICKEN_MAX_DEOPTS, QUICKEN_MAX_MISSES, Number, String
+
+# `x + x` runs once a pass, on Numbers for the first `numbers` passes and on
+# Strings after them.
+CHANGING_SOURCE = """
+let x = 1
+for i = 1 to {passes}:
+    if i > {numbers}:
+        let x = "a"
+    end
+    let y = x + x
+end
+y
+"""
+
+# The type of `x` changes every `block` passes.
+ALTERNATING_SOURCE = """
+let x = 1
+let strings = 0
+let count = 0
+for i = 1 to {passes}:
+    let y = x + x
+    let count = count + 1
+    if count == {block}:
+        let count = 0
+        let strings = 1 - strings
+        let x = 1
+        if strings == 1:
+            let x = "a"
+        end
+    end
+end
+y
+"""
+
+# The engines that keep the feedback on the nodes, the VM keeps it in its
+# Code.
+ENGINES = ("tree", "closure")
+
+
+# Runs `source` without the JIT and returns the feedback of its `x + x`
+# with the value of its last statement.
+def run_plus(source: str, engine: str):
+    program, error = run.ENGINES[engine].load("<test>", source)
+    assert error is None
+    fxjit.enabled = False
+    try:
+        value, error = run.start(program, engine)
+    finally:
+        fxjit.enabled = True
+    assert error is None, error.as_string()
+    # The first addition in the source.
+    plus = [feedback for node, feedback in interpreter.bin_op_feedback(program) if feedback.operation == "added_to"]
+    return plus[0], value.elements[-1]
+
+
+def test_specialises_after_quicken_after():
+    for engine in ENGINES:
+        source = CHANGING_SOURCE.format(passes=QUICKEN_AFTER - 1, numbers=QUICKEN_AFTER)
+        feedback, value = run_plus(source, engine)
+        assert feedback.handler is None and feedback.runs == QUICKEN_AFTER - 1, engine
+        assert repr(feedback) == "<recording: 0 hits, 0 misses, 0 deopts>", engine
+
+        source = CHANGING_SOURCE.format(passes=QUICKEN_AFTER + 5, numbers=QUICKEN_AFTER + 5)
+        feedback, value = run_plus(source, engine)
+        assert feedback.types == (Number, Number), engine
+        assert feedback.handler is interpreter.HANDLERS[("added_to", Number, Number)], engine
+        assert (feedback.hits, feedback.misses) == (5, 0), engine
+        assert repr(feedback) == "<Number added_to Number: 5 hits, 0 misses, 0 deopts>", engine
+        assert repr(value) == "2", engine
+
+
+def test_misses_deopt_to_generic_path():
+    for engine in ENGINES:
+        # One miss short of giving the handler up, the Strings still add up
+        # on the generic path.
+        numbers = QUICKEN_AFTER + 3
+        source = CHANGING_SOURCE.format(passes=numbers + QUICKEN_MAX_MISSES - 1, numbers=numbers)
+        feedback, value = run_plus(source, engine)
+        assert feedback.handler is not None and feedback.deopts == 0, engine
+        assert (feedback.hits, feedback.misses) == (3, QUICKEN_MAX_MISSES - 1), engine
+        assert repr(value) == "aa", engine
+
+        # Given up, recorded again and specialised for the Strings.
+        source = CHANGING_SOURCE.format(passes=numbers + QUICKEN_MAX_MISSES + QUICKEN_AFTER + 2, numbers=numbers)
+        feedback, value = run_plus(source, engine)
+        assert feedback.deopts == 1 and feedback.misses == QUICKEN_MAX_MISSES, engine
+        assert feedback.types == (String, String), engine
+        assert feedback.hits == 3 + 2, engine
+        assert repr(value) == "aa", engine
+
+
+def test_stays_generic_after_max_deopts():
+    # Each block misses the handler of the one before until it is given up,
+    # then records and specialises again.
+    block = QUICKEN_MAX_MISSES + QUICKEN_AFTER
+    for engine in ENGINES:
+        source = ALTERNATING_SOURCE.format(passes=block * (QUICKEN_MAX_DEOPTS + 2), block=block)
+        feedback, value = run_plus(source, engine)
+        assert feedback.deopts == QUICKEN_MAX_DEOPTS, engine
+        assert feedback.handler is None, engine
+        assert repr(feedback).startswith("<generic:"), engine
+        assert repr(value) == "aa", engine
@@ -0,0 +1,52 @@
+import interpreter
+import run
+
+EVEN_ODD_SOURCE = """
+fex even(n):
+    if n == 0:
+        return True
+    end
+    return odd(n - 1)
+end
+fex odd(n):
+    if n == 0:
+        return False
+    end
+    return even(n - 1)
+end
+"""
+
+# `inner` reads `x` from the frame of outer, which has to stay for it.
+CALLER_FRAME_SOURCE = """
+fex outer(x):
+    fex inner(y) -> return x + y
+    return inner(10)
+end
+outer(5)
+"""
+
+
+# The value of the last statement of `source` on each engine, or its error.
+# Only whole programs make tail calls in place of their frame.
+def run_engines(source: str):
+    results = {}
+    for engine in run.ENGINES:
+        value, error = run.run("<test>", source, whole_program=True, engine=engine)
+        results[engine] = (repr(value.elements[-1]) if value else None, error.as_string() if error else None)
+    return results
+
+
+def test_mutual_tail_calls_in_place():
+    # Many times deeper than calls can nest, which mutual tail calls don't.
+    max_depth = interpreter.MAX_DEPTH
+    interpreter.MAX_DEPTH = 100
+    try:
+        for engine, result in run_engines(EVEN_ODD_SOURCE + "[even(5001), even(5000)]").items():
+            assert result == ("False, True", None), engine
+    finally:
+        interpreter.MAX_DEPTH = max_depth
+
+
+def test_tail_call_keeps_caller_frame():
+    for engine, result in run_engines(CALLER_FRAME_SOURCE).items():
+        assert result == ("15", None), engine